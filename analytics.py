@@ -0,0 +1,150 @@
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional, Dict, Any, List, Tuple
+import numpy as np
+from config import Config
+from cache import TTLCache
+from database import list_daily_plays
+
+# Play analytics are computed from the track_play_daily rollups. A user's
+# rows are loaded once into a dense (tracks x days) matrix, and every
+# statistic below is a whole-array NumPy operation over it. Cached series
+# are refreshed incrementally: only the days the rollup job may still
+# rewrite are fetched again.
+
+@dataclass(frozen=True)
+class PlaySeries:
+    """Daily plays and unique listeners per track over consecutive days.
+
+    `plays` and `listeners` have shape (len(track_ids), len(days)).
+    """
+    days: np.ndarray
+    track_ids: np.ndarray
+    plays: np.ndarray
+    listeners: np.ndarray
+
+    @property
+    def catalog_plays(self) -> np.ndarray:
+        return self.plays.sum(axis=0)
+
+    @property
+    def catalog_listeners(self) -> np.ndarray:
+        # Listeners are distinct per track and day, so a listener who played
+        # two tracks counts twice here
+        return self.listeners.sum(axis=0)
+
+    def last(self, days: int) -> 'PlaySeries':
+        return PlaySeries(self.days[-days:], self.track_ids, self.plays[:, -days:], self.listeners[:, -days:])
+
+    def top_tracks(self, limit: int = 5) -> List[Tuple[str, int]]:
+        """Track ids with the most plays in the series, most played first"""
+        totals = self.plays.sum(axis=1)
+        order = np.argsort(totals, kind='stable')[::-1][:limit]
+        return [(str(self.track_ids[i]), int(totals[i])) for i in order if totals[i] > 0]
+
+def empty_series(start: date, end: date) -> PlaySeries:
+    days = np.arange(np.datetime64(start, 'D'), np.datetime64(end, 'D') + 1)
+    return PlaySeries(days, np.array([], dtype=object), np.zeros((0, len(days)), dtype=np.int64), np.zeros((0, len(days)), dtype=np.int64))
+
+def build_series(rows: List[Dict[str, Any]], start: date, end: date) -> PlaySeries:
+    """Scatter track_play_daily rows into dense matrices covering start..end inclusive"""
+    series = empty_series(start, end)
+    if not rows:
+        return series
+
+    row_days = np.array([row['day'] for row in rows], dtype='datetime64[D]')
+    columns = (row_days - series.days[0]).astype(np.int64)
+    in_range = (columns >= 0) & (columns < len(series.days))
+
+    track_ids, track_index = np.unique(np.array([row['track_id'] for row in rows], dtype=object)[in_range], return_inverse=True)
+    plays = np.zeros((len(track_ids), len(series.days)), dtype=np.int64)
+    listeners = np.zeros_like(plays)
+
+    # (track_id, day) is the rollup's primary key, so each cell is written at most once
+    plays[track_index, columns[in_range]] = np.array([row['plays'] for row in rows], dtype=np.int64)[in_range]
+    listeners[track_index, columns[in_range]] = np.array([row['unique_listeners'] for row in rows], dtype=np.int64)[in_range]
+
+    return PlaySeries(series.days, track_ids, plays, listeners)
+
+def merge_series(cached: PlaySeries, fresh: PlaySeries) -> PlaySeries:
+    """Overlay `fresh` on `cached`; days from fresh.days[0] on come from `fresh` only"""
+    days = np.arange(cached.days[0], fresh.days[-1] + 1)
+    track_ids = np.union1d(cached.track_ids, fresh.track_ids)
+    plays = np.zeros((len(track_ids), len(days)), dtype=np.int64)
+    listeners = np.zeros_like(plays)
+
+    kept = int((fresh.days[0] - cached.days[0]).astype(np.int64))
+    kept = max(0, min(kept, len(cached.days)))
+    cached_rows = np.searchsorted(track_ids, cached.track_ids)
+    plays[cached_rows, :kept] = cached.plays[:, :kept]
+    listeners[cached_rows, :kept] = cached.listeners[:, :kept]
+
+    offset = int((fresh.days[0] - days[0]).astype(np.int64))
+    fresh_rows = np.searchsorted(track_ids, fresh.track_ids)
+    plays[fresh_rows, offset:] = fresh.plays
+    listeners[fresh_rows, offset:] = fresh.listeners
+
+    return PlaySeries(days, track_ids, plays, listeners)
+
+def moving_average(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing mean over the last axis; the first window - 1 points average what is available"""
+    sums = np.cumsum(values, axis=-1, dtype=np.float64)
+    sums[..., window:] = sums[..., window:] - sums[..., :-window]
+    counts = np.minimum(np.arange(1, values.shape[-1] + 1), window)
+    return sums / counts
+
+def period_over_period(values: np.ndarray, period: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Sum of the last `period` points against the `period` before them, over the last axis.
+
+    Returns (current, previous, delta, percent change); the percent change is
+    NaN where the previous period was zero.
+    """
+    current = values[..., -period:].sum(axis=-1)
+    previous = values[..., -2 * period:-period].sum(axis=-1)
+    delta = current - previous
+    percent = np.divide(delta * 100.0, previous, out=np.full(np.shape(delta), np.nan), where=previous != 0)
+    return current, previous, delta, percent
+
+# Series per user with the monotonic time of their last refresh
+_series_cache = TTLCache(maxsize=Config.ANALYTICS_CACHE_SIZE, ttl=float('inf'))
+
+def get_analytics_cache_stats() -> Dict[str, Any]:
+    return _series_cache.stats()
+
+def invalidate_play_series(user_id: str):
+    _series_cache.invalidate(str(user_id))
+
+def get_play_series(user_id: str, today: Optional[date] = None) -> PlaySeries:
+    """The user's last ANALYTICS_HISTORY_DAYS of daily plays, ending today (UTC).
+
+    A cached series younger than ANALYTICS_REFRESH_SECONDS is returned as
+    is. An older one is refreshed from the first day the rollup job may
+    still rewrite (PLAY_ROLLUP_LOOKBACK_DAYS back), so a refresh reads a
+    few days of rows rather than the whole history.
+    """
+    today = today or datetime.now(timezone.utc).date()
+    start = today - timedelta(days=Config.ANALYTICS_HISTORY_DAYS - 1)
+    key = str(user_id)
+
+    cached = _series_cache.get(key)
+    if cached is not None:
+        series, refreshed_at = cached
+        if time.monotonic() - refreshed_at < Config.ANALYTICS_REFRESH_SECONDS and series.days[-1] == np.datetime64(today, 'D'):
+            return series
+
+    if cached is not None and series.days[0] <= np.datetime64(start, 'D'):
+        last_cached = series.days[-1].astype(date)
+        refresh_from = min(last_cached, today - timedelta(days=Config.PLAY_ROLLUP_LOOKBACK_DAYS))
+        rows = list_daily_plays(user_id, refresh_from)
+        if rows is None:
+            return series
+        series = merge_series(series, build_series(rows, refresh_from, today)).last(Config.ANALYTICS_HISTORY_DAYS)
+    else:
+        rows = list_daily_plays(user_id, start)
+        if rows is None:
+            return empty_series(start, today)
+        series = build_series(rows, start, today)
+
+    _series_cache.set(key, (series, time.monotonic()))
+    return series
@@ -2,13 +2,17 @@ import streamlit as st
 import os
 from datetime import datetime, timedelta
 from auth import init_auth, get_current_user, logout_user
-from database import init_database, get_user_by_email, create_user, update_subscription_status
+from database import init_database, get_user_by_email, create_user, update_subscription_status, get_user_stats
 from payment import check_subscription_status
+from play_buffer import start_flusher
+from metrics import track_run
 
 # Initialize the application
 def init_app():
     init_database()
     init_auth()
+    # Drains plays spooled by a previous run as well as new ones
+    start_flusher()
 
 def main():
     st.set_page_config(
@@ -16,7 +20,8 @@ def main():
         page_icon="🎵",
         layout="wide"
     )
-    
+
+    track_run('Home')
     init_app()
     
     # Check authentication
@@ -87,16 +92,17 @@ def show_authenticated_app(user):
     st.title("🎵 Omawi Na Dashboard")
     
     # Quick stats
+    stats = get_user_stats(user['id'])
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("Total Tracks", "0", "Upload your first track!")
+        st.metric("Total Tracks", stats['track_count'], None if stats['track_count'] else "Upload your first track!")
     
     with col2:
-        st.metric("Total Plays", "0")
+        st.metric("Total Plays", stats['total_plays'])
     
     with col3:
-        st.metric("Portfolio Views", "0")
+        st.metric("Portfolio Views", stats['portfolio_views'])
     
     with col4:
         st.metric("Days Left in Trial" if subscription_status == 'trial' else "Subscription", 
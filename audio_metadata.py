@@ -0,0 +1,148 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, asdict, fields
+from typing import Optional, Dict, Any, Tuple
+from mutagen import MutagenError
+from mutagen._file import File
+from config import Config
+
+# Tag keys to try for each field, in order: ID3 frames first, then
+# Vorbis comments (FLAC), then lowercase names used by easy/other formats.
+TAG_KEYS: Dict[str, Tuple[str, ...]] = {
+    'title': ('TIT2', 'TITLE', 'title'),
+    'artist': ('TPE1', 'ARTIST', 'artist'),
+    'album': ('TALB', 'ALBUM', 'album'),
+    'genre': ('TCON', 'GENRE', 'genre'),
+    'year': ('TDRC', 'DATE', 'date', 'TYER'),
+}
+
+class MetadataError(Exception):
+    pass
+
+@dataclass(slots=True, frozen=True)
+class AudioMetadata:
+    title: Optional[str] = None
+    artist: Optional[str] = None
+    album: Optional[str] = None
+    genre: Optional[str] = None
+    year: Optional[str] = None
+    duration: Optional[int] = None
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+    bitrate: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the fields that were found, in the shape get_audio_metadata used to return"""
+        return {key: value for key, value in asdict(self).items() if value is not None}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'AudioMetadata':
+        known = {field.name for field in fields(cls)}
+        return cls(**{key: value for key, value in data.items() if key in known})
+
+_cache: 'OrderedDict[Any, AudioMetadata]' = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _first_tag(tags, keys: Tuple[str, ...]) -> Optional[str]:
+    for key in keys:
+        value = tags.get(key)
+        if value:
+            return str(value[0])
+    return None
+
+def read_metadata(file_path: str) -> AudioMetadata:
+    """Parse tags and stream info from a file's headers and tag blocks.
+
+    Mutagen only reads the container headers, tag blocks and the first
+    audio frames it needs for stream info, never the whole file.
+    """
+    try:
+        audio_file = File(file_path)
+    except MutagenError as e:
+        raise MetadataError(f"Error reading audio metadata: {e}") from e
+
+    if audio_file is None:
+        return AudioMetadata()
+
+    values: Dict[str, Any] = {}
+    tags = audio_file.tags
+    if tags is not None:
+        for field_name, keys in TAG_KEYS.items():
+            values[field_name] = _first_tag(tags, keys)
+
+    info = getattr(audio_file, 'info', None)
+    if info is not None:
+        if getattr(info, 'length', None):
+            values['duration'] = int(info.length)
+        values['sample_rate'] = getattr(info, 'sample_rate', None)
+        values['channels'] = getattr(info, 'channels', None)
+        values['bitrate'] = getattr(info, 'bitrate', None) or None
+
+    return AudioMetadata(**values)
+
+def _get_cache_path(content_hash: str) -> str:
+    return os.path.join(Config.METADATA_CACHE_DIR, content_hash[:2], f"{content_hash}.json")
+
+def _remember(key, metadata: AudioMetadata):
+    with _cache_lock:
+        _cache[key] = metadata
+        _cache.move_to_end(key)
+        while len(_cache) > Config.METADATA_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+def _load_cached(content_hash: str) -> Optional[AudioMetadata]:
+    try:
+        with open(_get_cache_path(content_hash), 'r') as f:
+            return AudioMetadata.from_dict(json.load(f))
+    except (FileNotFoundError, ValueError, TypeError):
+        return None
+
+def _store_cached(content_hash: str, metadata: AudioMetadata):
+    cache_path = _get_cache_path(content_hash)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+
+    temp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(metadata.to_dict(), f)
+    os.replace(temp_path, cache_path)
+
+def extract_metadata(file_path: str, content_hash: Optional[str] = None) -> AudioMetadata:
+    """Return the metadata for a file, parsing each distinct content at most once.
+
+    With a content hash, results are memoized in memory and on disk, so
+    re-ingests, backfills and worker processes share them. Without one the
+    in-memory entry is keyed by path, size and mtime.
+    """
+    if content_hash:
+        key = content_hash
+    else:
+        stat = os.stat(file_path)
+        key = (os.path.realpath(file_path), stat.st_size, stat.st_mtime_ns)
+
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            _cache.move_to_end(key)
+            return cached
+
+    metadata = _load_cached(content_hash) if content_hash else None
+
+    if metadata is None:
+        metadata = read_metadata(file_path)
+        if content_hash:
+            _store_cached(content_hash, metadata)
+
+    _remember(key, metadata)
+    return metadata
+
+def forget_metadata(content_hash: str):
+    """Drop cached metadata for content that is no longer stored"""
+    with _cache_lock:
+        _cache.pop(content_hash, None)
+
+    try:
+        os.remove(_get_cache_path(content_hash))
+    except FileNotFoundError:
+        pass
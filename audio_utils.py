@@ -1,49 +1,19 @@
 import os
-from mutagen._file import File
-from mutagen.id3._util import ID3NoHeaderError
+import hashlib
+import tempfile
+import zipfile
+from urllib.parse import quote
+from dataclasses import dataclass
+from typing import Optional
 import streamlit as st
+from config import Config
+from blob_store import get_staging_dir, commit_blob
+from audio_metadata import extract_metadata
 
-def get_audio_metadata(file_path):
+def get_audio_metadata(file_path, content_hash=None):
     """Extract metadata from audio file"""
     try:
-        audio_file = File(file_path)
-        
-        if audio_file is None:
-            return {}
-        
-        metadata = {}
-        
-        # Extract common metadata
-        if audio_file.get('TIT2'):  # Title
-            metadata['title'] = str(audio_file['TIT2'][0])
-        elif audio_file.get('TITLE'):
-            metadata['title'] = str(audio_file['TITLE'][0])
-        
-        if audio_file.get('TPE1'):  # Artist
-            metadata['artist'] = str(audio_file['TPE1'][0])
-        elif audio_file.get('ARTIST'):
-            metadata['artist'] = str(audio_file['ARTIST'][0])
-        
-        if audio_file.get('TALB'):  # Album
-            metadata['album'] = str(audio_file['TALB'][0])
-        elif audio_file.get('ALBUM'):
-            metadata['album'] = str(audio_file['ALBUM'][0])
-        
-        if audio_file.get('TCON'):  # Genre
-            metadata['genre'] = str(audio_file['TCON'][0])
-        elif audio_file.get('GENRE'):
-            metadata['genre'] = str(audio_file['GENRE'][0])
-        
-        if audio_file.get('TDRC'):  # Year
-            metadata['year'] = str(audio_file['TDRC'][0])
-        elif audio_file.get('DATE'):
-            metadata['year'] = str(audio_file['DATE'][0])
-        
-        # Duration
-        if hasattr(audio_file, 'info') and hasattr(audio_file.info, 'length'):
-            metadata['duration'] = int(audio_file.info.length)
-        
-        return metadata
+        return extract_metadata(file_path, content_hash).to_dict()
         
     except Exception as e:
         st.error(f"Error reading audio metadata: {e}")
@@ -61,34 +31,117 @@ def validate_audio_file(uploaded_file):
     if file_extension not in allowed_extensions:
         return False, f"File type {file_extension} not supported. Please upload MP3, WAV, or FLAC files."
     
-    # Check file size (max 50MB)
-    max_size = 50 * 1024 * 1024  # 50MB in bytes
+    # Check file size
+    max_size = Config.MAX_FILE_SIZE_MB * 1024 * 1024
     if uploaded_file.size > max_size:
-        return False, "File size too large. Maximum size is 50MB."
+        return False, f"File size too large. Maximum size is {Config.MAX_FILE_SIZE_MB}MB. Use the resumable uploader for larger files."
     
     return True, "File is valid"
 
-def save_uploaded_file(uploaded_file, user_id, track_id):
-    """Save uploaded file to disk"""
+@dataclass
+class StagedUpload:
+    path: str
+    content_hash: str
+    size: int
+    original_name: Optional[str] = None
+
+def copy_stream(source, destination, chunk_size=None, digest=None):
+    """Copy a file-like object in fixed-size chunks through one reusable buffer"""
+    buffer = memoryview(bytearray(chunk_size or Config.UPLOAD_CHUNK_SIZE))
+    total = 0
+
+    while True:
+        read = source.readinto(buffer)
+        if not read:
+            break
+        chunk = buffer[:read]
+        destination.write(chunk)
+        if digest is not None:
+            digest.update(chunk)
+        total += read
+
+    return total
+
+def stage_stream(source, file_name):
+    """Stream a file-like object into a collision-safe staging file, hashing it on the way"""
+    file_extension = os.path.splitext(file_name)[1].lower()
+    digest = hashlib.sha256()
+
+    fd, staging_path = tempfile.mkstemp(suffix=file_extension, dir=get_staging_dir())
     try:
-        # Create uploads directory if it doesn't exist
-        upload_dir = "uploads"
-        if not os.path.exists(upload_dir):
-            os.makedirs(upload_dir)
-        
-        # Create user directory
-        user_dir = os.path.join(upload_dir, str(user_id))
-        if not os.path.exists(user_dir):
-            os.makedirs(user_dir)
-        
-        # Generate file path
-        file_extension = os.path.splitext(uploaded_file.name)[1]
-        file_path = os.path.join(user_dir, f"track_{track_id}{file_extension}")
-        
-        # Save file
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        
+        with os.fdopen(fd, "wb") as f:
+            size = copy_stream(source, f, digest=digest)
+    except Exception:
+        discard_staged_file(staging_path)
+        raise
+
+    return StagedUpload(
+        path=staging_path,
+        content_hash=digest.hexdigest(),
+        size=size,
+        original_name=os.path.basename(file_name)
+    )
+
+def stage_uploaded_file(uploaded_file):
+    """Stream an upload into a collision-safe staging file, hashing it on the way"""
+    uploaded_file.seek(0)
+    return stage_stream(uploaded_file, uploaded_file.name)
+
+def is_archive_entry_audio(info):
+    """Return True for ZIP entries that look like importable audio files"""
+    if info.is_dir():
+        return False
+
+    parts = info.filename.replace("\\", "/").split("/")
+    if parts[0] == "__MACOSX" or any(part.startswith(".") for part in parts):
+        return False
+
+    file_extension = os.path.splitext(info.filename)[1].lower().lstrip(".")
+    return file_extension in Config.ALLOWED_AUDIO_FORMATS
+
+def stage_archive(uploaded_file):
+    """Stream each audio entry of a ZIP archive into staging without unpacking the archive.
+
+    Returns the staged files in archive order and a list of skipped entry names.
+    """
+    max_size = Config.MAX_FILE_SIZE_MB * 1024 * 1024
+    staged_files = []
+    skipped = []
+
+    uploaded_file.seek(0)
+    try:
+        with zipfile.ZipFile(uploaded_file) as archive:
+            for info in sorted(archive.infolist(), key=lambda entry: entry.filename):
+                if not is_archive_entry_audio(info):
+                    if not info.is_dir():
+                        skipped.append(info.filename)
+                    continue
+
+                if info.file_size > max_size:
+                    skipped.append(info.filename)
+                    continue
+
+                with archive.open(info) as entry:
+                    staged_files.append(stage_stream(entry, info.filename))
+    except Exception:
+        for staged in staged_files:
+            discard_staged_file(staged.path)
+        raise
+
+    return staged_files, skipped
+
+def discard_staged_file(staging_path):
+    """Remove a staged upload that will not be kept"""
+    try:
+        os.remove(staging_path)
+    except FileNotFoundError:
+        pass
+
+def save_uploaded_file(uploaded_file):
+    """Save uploaded file to the blob store"""
+    try:
+        staged = stage_uploaded_file(uploaded_file)
+        file_path, _ = commit_blob(staged.path, staged.content_hash)
         return file_path
         
     except Exception as e:
@@ -110,13 +163,19 @@ def get_file_size_mb(file_size_bytes):
         return 0
     return round(file_size_bytes / (1024 * 1024), 2)
 
+def get_stream_url(file_path):
+    """Return the streaming server URL for a stored audio file"""
+    relative_path = os.path.relpath(file_path, Config.UPLOAD_DIR).replace(os.sep, "/")
+    return f"{Config.STREAM_BASE_URL.rstrip('/')}/media/{quote(relative_path)}"
+
 def generate_audio_player_html(file_path, track_title):
     """Generate HTML audio player"""
+    stream_url = get_stream_url(file_path)
     return f"""
-    <audio controls style="width: 100%;">
-        <source src="/{file_path}" type="audio/mpeg">
-        <source src="/{file_path}" type="audio/wav">
-        <source src="/{file_path}" type="audio/flac">
+    <audio controls preload="none" style="width: 100%;">
+        <source src="{stream_url}" type="audio/mpeg">
+        <source src="{stream_url}" type="audio/wav">
+        <source src="{stream_url}" type="audio/flac">
         Your browser does not support the audio element.
     </audio>
     <p style="margin-top: 5px; font-size: 0.9em; color: #666;">
@@ -0,0 +1,133 @@
+import os
+import time
+import fcntl
+from contextlib import contextmanager
+from typing import Optional, Tuple
+from config import Config
+from database import count_tracks_by_content_hash
+from waveform import get_peaks_path
+from audio_metadata import forget_metadata
+
+BLOB_DIR = os.path.join(Config.UPLOAD_DIR, 'blobs')
+STAGING_DIR = os.path.join(BLOB_DIR, '.staging')
+LOCK_DIR = os.path.join(BLOB_DIR, '.locks')
+
+# A blob is referenced by tracks rows, but a job commits (or dedupes to) a
+# blob before its track row exists. commit_blob therefore pins the blob,
+# and release_blob leaves a pinned blob alone until unpin_blob is called
+# once the row is written or the job gave up. Pins older than
+# BLOB_PIN_TTL_SECONDS are ignored, so a crashed job can only delay a
+# deletion. Commit, unpin and release of one hash are serialized across
+# threads and processes by an flock on the hash's lock file, which also
+# holds the pin count. Lock files are never deleted: removing one while
+# another process waits on it would let two holders in.
+
+@contextmanager
+def _hash_lock(content_hash: str):
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    with open(os.path.join(LOCK_DIR, f"{content_hash}.lock"), 'a+') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield lock_file
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _read_pins(lock_file) -> int:
+    lock_file.seek(0)
+    try:
+        return int(lock_file.read() or 0)
+    except ValueError:
+        return 0
+
+def _write_pins(lock_file, pins: int):
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(str(pins))
+    lock_file.flush()
+
+def _is_pinned(lock_file) -> bool:
+    if _read_pins(lock_file) <= 0:
+        return False
+    return time.time() - os.fstat(lock_file.fileno()).st_mtime < Config.BLOB_PIN_TTL_SECONDS
+
+def get_staging_dir() -> str:
+    """Return the staging directory, on the same filesystem as the blobs"""
+    os.makedirs(STAGING_DIR, exist_ok=True)
+    return STAGING_DIR
+
+def get_blob_path(content_hash: str, file_extension: str) -> str:
+    """Return the content-addressed path for a blob"""
+    return os.path.join(BLOB_DIR, content_hash[:2], f"{content_hash}{file_extension.lower()}")
+
+def find_blob(content_hash: str) -> Optional[str]:
+    """Return the stored blob for a hash, whatever extension it was saved with"""
+    shard_dir = os.path.join(BLOB_DIR, content_hash[:2])
+
+    try:
+        with os.scandir(shard_dir) as entries:
+            for entry in entries:
+                if os.path.splitext(entry.name)[0] == content_hash and entry.is_file():
+                    return entry.path
+    except FileNotFoundError:
+        pass
+
+    return None
+
+def commit_blob(staging_path: str, content_hash: str) -> Tuple[str, bool]:
+    """Move a staged file into the blob store.
+
+    Returns the blob path and whether a new blob was created. When the
+    content is already stored the staged copy is dropped and the existing
+    blob is reused. Either way the blob stays pinned until unpin_blob.
+    """
+    with _hash_lock(content_hash) as lock_file:
+        _write_pins(lock_file, max(0, _read_pins(lock_file)) + 1)
+
+        existing_path = find_blob(content_hash)
+        if existing_path:
+            os.remove(staging_path)
+            return existing_path, False
+
+        file_extension = os.path.splitext(staging_path)[1]
+        blob_path = get_blob_path(content_hash, file_extension)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        os.replace(staging_path, blob_path)
+
+        return blob_path, True
+
+def unpin_blob(content_hash: str):
+    """Drop one commit_blob pin, once the track row is written or will not be"""
+    with _hash_lock(content_hash) as lock_file:
+        _write_pins(lock_file, max(0, _read_pins(lock_file) - 1))
+
+def release_blob(content_hash: str) -> bool:
+    """Delete a blob once no track references it any more.
+
+    Returns True if the blob was removed. A blob pinned by a job still
+    writing its track row is kept.
+    """
+    with _hash_lock(content_hash) as lock_file:
+        if _is_pinned(lock_file):
+            return False
+
+        references = count_tracks_by_content_hash(content_hash)
+        if references is None or references > 0:
+            return False
+
+        blob_path = find_blob(content_hash)
+        if not blob_path:
+            return False
+
+        try:
+            os.remove(blob_path)
+        except FileNotFoundError:
+            return False
+
+        try:
+            os.remove(get_peaks_path(blob_path))
+        except FileNotFoundError:
+            pass
+
+        forget_metadata(content_hash)
+
+        return True
@@ -4,12 +4,30 @@ from typing import Optional
 class Config:
     SUPABASE_URL: str = os.getenv('SUPABASE_URL', '')
     SUPABASE_ANON_KEY: str = os.getenv('SUPABASE_ANON_KEY', '')
+    SUPABASE_POOL_SIZE: int = int(os.getenv('SUPABASE_POOL_SIZE', '20'))
+    SUPABASE_KEEPALIVE_SECONDS: float = 60.0
+    SUPABASE_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    SUPABASE_TIMEOUT_SECONDS: float = float(os.getenv('SUPABASE_TIMEOUT_SECONDS', '30'))
+    SUPABASE_POOL_TIMEOUT_SECONDS: float = 10.0
+
+    # 'supabase', or 'sqlite' to run against a local database built from supabase/migrations
+    DATABASE_BACKEND: str = os.getenv('DATABASE_BACKEND', 'supabase')
+    SQLITE_DATABASE_PATH: str = os.getenv('SQLITE_DATABASE_PATH', os.path.join('.spool', 'omawi_na.sqlite3'))
 
     STRIPE_SECRET_KEY: str = os.getenv('STRIPE_SECRET_KEY', 'sk_test_default_key')
     STRIPE_PUBLISHABLE_KEY: str = os.getenv('STRIPE_PUBLISHABLE_KEY', 'pk_test_default_key')
+    STRIPE_WEBHOOK_SECRET: str = os.getenv('STRIPE_WEBHOOK_SECRET', '')
+    # Signs stripe_local's simulated events when no secret is set; accepted in demo mode only
+    STRIPE_DEMO_WEBHOOK_SECRET: str = 'whsec_test_default_secret'
+    STRIPE_WEBHOOK_PORT: int = int(os.getenv('STRIPE_WEBHOOK_PORT', '5002'))
+    STRIPE_WEBHOOK_URL: str = os.getenv('STRIPE_WEBHOOK_URL', 'http://localhost:5002/stripe/webhook')
+    STRIPE_WEBHOOK_TOLERANCE_SECONDS: int = 300
+    # After a checkout, the Subscription page rereads the user until the webhook has been applied
+    STRIPE_PAYMENT_PENDING_SECONDS: int = 120
 
     SENDGRID_API_KEY: str = os.getenv('SENDGRID_API_KEY', 'default_key')
     SENDGRID_FROM_EMAIL: str = os.getenv('SENDGRID_FROM_EMAIL', 'noreply@omawina.app')
+    SENDGRID_API_HOST: str = os.getenv('SENDGRID_API_HOST', 'https://api.sendgrid.com')
 
     MAX_FILE_SIZE_MB: int = 50
     ALLOWED_AUDIO_FORMATS: list = ['mp3', 'wav', 'flac']
@@ -20,6 +38,75 @@ class Config:
     SUBSCRIPTION_PERIOD_DAYS: int = 90
 
     UPLOAD_DIR: str = 'uploads'
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+    # How long a committed blob is protected from release_blob while its track row is being written
+    BLOB_PIN_TTL_SECONDS: int = 3600
+
+    METADATA_CACHE_DIR: str = os.path.join(UPLOAD_DIR, 'blobs', '.metadata')
+    METADATA_CACHE_SIZE: int = 4096
+
+    RESUMABLE_UPLOAD_DIR: str = os.path.join(UPLOAD_DIR, 'blobs', '.resumable')
+    RESUMABLE_MAX_FILE_SIZE_MB: int = int(os.getenv('RESUMABLE_MAX_FILE_SIZE_MB', '1024'))
+    RESUMABLE_CHUNK_SIZE_MB: int = 8
+    RESUMABLE_MAX_CHUNK_MB: int = 64
+    RESUMABLE_UPLOAD_TTL_HOURS: int = 24
+
+    INGEST_WORKERS: int = int(os.getenv('INGEST_WORKERS', '0'))
+    INGEST_JOB_RETENTION_SECONDS: int = 3600
+    INGEST_POLL_INTERVAL_SECONDS: int = 1
+
+    STREAM_PORT: int = int(os.getenv('STREAM_PORT', '5001'))
+    STREAM_BASE_URL: str = os.getenv('STREAM_BASE_URL', 'http://localhost:5001')
+    STREAM_CACHE_MAX_AGE: int = 86400
+
+    WAVEFORM_SAMPLES_PER_PEAK: int = 256
+    WAVEFORM_LEVEL_FACTOR: int = 4
+    WAVEFORM_LEVELS: int = 5
+    WAVEFORM_BYTES_PER_VALUE: int = 1
+
+    TRACK_PAGE_SIZE: int = 20
+
+    DATABASE_CONCURRENCY: int = int(os.getenv('DATABASE_CONCURRENCY', '8'))
+
+    USER_CACHE_TTL_SECONDS: float = float(os.getenv('USER_CACHE_TTL_SECONDS', '30'))
+    USER_CACHE_SIZE: int = 1024
+
+    SWEEPER_BATCH_SIZE: int = 1000
+    SWEEPER_INTERVAL_SECONDS: int = int(os.getenv('SWEEPER_INTERVAL_SECONDS', '900'))
+
+    WEBHOOK_EVENT_DB: str = os.getenv('WEBHOOK_EVENT_DB', os.path.join('.spool', 'stripe_events.sqlite3'))
+    WEBHOOK_BATCH_SIZE: int = 100
+    WEBHOOK_APPLY_INTERVAL_SECONDS: float = 2.0
+    WEBHOOK_MAX_ATTEMPTS: int = 10
+
+    EMAIL_OUTBOX_DB: str = os.getenv('EMAIL_OUTBOX_DB', os.path.join('.spool', 'email_outbox.sqlite3'))
+    EMAIL_BATCH_SIZE: int = 50
+    EMAIL_PERSONALIZATIONS_PER_REQUEST: int = 1000
+    EMAIL_MAX_ATTEMPTS: int = 8
+    EMAIL_RETRY_BASE_SECONDS: float = 30.0
+    EMAIL_RETRY_MAX_SECONDS: float = 3600.0
+    EMAIL_SEND_TIMEOUT_SECONDS: float = 10.0
+    EMAIL_SEND_ATTEMPTS: int = 3
+    EMAIL_SEND_RETRY_BASE_SECONDS: float = 0.5
+    EMAIL_POLL_INTERVAL_SECONDS: float = 5.0
+
+    PLAY_SPOOL_DIR: str = os.getenv('PLAY_SPOOL_DIR', os.path.join('.spool', 'plays'))
+    PLAY_FLUSH_INTERVAL_SECONDS: float = 5.0
+    PLAY_FLUSH_BATCH_SIZE: int = 500
+    PLAY_RETENTION_DAYS: int = int(os.getenv('PLAY_RETENTION_DAYS', '90'))
+    PLAY_ROLLUP_LOOKBACK_DAYS: int = 2
+    PLAY_PARTITION_MONTHS_AHEAD: int = 2
+    PLAY_ROLLUP_INTERVAL_SECONDS: int = int(os.getenv('PLAY_ROLLUP_INTERVAL_SECONDS', '3600'))
+
+    ANALYTICS_HISTORY_DAYS: int = 180
+    ANALYTICS_REFRESH_SECONDS: float = float(os.getenv('ANALYTICS_REFRESH_SECONDS', '300'))
+    ANALYTICS_CACHE_SIZE: int = 256
+    ANALYTICS_PAGE_SIZE: int = 1000
+
+    # Prometheus-format /metrics for this process; port 0 turns the endpoint off
+    METRICS_HOST: str = os.getenv('METRICS_HOST', '127.0.0.1')
+    METRICS_PORT: int = int(os.getenv('METRICS_PORT', '9464'))
+    METRICS_RUN_IDLE_SECONDS: float = 10.0
 
     APP_NAME: str = 'Omawi Na'
     APP_DESCRIPTION: str = 'Professional Music Hub for Musicians'
@@ -32,19 +119,29 @@ class Config:
     def is_demo_mode(cls) -> bool:
         return cls.STRIPE_SECRET_KEY == 'sk_test_default_key'
 
+    @classmethod
+    def get_webhook_secret(cls) -> str:
+        if cls.STRIPE_WEBHOOK_SECRET:
+            return cls.STRIPE_WEBHOOK_SECRET
+        return cls.STRIPE_DEMO_WEBHOOK_SECRET if cls.is_demo_mode() else ''
+
     @classmethod
     def validate(cls) -> tuple[bool, list[str]]:
         errors = []
 
-        if not cls.SUPABASE_URL:
-            errors.append("SUPABASE_URL is not set")
+        if cls.DATABASE_BACKEND != 'sqlite':
+            if not cls.SUPABASE_URL:
+                errors.append("SUPABASE_URL is not set")
 
-        if not cls.SUPABASE_ANON_KEY:
-            errors.append("SUPABASE_ANON_KEY is not set")
+            if not cls.SUPABASE_ANON_KEY:
+                errors.append("SUPABASE_ANON_KEY is not set")
 
         if cls.is_production() and cls.STRIPE_SECRET_KEY.startswith('sk_test_'):
             errors.append("Production environment requires production Stripe key")
 
+        if cls.is_production() and cls.STRIPE_WEBHOOK_SECRET in ('', cls.STRIPE_DEMO_WEBHOOK_SECRET):
+            errors.append("Production environment requires STRIPE_WEBHOOK_SECRET")
+
         return len(errors) == 0, errors
 
 config = Config()
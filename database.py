@@ -1,7 +1,22 @@
-from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+from datetime import date, datetime, timedelta
+from typing import Optional, List, Dict, Any, Tuple
 from supabase_client import get_supabase_client
+from config import Config
+from cache import TTLCache
+from metrics import instrument, record_error, register_gauges
 import json
+import uuid
+
+# Users are looked up on every Streamlit rerun; writes below invalidate their entry
+_user_cache = TTLCache(maxsize=Config.USER_CACHE_SIZE, ttl=Config.USER_CACHE_TTL_SECONDS)
+
+def get_user_cache_stats() -> Dict[str, Any]:
+    return _user_cache.stats()
+
+def invalidate_cached_user(user_id: str):
+    _user_cache.invalidate(str(user_id))
+
+register_gauges('omawi_na_user_cache', get_user_cache_stats)
 
 def init_database():
     try:
@@ -11,28 +26,41 @@ def init_database():
         print(f"Database initialization error: {e}")
         return False
 
+@instrument('database')
 def get_user_by_email(email: str) -> Optional[Dict[str, Any]]:
     try:
         client = get_supabase_client()
-        response = client.table('users').select('*').eq('email', email).maybeSingle().execute()
+        response = client.table('users').select('*').eq('email', email).maybe_single().execute()
 
-        return response.data if response.data else None
+        return response.data if response else None
 
     except Exception as e:
         print(f"Error getting user by email: {e}")
+        record_error(e)
         return None
 
+@instrument('database')
 def get_user_by_id(user_id: str) -> Optional[Dict[str, Any]]:
+    cached = _user_cache.get(str(user_id))
+    if cached is not None:
+        return dict(cached)
+
     try:
         client = get_supabase_client()
-        response = client.table('users').select('*').eq('id', user_id).maybeSingle().execute()
+        response = client.table('users').select('*').eq('id', user_id).maybe_single().execute()
+
+        if not response:
+            return None
 
-        return response.data if response.data else None
+        _user_cache.set(str(user_id), dict(response.data))
+        return response.data
 
     except Exception as e:
         print(f"Error getting user by ID: {e}")
+        record_error(e)
         return None
 
+@instrument('database')
 def create_user(email: str, username: str, full_name: Optional[str] = None) -> Optional[Dict[str, Any]]:
     try:
         client = get_supabase_client()
@@ -55,8 +83,10 @@ def create_user(email: str, username: str, full_name: Optional[str] = None) -> O
 
     except Exception as e:
         print(f"Error creating user: {e}")
+        record_error(e)
         return None
 
+@instrument('database')
 def update_user_profile(
     user_id: str,
     bio: Optional[str] = None,
@@ -83,13 +113,49 @@ def update_user_profile(
 
         if update_data:
             client.table('users').update(update_data).eq('id', user_id).execute()
+            invalidate_cached_user(user_id)
 
         return True
 
     except Exception as e:
         print(f"Error updating user profile: {e}")
+        record_error(e)
         return False
 
+PROFILE_COLUMNS = ('bio', 'genre', 'social_links', 'profile_image_url')
+
+@instrument('database')
+def update_user_profiles(profiles: List[Dict[str, Any]]) -> Optional[int]:
+    """Apply many profile updates in one request and return the number of users updated.
+
+    Each entry has a 'user_id' and any of PROFILE_COLUMNS; missing or None
+    fields are left unchanged, as with update_user_profile.
+    """
+    try:
+        # A later entry for the same user overrides the fields of an earlier one
+        merged: Dict[str, Dict[str, Any]] = {}
+        for profile in profiles:
+            fields = merged.setdefault(profile['user_id'], {'id': profile['user_id']})
+            fields.update({column: profile[column] for column in PROFILE_COLUMNS if profile.get(column) is not None})
+
+        rows = [fields for fields in merged.values() if len(fields) > 1]
+        if not rows:
+            return 0
+
+        client = get_supabase_client()
+        response = client.rpc('update_user_profiles', {'p_profiles': rows}).execute()
+
+        for row in rows:
+            invalidate_cached_user(row['id'])
+
+        return response.data or 0
+
+    except Exception as e:
+        print(f"Error updating user profiles: {e}")
+        record_error(e)
+        return None
+
+@instrument('database')
 def update_subscription_status(
     user_id: str,
     status: str,
@@ -108,13 +174,72 @@ def update_subscription_status(
             update_data['next_payment_due'] = next_due_date.isoformat()
 
         client.table('users').update(update_data).eq('id', user_id).execute()
+        invalidate_cached_user(user_id)
 
         return True
 
     except Exception as e:
         print(f"Error updating subscription status: {e}")
+        record_error(e)
         return False
 
+SUBSCRIPTION_COLUMNS = 'id, email, username, subscription_status, trial_start_date, last_payment_date, next_payment_due'
+
+@instrument('database')
+def get_users_due_for_transition(
+    status: str,
+    date_column: str,
+    due_before: datetime,
+    after_id: Optional[str] = None,
+    limit: int = 1000
+) -> Optional[List[Dict[str, Any]]]:
+    """Return users in `status` whose `date_column` is before `due_before`, by id.
+
+    Each call is a range scan on (subscription_status, date_column); pass
+    the last id seen as `after_id` to fetch the next batch.
+    """
+    try:
+        client = get_supabase_client()
+        query = client.table('users').select(SUBSCRIPTION_COLUMNS).eq('subscription_status', status).lt(date_column, due_before.isoformat())
+
+        if after_id:
+            query = query.gt('id', after_id)
+
+        response = query.order('id').limit(limit).execute()
+
+        return response.data or []
+
+    except Exception as e:
+        print(f"Error getting users due for transition: {e}")
+        record_error(e)
+        return None
+
+@instrument('database')
+def bulk_update_subscription_status(user_ids: List[str], from_status: str, to_status: str) -> Optional[List[str]]:
+    """Move many users from one status to another in a single UPDATE.
+
+    Only rows still in `from_status` change, so a payment recorded in the
+    meantime is not overwritten. Returns the ids that were updated.
+    """
+    try:
+        if not user_ids:
+            return []
+
+        client = get_supabase_client()
+        response = client.table('users').update({'subscription_status': to_status}).in_('id', user_ids).eq('subscription_status', from_status).execute()
+
+        updated_ids = [row['id'] for row in response.data or []]
+        for user_id in updated_ids:
+            invalidate_cached_user(user_id)
+
+        return updated_ids
+
+    except Exception as e:
+        print(f"Error bulk updating subscription status: {e}")
+        record_error(e)
+        return None
+
+@instrument('database')
 def create_track(
     user_id: str,
     title: str,
@@ -128,12 +253,22 @@ def create_track(
     lyrics: Optional[str] = None,
     file_size: Optional[int] = None,
     duration_seconds: Optional[int] = None,
-    cover_art_url: Optional[str] = None
+    cover_art_url: Optional[str] = None,
+    content_hash: Optional[str] = None,
+    track_id: Optional[str] = None
 ) -> Optional[str]:
+    """Insert one track and return its id.
+
+    The id is generated here unless given, so a file_path derived from it can
+    be stored by the same insert instead of a follow-up update_track_file_path.
+    """
     try:
         client = get_supabase_client()
 
+        track_id = track_id or str(uuid.uuid4())
+
         track_data = {
+            'id': track_id,
             'user_id': user_id,
             'title': title,
             'artist': artist,
@@ -146,31 +281,153 @@ def create_track(
             'lyrics': lyrics,
             'file_size': file_size,
             'duration_seconds': duration_seconds,
-            'cover_art_url': cover_art_url
+            'cover_art_url': cover_art_url,
+            'content_hash': content_hash
         }
 
-        response = client.table('tracks').insert(track_data).execute()
+        client.table('tracks').insert(track_data, returning='minimal').execute()
 
-        if response.data and len(response.data) > 0:
-            return response.data[0]['id']
+        return track_id
 
+    except Exception as e:
+        print(f"Error creating track: {e}")
+        record_error(e)
         return None
 
+TRACK_INSERT_COLUMNS = (
+    'id', 'user_id', 'title', 'artist', 'file_path', 'album', 'genre', 'release_year',
+    'producer_credits', 'featured_artists', 'lyrics', 'file_size',
+    'duration_seconds', 'cover_art_url', 'content_hash'
+)
+
+@instrument('database')
+def create_tracks(tracks: List[Dict[str, Any]]) -> Optional[List[str]]:
+    """Insert tracks in one request and return their ids in order; rows without an 'id' get a new one"""
+    try:
+        if not tracks:
+            return []
+
+        client = get_supabase_client()
+
+        # Every row carries the same keys so PostgREST can insert them in one statement
+        track_rows = [{column: track.get(column) for column in TRACK_INSERT_COLUMNS} for track in tracks]
+        for row in track_rows:
+            row['id'] = row['id'] or str(uuid.uuid4())
+
+        # The ids are known up front, so nothing needs to be sent back
+        client.table('tracks').insert(track_rows, returning='minimal').execute()
+
+        return [row['id'] for row in track_rows]
+
     except Exception as e:
-        print(f"Error creating track: {e}")
+        print(f"Error creating tracks: {e}")
+        record_error(e)
         return None
 
-def get_user_tracks(user_id: str) -> List[Dict[str, Any]]:
+# Columns needed to list tracks; lyrics and credits are loaded per track by get_track_details
+TRACK_LIST_COLUMNS = (
+    'id, title, artist, album, genre, release_year, file_path, file_size, '
+    'duration_seconds, cover_art_url, play_count, has_lyrics, has_credits, created_at'
+)
+
+TRACK_DETAIL_COLUMNS = 'id, lyrics, producer_credits, featured_artists'
+
+@instrument('database')
+def list_user_tracks(
+    user_id: str,
+    limit: Optional[int] = None,
+    after: Optional[Tuple[str, str]] = None
+) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, str]]]:
+    """Return one page of a user's tracks, newest first, and the cursor for the next page.
+
+    Pages are keyed on (created_at, id) rather than offsets, so every page
+    is a bounded range scan of idx_tracks_user_created_id. Pass the returned
+    cursor as `after` to continue; it is None on the last page.
+    """
+    limit = limit or Config.TRACK_PAGE_SIZE
+
     try:
         client = get_supabase_client()
-        response = client.table('tracks').select('*').eq('user_id', user_id).order('created_at', desc=True).execute()
+        query = client.table('tracks').select(TRACK_LIST_COLUMNS).eq('user_id', user_id)
 
-        return response.data if response.data else []
+        if after:
+            created_at, track_id = after
+            query = query.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{track_id})')
+
+        # One extra row tells whether another page exists
+        response = query.order('created_at', desc=True).order('id', desc=True).limit(limit + 1).execute()
+
+        tracks = response.data or []
+        if len(tracks) <= limit:
+            return tracks, None
+
+        tracks = tracks[:limit]
+        return tracks, (tracks[-1]['created_at'], tracks[-1]['id'])
 
     except Exception as e:
-        print(f"Error getting user tracks: {e}")
-        return []
+        print(f"Error listing user tracks: {e}")
+        record_error(e)
+        return [], None
+
+@instrument('database')
+def get_track_details(track_id: str) -> Optional[Dict[str, Any]]:
+    try:
+        client = get_supabase_client()
+        response = client.table('tracks').select(TRACK_DETAIL_COLUMNS).eq('id', track_id).limit(1).execute()
+
+        return response.data[0] if response.data else None
+
+    except Exception as e:
+        print(f"Error getting track details: {e}")
+        record_error(e)
+        return None
+
+USER_STATS_COLUMNS = 'track_count, total_plays, total_duration_seconds, total_file_size, portfolio_views'
+
+@instrument('database')
+def get_user_stats(user_id: str) -> Dict[str, int]:
+    stats = {column: 0 for column in USER_STATS_COLUMNS.split(', ')}
+
+    try:
+        client = get_supabase_client()
+        response = client.table('user_stats').select(USER_STATS_COLUMNS).eq('user_id', user_id).limit(1).execute()
+
+        if response.data:
+            stats.update({key: value or 0 for key, value in response.data[0].items()})
+
+        return stats
+
+    except Exception as e:
+        print(f"Error getting user stats: {e}")
+        record_error(e)
+        return stats
+
+@instrument('database')
+def record_portfolio_view(user_id: str) -> bool:
+    try:
+        client = get_supabase_client()
+        client.rpc('record_portfolio_view', {'p_user_id': user_id}).execute()
+        return True
+
+    except Exception as e:
+        print(f"Error recording portfolio view: {e}")
+        record_error(e)
+        return False
 
+@instrument('database')
+def count_tracks_by_content_hash(content_hash: str) -> Optional[int]:
+    try:
+        client = get_supabase_client()
+        response = client.table('tracks').select('id', count='exact').eq('content_hash', content_hash).limit(1).execute()
+
+        return response.count or 0
+
+    except Exception as e:
+        print(f"Error counting tracks by content hash: {e}")
+        record_error(e)
+        return None
+
+@instrument('database')
 def update_track_file_path(track_id: str, file_path: str) -> bool:
     try:
         client = get_supabase_client()
@@ -180,32 +437,134 @@ def update_track_file_path(track_id: str, file_path: str) -> bool:
 
     except Exception as e:
         print(f"Error updating track file path: {e}")
+        record_error(e)
         return False
 
+@instrument('database')
 def increment_play_count(track_id: str, ip_address: Optional[str] = None, user_agent: Optional[str] = None) -> bool:
     try:
         client = get_supabase_client()
 
-        track = client.table('tracks').select('play_count').eq('id', track_id).maybeSingle().execute()
+        # Inserts the play event and increments play_count in one atomic statement
+        client.rpc('record_track_play', {
+            'p_track_id': track_id,
+            'p_ip_address': ip_address,
+            'p_user_agent': user_agent
+        }).execute()
 
-        if track.data:
-            new_count = (track.data.get('play_count') or 0) + 1
-            client.table('tracks').update({'play_count': new_count}).eq('id', track_id).execute()
+        return True
 
-        play_data = {
-            'track_id': track_id,
-            'ip_address': ip_address,
-            'user_agent': user_agent
-        }
+    except Exception as e:
+        print(f"Error incrementing play count: {e}")
+        record_error(e)
+        return False
+
+@instrument('database')
+def record_track_plays(plays: List[Dict[str, Any]]) -> Optional[int]:
+    try:
+        if not plays:
+            return 0
+
+        client = get_supabase_client()
 
-        client.table('track_plays').insert(play_data).execute()
+        # One multi-row insert plus one counter update per distinct track
+        response = client.rpc('record_track_plays', {'p_plays': plays}).execute()
 
+        return response.data or 0
+
+    except Exception as e:
+        print(f"Error recording track plays: {e}")
+        record_error(e)
+        return None
+
+@instrument('database')
+def ensure_track_play_partitions(months_ahead: int) -> bool:
+    try:
+        client = get_supabase_client()
+        client.rpc('ensure_track_play_partitions', {'p_months_ahead': months_ahead}).execute()
         return True
 
     except Exception as e:
-        print(f"Error incrementing play count: {e}")
+        print(f"Error creating track play partitions: {e}")
+        record_error(e)
         return False
 
+@instrument('database')
+def rollup_track_plays(from_day: date, to_day: date) -> Optional[int]:
+    try:
+        client = get_supabase_client()
+
+        # Recomputes track_play_daily for UTC days in [from_day, to_day)
+        response = client.rpc('rollup_track_plays', {
+            'p_from': from_day.isoformat(),
+            'p_to': to_day.isoformat()
+        }).execute()
+
+        return response.data or 0
+
+    except Exception as e:
+        print(f"Error rolling up track plays: {e}")
+        record_error(e)
+        return None
+
+@instrument('database')
+def expire_track_plays(retain_days: int) -> Optional[int]:
+    try:
+        client = get_supabase_client()
+
+        # Rolls up, then drops raw plays older than retain_days; returns the partitions dropped
+        response = client.rpc('expire_track_plays', {'p_retain_days': retain_days}).execute()
+
+        return response.data or 0
+
+    except Exception as e:
+        print(f"Error expiring track plays: {e}")
+        record_error(e)
+        return None
+
+DAILY_PLAY_COLUMNS = 'track_id, day, plays, unique_listeners'
+
+@instrument('database')
+def list_daily_plays(user_id: str, since: date) -> Optional[List[Dict[str, Any]]]:
+    """All track_play_daily rows for a user's tracks from `since` on, fetched page by page"""
+    rows: List[Dict[str, Any]] = []
+    page_size = Config.ANALYTICS_PAGE_SIZE
+
+    try:
+        client = get_supabase_client()
+
+        while True:
+            # Served by idx_track_play_daily_user_day; the API caps each response, so read in pages
+            query = client.table('track_play_daily').select(DAILY_PLAY_COLUMNS).eq('user_id', user_id).gte('day', since.isoformat())
+            response = query.order('day').order('track_id').range(len(rows), len(rows) + page_size - 1).execute()
+
+            page = response.data or []
+            rows.extend(page)
+            if len(page) < page_size:
+                return rows
+
+    except Exception as e:
+        print(f"Error listing daily plays: {e}")
+        record_error(e)
+        return None
+
+@instrument('database')
+def get_track_titles(track_ids: List[str]) -> Dict[str, str]:
+    try:
+        if not track_ids:
+            return {}
+
+        client = get_supabase_client()
+        response = client.table('tracks').select('id, title').in_('id', track_ids).execute()
+
+        return {track['id']: track['title'] for track in response.data or []}
+
+    except Exception as e:
+        print(f"Error getting track titles: {e}")
+        record_error(e)
+        return {}
+
+@instrument('database')
 def record_payment(
     user_id: str,
     stripe_payment_id: str,
@@ -233,8 +592,63 @@ def record_payment(
 
     except Exception as e:
         print(f"Error recording payment: {e}")
+        record_error(e)
         return False
 
+@instrument('database')
+def record_payments(payments: List[Dict[str, Any]]) -> bool:
+    """Record many payments with one multi-row insert.
+
+    Each entry takes the arguments of record_payment by name.
+    """
+    try:
+        if not payments:
+            return True
+
+        client = get_supabase_client()
+
+        payment_rows = [
+            {
+                'user_id': payment['user_id'],
+                'stripe_payment_id': payment['stripe_payment_id'],
+                'amount': payment['amount'],
+                'status': payment['status'],
+                'payment_date': payment['payment_date'].isoformat(),
+                'subscription_period_start': payment['payment_date'].isoformat(),
+                'subscription_period_end': payment['period_end'].isoformat()
+            }
+            for payment in payments
+        ]
+
+        client.table('payments').insert(payment_rows, returning='minimal').execute()
+
+        return True
+
+    except Exception as e:
+        print(f"Error recording payments: {e}")
+        record_error(e)
+        return False
+
+@instrument('database')
+def apply_stripe_payments(payments: List[Dict[str, Any]]) -> Optional[int]:
+    try:
+        if not payments:
+            return 0
+
+        client = get_supabase_client()
+
+        # Records the payments and activates the paying users in one statement;
+        # payments already recorded are skipped
+        response = client.rpc('apply_stripe_payments', {'p_payments': payments}).execute()
+
+        return response.data or 0
+
+    except Exception as e:
+        print(f"Error applying Stripe payments: {e}")
+        record_error(e)
+        return None
+
+@instrument('database')
 def get_payment_history(user_id: str) -> List[Dict[str, Any]]:
     try:
         client = get_supabase_client()
@@ -244,4 +658,5 @@ def get_payment_history(user_id: str) -> List[Dict[str, Any]]:
 
     except Exception as e:
         print(f"Error getting payment history: {e}")
+        record_error(e)
         return []
@@ -0,0 +1,72 @@
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, List, TypeVar
+from config import Config
+import database
+
+# Awaitable twins of the database functions, under the same names. Each
+# call runs the blocking supabase-py request on a shared thread pool, so a
+# page can start its independent queries together and wait roughly as long
+# as the slowest one:
+#
+#     stats, (tracks, cursor) = run_concurrently(
+#         get_user_stats(user_id),
+#         list_user_tracks(user_id),
+#     )
+#
+# Return values and error handling are those of the sync functions, which
+# stay the API for code that makes a single call. Calls run in the caller's
+# context, so their round trips count towards the current Streamlit run.
+
+T = TypeVar('T')
+
+_executor = ThreadPoolExecutor(max_workers=Config.DATABASE_CONCURRENCY, thread_name_prefix='database')
+
+def _make_async(func: Callable[..., T]) -> Callable[..., Awaitable[T]]:
+    @functools.wraps(func)
+    async def call(*args, **kwargs) -> T:
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(_executor, functools.partial(context.run, func, *args, **kwargs))
+    return call
+
+def run_concurrently(*calls: Awaitable[Any]) -> List[Any]:
+    """Run the given calls at the same time from sync code; results come back in order.
+
+    Streamlit scripts run without an event loop, so pages can call this directly.
+    """
+    async def gather_calls():
+        return await asyncio.gather(*calls)
+
+    return asyncio.run(gather_calls())
+
+init_database = _make_async(database.init_database)
+get_user_by_email = _make_async(database.get_user_by_email)
+get_user_by_id = _make_async(database.get_user_by_id)
+create_user = _make_async(database.create_user)
+update_user_profile = _make_async(database.update_user_profile)
+update_user_profiles = _make_async(database.update_user_profiles)
+update_subscription_status = _make_async(database.update_subscription_status)
+get_users_due_for_transition = _make_async(database.get_users_due_for_transition)
+bulk_update_subscription_status = _make_async(database.bulk_update_subscription_status)
+create_track = _make_async(database.create_track)
+create_tracks = _make_async(database.create_tracks)
+list_user_tracks = _make_async(database.list_user_tracks)
+get_track_details = _make_async(database.get_track_details)
+get_user_stats = _make_async(database.get_user_stats)
+record_portfolio_view = _make_async(database.record_portfolio_view)
+count_tracks_by_content_hash = _make_async(database.count_tracks_by_content_hash)
+update_track_file_path = _make_async(database.update_track_file_path)
+increment_play_count = _make_async(database.increment_play_count)
+record_track_plays = _make_async(database.record_track_plays)
+ensure_track_play_partitions = _make_async(database.ensure_track_play_partitions)
+rollup_track_plays = _make_async(database.rollup_track_plays)
+expire_track_plays = _make_async(database.expire_track_plays)
+list_daily_plays = _make_async(database.list_daily_plays)
+get_track_titles = _make_async(database.get_track_titles)
+record_payment = _make_async(database.record_payment)
+record_payments = _make_async(database.record_payments)
+apply_stripe_payments = _make_async(database.apply_stripe_payments)
+get_payment_history = _make_async(database.get_payment_history)
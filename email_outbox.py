@@ -0,0 +1,281 @@
+import os
+import json
+import time
+import random
+import select
+import sqlite3
+import threading
+import http.client
+from contextlib import closing
+from typing import Optional, Dict, Any, List, Tuple
+from urllib.parse import urlsplit
+from sendgrid.helpers.mail import Mail, Email, To, Content
+from config import Config
+from metrics import instrument, record_error, record_round_trip
+
+# Outgoing email is written to a local SQLite outbox and sent by a
+# background worker, so callers never wait on SendGrid. The worker keeps
+# one HTTPS connection to the API open across messages. Failed sends are
+# retried with exponential backoff, and a lease on each claimed message
+# stops two processes sharing the outbox from sending it twice.
+
+SEND_PATH = '/v3/mail/send'
+LEASE_SECONDS = 120
+
+class DeliveryUnknownError(Exception):
+    """The request was sent but no response came back; SendGrid may have accepted it"""
+
+class SendGridTransport:
+    """Keep-alive client for the SendGrid v3 mail send endpoint.
+
+    A request is repeated, with backoff, only when it cannot have been
+    accepted: the connection could not be opened, or SendGrid answered 429
+    or 5xx. A failure after the request went out raises DeliveryUnknownError
+    instead, so one payload of up to EMAIL_PERSONALIZATIONS_PER_REQUEST
+    recipients is never sent twice. The host comes from SENDGRID_API_HOST,
+    so tests can point it at a local HTTP stand-in.
+    """
+
+    def __init__(self, api_key: str, api_host: str, timeout: float):
+        self.api_key = api_key
+        self.url = urlsplit(api_host)
+        self.timeout = timeout
+        self._connection: Optional[http.client.HTTPConnection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> http.client.HTTPConnection:
+        # An idle kept-alive socket that reads as ready has been closed by the server
+        if self._connection is not None and self._connection.sock is not None:
+            if select.select([self._connection.sock], [], [], 0)[0]:
+                self.close()
+
+        if self._connection is None:
+            connection_class = http.client.HTTPSConnection if self.url.scheme == 'https' else http.client.HTTPConnection
+            self._connection = connection_class(self.url.netloc, timeout=self.timeout)
+
+        if self._connection.sock is None:
+            try:
+                self._connection.connect()
+            except OSError:
+                self.close()
+                raise
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _post(self, connection: http.client.HTTPConnection, body: bytes, headers: Dict[str, str]) -> Tuple[int, str]:
+        record_round_trip('sendgrid')
+        try:
+            connection.request('POST', SEND_PATH, body=body, headers=headers)
+            response = connection.getresponse()
+            return response.status, response.read().decode('utf-8', 'replace')
+        except (http.client.HTTPException, OSError) as e:
+            self.close()
+            raise DeliveryUnknownError(str(e)) from e
+
+    def send(self, payload: Dict[str, Any]) -> Tuple[int, str]:
+        """POST one mail/send payload and return (status, response body)"""
+        body = json.dumps(payload).encode('utf-8')
+        headers = {
+            'Authorization': f"Bearer {self.api_key}",
+            'Content-Type': 'application/json',
+        }
+
+        with self._lock:
+            for attempt in range(1, Config.EMAIL_SEND_ATTEMPTS + 1):
+                last_attempt = attempt == Config.EMAIL_SEND_ATTEMPTS
+                try:
+                    connection = self._connect()
+                except OSError:
+                    if last_attempt:
+                        raise
+                else:
+                    status, text = self._post(connection, body, headers)
+                    if last_attempt or not (status == 429 or status >= 500):
+                        return status, text
+
+                time.sleep(Config.EMAIL_SEND_RETRY_BASE_SECONDS * 2 ** (attempt - 1) * random.uniform(0.8, 1.2))
+
+def build_payload(to_email: str, from_email: str, subject: str, text_content: Optional[str], html_content: Optional[str]) -> Dict[str, Any]:
+    message = Mail(
+        from_email=Email(from_email),
+        to_emails=To(to_email),
+        subject=subject
+    )
+
+    if html_content:
+        message.content = Content("text/html", html_content)
+    elif text_content:
+        message.content = Content("text/plain", text_content)
+
+    return message.get()
+
+def _connect() -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(Config.EMAIL_OUTBOX_DB) or '.', exist_ok=True)
+    connection = sqlite3.connect(Config.EMAIL_OUTBOX_DB, timeout=30, isolation_level=None)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('''
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            recipient TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            next_attempt_at REAL NOT NULL,
+            lease_until REAL NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            sent_at REAL,
+            last_error TEXT
+        )
+    ''')
+    connection.execute('CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(sent_at, next_attempt_at)')
+    return connection
+
+_wake = threading.Event()
+_worker: Optional[threading.Thread] = None
+_worker_lock = threading.Lock()
+_transport: Optional[SendGridTransport] = None
+
+def enqueue_payload(recipient: str, payload: Dict[str, Any]) -> int:
+    """Store a mail/send payload in the outbox and return its id"""
+    now = time.time()
+    with closing(_connect()) as connection:
+        cursor = connection.execute(
+            'INSERT INTO outbox (recipient, payload, created_at, next_attempt_at) VALUES (?, ?, ?, ?)',
+            (recipient, json.dumps(payload), now, now)
+        )
+        message_id = cursor.lastrowid
+
+    start_worker()
+    _wake.set()
+    return message_id
+
+def enqueue_email(to_email: str, from_email: str, subject: str, text_content: Optional[str] = None, html_content: Optional[str] = None) -> int:
+    return enqueue_payload(to_email, build_payload(to_email, from_email, subject, text_content, html_content))
+
+def _claim_due(connection: sqlite3.Connection, limit: int) -> List[Tuple[int, str, str, int]]:
+    now = time.time()
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        rows = connection.execute(
+            '''UPDATE outbox SET lease_until = ?
+               WHERE id IN (
+                   SELECT id FROM outbox
+                   WHERE sent_at IS NULL AND attempts < ? AND next_attempt_at <= ? AND lease_until <= ?
+                   ORDER BY next_attempt_at LIMIT ?
+               )
+               RETURNING id, recipient, payload, attempts''',
+            (now + LEASE_SECONDS, Config.EMAIL_MAX_ATTEMPTS, now, now, limit)
+        ).fetchall()
+        connection.execute('COMMIT')
+    except Exception:
+        connection.execute('ROLLBACK')
+        raise
+    return rows
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter, capped at EMAIL_RETRY_MAX_SECONDS"""
+    delay = min(Config.EMAIL_RETRY_MAX_SECONDS, Config.EMAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+def _get_transport() -> SendGridTransport:
+    global _transport
+    with _worker_lock:
+        if _transport is None:
+            _transport = SendGridTransport(Config.SENDGRID_API_KEY, Config.SENDGRID_API_HOST, Config.EMAIL_SEND_TIMEOUT_SECONDS)
+        return _transport
+
+@instrument('sendgrid')
+def deliver_payload(recipient: str, payload: Dict[str, Any]) -> Tuple[bool, bool, Optional[str]]:
+    """Send a mail/send payload now on the shared connection; returns (sent, retryable, error)"""
+    if Config.SENDGRID_API_KEY == 'default_key':
+        print(f"Email would be sent to {recipient}: {payload['subject']}")
+        return True, False, None
+
+    try:
+        status, body = _get_transport().send(payload)
+    except DeliveryUnknownError as e:
+        # Retrying could deliver the message twice; leave it failed for a person to check
+        record_error(e)
+        return False, False, f"Delivery unknown: {e}"
+    except (http.client.HTTPException, OSError) as e:
+        record_error(e)
+        return False, True, str(e)
+
+    if 200 <= status < 300:
+        return True, False, None
+
+    record_error(f"http_{status}")
+
+    # Rate limits and server errors are worth retrying; other 4xx will fail the same way again
+    return False, status == 429 or status >= 500, f"HTTP {status}: {body[:500]}"
+
+def process_outbox(limit: Optional[int] = None) -> int:
+    """Send due messages, one batch at a time; returns how many were sent"""
+    sent = 0
+    with closing(_connect()) as connection:
+        while True:
+            rows = _claim_due(connection, limit or Config.EMAIL_BATCH_SIZE)
+            if not rows:
+                return sent
+
+            for message_id, recipient, payload, attempts in rows:
+                delivered, retryable, error = deliver_payload(recipient, json.loads(payload))
+                attempts += 1
+
+                if delivered:
+                    connection.execute('UPDATE outbox SET sent_at = ?, attempts = ?, last_error = NULL WHERE id = ?', (time.time(), attempts, message_id))
+                    sent += 1
+                    continue
+
+                if not retryable:
+                    attempts = Config.EMAIL_MAX_ATTEMPTS
+                else:
+                    print(f"Email to {recipient} failed (attempt {attempts}): {error}")
+
+                connection.execute(
+                    'UPDATE outbox SET attempts = ?, next_attempt_at = ?, lease_until = 0, last_error = ? WHERE id = ?',
+                    (attempts, time.time() + retry_delay(attempts), error, message_id)
+                )
+
+def drain_outbox(timeout: float = 30.0) -> bool:
+    """Send queued messages, including retries that fall due within `timeout`.
+
+    Meant for short-lived processes about to exit. Returns True if nothing
+    was left waiting when it finished.
+    """
+    deadline = time.time() + timeout
+    while True:
+        process_outbox()
+        with closing(_connect()) as connection:
+            next_attempt_at = connection.execute(
+                'SELECT min(next_attempt_at) FROM outbox WHERE sent_at IS NULL AND attempts < ?',
+                (Config.EMAIL_MAX_ATTEMPTS,)
+            ).fetchone()[0]
+
+        if next_attempt_at is None:
+            return True
+        if next_attempt_at > deadline:
+            return False
+        time.sleep(max(0.0, min(1.0, next_attempt_at - time.time())))
+
+def _run_worker():
+    while True:
+        try:
+            process_outbox()
+        except Exception as e:
+            print(f"Error processing email outbox: {e}")
+
+        _wake.wait(Config.EMAIL_POLL_INTERVAL_SECONDS)
+        _wake.clear()
+
+def start_worker():
+    """Start the background sender once per process"""
+    global _worker
+
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_run_worker, name='email-outbox', daemon=True)
+            _worker.start()
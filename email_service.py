@@ -1,92 +1,118 @@
-import os
-import sys
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail, Email, To, Content
+import time
+from html import escape
+from dataclasses import dataclass
 from datetime import datetime
+from typing import Dict, List, Tuple, Any
+from config import Config
+from email_outbox import enqueue_email, enqueue_payload, deliver_payload
+from metrics import instrument, record_error
 
-# Get SendGrid API key from environment
-sendgrid_key = os.getenv('SENDGRID_API_KEY', 'default_key')
-
+@instrument('email')
 def send_email(to_email, from_email, subject, text_content=None, html_content=None):
-    """Send email using SendGrid"""
-    if sendgrid_key == 'default_key':
-        print(f"Email would be sent to {to_email}: {subject}")
-        return True
-    
+    """Queue an email in the outbox; a background worker sends it through SendGrid"""
     try:
-        sg = SendGridAPIClient(sendgrid_key)
-
-        message = Mail(
-            from_email=Email(from_email),
-            to_emails=To(to_email),
-            subject=subject
-        )
-
-        if html_content:
-            message.content = Content("text/html", html_content)
-        elif text_content:
-            message.content = Content("text/plain", text_content)
-
-        response = sg.send(message)
+        enqueue_email(to_email, from_email, subject, text_content=text_content, html_content=html_content)
         return True
-        
+
     except Exception as e:
-        print(f"SendGrid error: {e}")
+        print(f"Email outbox error: {e}")
+        record_error(e)
         return False
 
-def send_welcome_email(user_email, username):
-    """Send welcome email to new user"""
-    subject = "Welcome to Omawi Na! 🎵"
-    
-    html_content = f"""
-    <html>
-    <body>
-        <h2>Welcome to Omawi Na, {username}!</h2>
-        
-        <p>Thank you for joining Omawi Na, the professional music hub for musicians.</p>
-        
-        <h3>Your 14-Day Free Trial Has Started!</h3>
-        <p>You now have full access to all Omawi Na features:</p>
-        <ul>
-            <li>🎼 Upload and manage your music collection</li>
-            <li>👤 Create your professional musician profile</li>
-            <li>🎵 Use our built-in audio player</li>
-            <li>🌐 Share your public portfolio</li>
-            <li>📊 Track your music analytics</li>
-        </ul>
-        
-        <p><strong>Important:</strong> After your 14-day trial, you'll need to subscribe for 100 NAD quarterly to continue using Omawi Na.</p>
-        
-        <p>Get started by uploading your first track!</p>
-        
-        <p>Best regards,<br>The Omawi Na Team</p>
-    </body>
-    </html>
+@dataclass(frozen=True)
+class EmailTemplate:
+    """Subject and HTML body with -field- placeholders.
+
+    Built once at import. A single send fills the placeholders in locally;
+    a batch send passes them to SendGrid as per-recipient substitutions, so
+    the body is sent once per request rather than once per recipient.
     """
-    
-    return send_email(
-        user_email,
-        "noreply@omawina.app",
-        subject,
-        html_content=html_content
-    )
+    from_email: str
+    subject: str
+    html_content: str
+    fields: Tuple[str, ...]
 
-def send_payment_reminder(user_email, username, days_remaining):
-    """Send payment reminder email"""
-    subject = f"Omawi Na Payment Reminder - {days_remaining} days remaining"
-    
-    html_content = f"""
+    def substitutions(self, values: Dict[str, Any]) -> Dict[str, str]:
+        return {f"-{field}-": escape(str(values[field])) for field in self.fields}
+
+    def render(self, values: Dict[str, Any]) -> Tuple[str, str]:
+        subject, html_content = self.subject, self.html_content
+        for tag, value in self.substitutions(values).items():
+            subject = subject.replace(tag, value)
+            html_content = html_content.replace(tag, value)
+        return subject, html_content
+
+@dataclass
+class BatchReport:
+    recipients: int
+    status: str
+    seconds: float
+
+    @property
+    def recipients_per_second(self) -> float:
+        return self.recipients / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return f"{self.recipients} recipients {self.status} in {self.seconds:.2f}s ({self.recipients_per_second:.0f}/s)"
+
+def send_template(to_email, template: EmailTemplate, values: Dict[str, Any]):
+    subject, html_content = template.render(values)
+    return send_email(to_email, template.from_email, subject, html_content=html_content)
+
+@instrument('email')
+def send_template_batch(template: EmailTemplate, recipients: List[Dict[str, Any]]) -> List[BatchReport]:
+    """Send one template to many recipients, EMAIL_PERSONALIZATIONS_PER_REQUEST per API request.
+
+    Each recipient is a dict with 'email' and the template's fields. A
+    batch that fails with a retryable error is handed to the outbox, which
+    retries it with backoff. Returns one report per batch.
+    """
+    reports = []
+    batch_size = Config.EMAIL_PERSONALIZATIONS_PER_REQUEST
+
+    for start in range(0, len(recipients), batch_size):
+        batch = recipients[start:start + batch_size]
+        payload = {
+            'personalizations': [
+                {'to': [{'email': recipient['email']}], 'substitutions': template.substitutions(recipient)}
+                for recipient in batch
+            ],
+            'from': {'email': template.from_email},
+            'subject': template.subject,
+            'content': [{'type': 'text/html', 'value': template.html_content}],
+        }
+
+        started = time.monotonic()
+        delivered, retryable, error = deliver_payload(f"{len(batch)} recipients", payload)
+
+        if delivered:
+            status = 'sent'
+        elif retryable:
+            enqueue_payload(f"{len(batch)} recipients", payload)
+            status = 'queued for retry'
+        else:
+            print(f"SendGrid batch error: {error}")
+            status = 'failed'
+
+        reports.append(BatchReport(len(batch), status, time.monotonic() - started))
+
+    return reports
+
+PAYMENT_REMINDER_TEMPLATE = EmailTemplate(
+    from_email="billing@omawina.app",
+    subject="Omawi Na Payment Reminder - -days_remaining- days remaining",
+    html_content="""
     <html>
     <body>
-        <h2>Payment Reminder, {username}</h2>
+        <h2>Payment Reminder, -username-</h2>
         
-        <p>Your Omawi Na subscription payment is due in {days_remaining} days.</p>
+        <p>Your Omawi Na subscription payment is due in -days_remaining- days.</p>
         
         <p><strong>Subscription Details:</strong></p>
         <ul>
             <li>Amount: 100 NAD</li>
             <li>Billing Period: Quarterly (every 3 months)</li>
-            <li>Due Date: {days_remaining} days from now</li>
+            <li>Due Date: -days_remaining- days from now</li>
         </ul>
         
         <p>To avoid any interruption to your service, please ensure your payment method is up to date.</p>
@@ -98,23 +124,17 @@ def send_payment_reminder(user_email, username, days_remaining):
         <p>Best regards,<br>The Omawi Na Team</p>
     </body>
     </html>
-    """
-    
-    return send_email(
-        user_email,
-        "billing@omawina.app",
-        subject,
-        html_content=html_content
-    )
+    """,
+    fields=('username', 'days_remaining')
+)
 
-def send_grace_period_warning(user_email, username):
-    """Send grace period warning email"""
-    subject = "Omawi Na Account: Payment Overdue - 7 Days to Avoid Suspension"
-    
-    html_content = f"""
+GRACE_PERIOD_TEMPLATE = EmailTemplate(
+    from_email="billing@omawina.app",
+    subject="Omawi Na Account: Payment Overdue - 7 Days to Avoid Suspension",
+    html_content="""
     <html>
     <body>
-        <h2>Payment Overdue Warning, {username}</h2>
+        <h2>Payment Overdue Warning, -username-</h2>
         
         <p><strong style="color: #ff6b6b;">Your Omawi Na subscription payment is overdue.</strong></p>
         
@@ -137,23 +157,17 @@ def send_grace_period_warning(user_email, username):
         <p>Best regards,<br>The Omawi Na Team</p>
     </body>
     </html>
-    """
-    
-    return send_email(
-        user_email,
-        "billing@omawina.app",
-        subject,
-        html_content=html_content
-    )
+    """,
+    fields=('username',)
+)
 
-def send_suspension_notification(user_email, username):
-    """Send account suspension notification"""
-    subject = "Omawi Na Account Suspended - Payment Required"
-    
-    html_content = f"""
+SUSPENSION_TEMPLATE = EmailTemplate(
+    from_email="billing@omawina.app",
+    subject="Omawi Na Account Suspended - Payment Required",
+    html_content="""
     <html>
     <body>
-        <h2>Account Suspended, {username}</h2>
+        <h2>Account Suspended, -username-</h2>
         
         <p><strong style="color: #dc3545;">Your Omawi Na account has been suspended due to overdue payment.</strong></p>
         
@@ -179,15 +193,71 @@ def send_suspension_notification(user_email, username):
         <p>Best regards,<br>The Omawi Na Team</p>
     </body>
     </html>
+    """,
+    fields=('username',)
+)
+
+def send_welcome_email(user_email, username):
+    """Send welcome email to new user"""
+    subject = "Welcome to Omawi Na! 🎵"
+    
+    html_content = f"""
+    <html>
+    <body>
+        <h2>Welcome to Omawi Na, {username}!</h2>
+        
+        <p>Thank you for joining Omawi Na, the professional music hub for musicians.</p>
+        
+        <h3>Your 14-Day Free Trial Has Started!</h3>
+        <p>You now have full access to all Omawi Na features:</p>
+        <ul>
+            <li>🎼 Upload and manage your music collection</li>
+            <li>👤 Create your professional musician profile</li>
+            <li>🎵 Use our built-in audio player</li>
+            <li>🌐 Share your public portfolio</li>
+            <li>📊 Track your music analytics</li>
+        </ul>
+        
+        <p><strong>Important:</strong> After your 14-day trial, you'll need to subscribe for 100 NAD quarterly to continue using Omawi Na.</p>
+        
+        <p>Get started by uploading your first track!</p>
+        
+        <p>Best regards,<br>The Omawi Na Team</p>
+    </body>
+    </html>
     """
     
     return send_email(
         user_email,
-        "billing@omawina.app",
+        "noreply@omawina.app",
         subject,
         html_content=html_content
     )
 
+def send_payment_reminder(user_email, username, days_remaining):
+    """Send payment reminder email"""
+    return send_template(user_email, PAYMENT_REMINDER_TEMPLATE, {'username': username, 'days_remaining': days_remaining})
+
+def send_payment_reminders(recipients):
+    """Send payment reminders to many users in batched API requests"""
+    return send_template_batch(PAYMENT_REMINDER_TEMPLATE, recipients)
+
+def send_grace_period_warning(user_email, username):
+    """Send grace period warning email"""
+    return send_template(user_email, GRACE_PERIOD_TEMPLATE, {'username': username})
+
+def send_grace_period_warnings(recipients):
+    """Send grace period warnings to many users in batched API requests"""
+    return send_template_batch(GRACE_PERIOD_TEMPLATE, recipients)
+
+def send_suspension_notification(user_email, username):
+    """Send account suspension notification"""
+    return send_template(user_email, SUSPENSION_TEMPLATE, {'username': username})
+
+def send_suspension_notifications(recipients):
+    """Send suspension notifications to many users in batched API requests"""
+    return send_template_batch(SUSPENSION_TEMPLATE, recipients)
+
 def send_payment_confirmation(user_email, username, amount, next_due_date):
     """Send payment confirmation email"""
     subject = "Omawi Na Payment Confirmed - Thank You!"
@@ -0,0 +1,209 @@
+import os
+import time
+import uuid
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field, replace
+from typing import Optional, Dict, Any, List
+from config import Config
+from database import create_tracks
+from blob_store import commit_blob, release_blob, unpin_blob
+from audio_utils import StagedUpload, discard_staged_file
+from audio_metadata import extract_metadata
+from waveform import generate_peaks
+
+@dataclass
+class IngestJob:
+    job_id: str
+    user_id: str
+    staged_files: List[StagedUpload]
+    track_fields: Dict[str, Any]
+    status: str = 'queued'
+    progress: float = 0.0
+    message: str = 'Waiting for a worker'
+    track_ids: List[str] = field(default_factory=list)
+    tracks: List[Dict[str, Any]] = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in ('done', 'failed')
+
+_jobs: Dict[str, IngestJob] = {}
+_jobs_lock = threading.Lock()
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_coordinator_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _get_pools():
+    global _process_pool, _coordinator_pool
+
+    with _pool_lock:
+        if _process_pool is None:
+            workers = Config.INGEST_WORKERS or os.cpu_count() or 1
+            # Spawn rather than fork: the Streamlit server is multi-threaded
+            _process_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            _coordinator_pool = ThreadPoolExecutor(
+                max_workers=workers * 2,
+                thread_name_prefix='ingest'
+            )
+
+    return _process_pool, _coordinator_pool
+
+def analyze_audio(file_path: str, content_hash: str) -> Dict[str, Any]:
+    """CPU-bound per-file analysis, executed in a worker process"""
+    try:
+        metadata = extract_metadata(file_path, content_hash).to_dict()
+    except Exception as e:
+        print(f"Error reading audio metadata for {file_path}: {e}")
+        metadata = {}
+
+    try:
+        generate_peaks(file_path)
+    except Exception as e:
+        print(f"Error generating waveform peaks for {file_path}: {e}")
+
+    return metadata
+
+def _apply_tag_fallbacks(track_fields: Dict[str, Any], metadata: Dict[str, Any]):
+    for field_name, tag in (('title', 'title'), ('artist', 'artist'), ('album', 'album'), ('genre', 'genre')):
+        if not track_fields.get(field_name) and metadata.get(tag):
+            track_fields[field_name] = metadata[tag]
+
+    if not track_fields.get('release_year') and metadata.get('year'):
+        try:
+            track_fields['release_year'] = int(metadata['year'][:4])
+        except ValueError:
+            pass
+
+def _update_job(job: IngestJob, **changes):
+    with _jobs_lock:
+        for key, value in changes.items():
+            setattr(job, key, value)
+        if job.is_finished and job.finished_at is None:
+            job.finished_at = time.time()
+
+def _build_track_row(job: IngestJob, staged: StagedUpload, file_path: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+    track_fields = dict(job.track_fields)
+    _apply_tag_fallbacks(track_fields, metadata)
+
+    if not track_fields.get('title'):
+        track_fields['title'] = os.path.splitext(staged.original_name or 'Untitled')[0]
+
+    track_fields.update(
+        user_id=job.user_id,
+        file_path=file_path,
+        file_size=staged.size,
+        duration_seconds=metadata.get('duration'),
+        content_hash=staged.content_hash
+    )
+    return track_fields
+
+def _run_job(job: IngestJob):
+    process_pool, _ = _get_pools()
+    committed = 0
+    pinned = True
+
+    try:
+        _update_job(job, status='processing', progress=0.05, message='Storing audio')
+        file_paths = []
+        for staged in job.staged_files:
+            file_path, _ = commit_blob(staged.path, staged.content_hash)
+            file_paths.append(file_path)
+            committed += 1
+
+        # Analyze every file of the job in parallel across the process pool
+        futures = {
+            process_pool.submit(analyze_audio, file_path, staged.content_hash): index
+            for index, (staged, file_path) in enumerate(zip(job.staged_files, file_paths))
+        }
+        results: List[Dict[str, Any]] = [{}] * len(futures)
+        total = len(futures)
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            results[futures[future]] = future.result()
+            _update_job(job, progress=0.1 + 0.7 * done / total, message=f'Analyzed {done} of {total}')
+
+        rows = [
+            _build_track_row(job, staged, file_path, metadata)
+            for staged, file_path, metadata in zip(job.staged_files, file_paths, results)
+        ]
+
+        _update_job(job, progress=0.9, message='Saving tracks', tracks=rows)
+        track_ids = create_tracks(rows)
+
+        # The rows now reference the blobs, or never will
+        for staged in job.staged_files:
+            unpin_blob(staged.content_hash)
+        pinned = False
+
+        if not track_ids:
+            for staged in job.staged_files:
+                release_blob(staged.content_hash)
+            _update_job(job, status='failed', message='Failed to create track records')
+            return
+
+        _update_job(
+            job,
+            status='done',
+            progress=1.0,
+            message=f'{len(track_ids)} track(s) uploaded',
+            track_ids=track_ids
+        )
+
+    except Exception as e:
+        print(f"Ingest job {job.job_id} failed: {e}")
+        for staged in job.staged_files[committed:]:
+            discard_staged_file(staged.path)
+        # Blobs already committed are deleted unless some track references them
+        for staged in job.staged_files[:committed]:
+            if pinned:
+                unpin_blob(staged.content_hash)
+            release_blob(staged.content_hash)
+        _update_job(job, status='failed', message=str(e))
+
+def _prune_finished_jobs():
+    cutoff = time.time() - Config.INGEST_JOB_RETENTION_SECONDS
+
+    with _jobs_lock:
+        expired = [job_id for job_id, job in _jobs.items() if job.finished_at and job.finished_at < cutoff]
+        for job_id in expired:
+            del _jobs[job_id]
+
+def submit_ingest(user_id: str, staged_files: List[StagedUpload], track_fields: Dict[str, Any]) -> str:
+    """Queue staged uploads for background processing and return the job id.
+
+    All files of a job share track_fields; empty fields are filled from each
+    file's tags, and the rows are inserted in one batched write.
+    """
+    _prune_finished_jobs()
+    _, coordinator_pool = _get_pools()
+
+    job = IngestJob(
+        job_id=uuid.uuid4().hex,
+        user_id=user_id,
+        staged_files=list(staged_files),
+        track_fields=dict(track_fields)
+    )
+
+    with _jobs_lock:
+        _jobs[job.job_id] = job
+
+    coordinator_pool.submit(_run_job, job)
+    return job.job_id
+
+def get_ingest_job(job_id: str) -> Optional[IngestJob]:
+    """Return a snapshot of a job, or None if it is unknown or expired"""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return replace(job) if job else None
+
+def get_ingest_jobs(job_ids: List[str]) -> List[IngestJob]:
+    with _jobs_lock:
+        return [replace(_jobs[job_id]) for job_id in job_ids if job_id in _jobs]
@@ -0,0 +1,238 @@
+"""In-process latency, error and round-trip metrics in Prometheus text format.
+
+Calls across the I/O boundaries (database, Stripe, SendGrid) are wrapped
+with `instrument`, which records a latency histogram per operation. The
+functions still swallow their failures, but report them with
+`record_error` first, so error counts are kept per operation and error
+type. The HTTP clients call `record_round_trip` once per request.
+
+Each Streamlit page calls `track_run(page)` at the top of the script.
+Round trips made until the session's next run, including those made on
+database_async's thread pool, are counted against that run and observed
+as one sample of `omawi_na_run_round_trips` for the page. The first run
+also starts the local endpoint:
+
+    curl http://127.0.0.1:9464/metrics
+"""
+import time
+import threading
+import functools
+import contextvars
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar, Union
+from config import Config
+
+T = TypeVar('T')
+
+METRICS_PATH = '/metrics'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROUND_TRIP_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observed values"""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+class RunStats:
+    def __init__(self, page: str):
+        self.page = page
+        self.round_trips = 0
+        self.last_activity = time.monotonic()
+
+_lock = threading.Lock()
+_latency: Dict[Tuple[str, str], Histogram] = {}
+_errors: Dict[Tuple[str, str, str], int] = {}
+_round_trips: Dict[str, int] = {}
+_run_round_trips: Dict[str, Histogram] = {}
+_open_runs: Dict[str, RunStats] = {}
+_gauges: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+_current_operation: contextvars.ContextVar[Optional[Tuple[str, str]]] = contextvars.ContextVar('metrics_operation', default=None)
+_current_run: contextvars.ContextVar[Optional[RunStats]] = contextvars.ContextVar('metrics_run', default=None)
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_failed = False
+_server_lock = threading.Lock()
+
+def instrument(component: str, operation: Optional[str] = None) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    """Record the latency of every call, and any exception it raises, under component/operation"""
+    def decorate(func: Callable[..., T]) -> Callable[..., T]:
+        name = operation or func.__name__
+
+        @functools.wraps(func)
+        def call(*args, **kwargs) -> T:
+            token = _current_operation.set((component, name))
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                record_error(e)
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                _current_operation.reset(token)
+                with _lock:
+                    histogram = _latency.get((component, name))
+                    if histogram is None:
+                        histogram = _latency[(component, name)] = Histogram(LATENCY_BUCKETS)
+                    histogram.observe(elapsed)
+        return call
+    return decorate
+
+def record_error(error: Union[BaseException, str]):
+    """Count a failure of the operation in progress; `error` is the exception or a short error kind"""
+    current = _current_operation.get()
+    if current is None:
+        return
+
+    kind = error if isinstance(error, str) else type(error).__name__
+    with _lock:
+        key = (current[0], current[1], kind)
+        _errors[key] = _errors.get(key, 0) + 1
+
+def record_round_trip(component: str):
+    """Count one request to a remote service, for the component and the current Streamlit run"""
+    run = _current_run.get()
+    with _lock:
+        _round_trips[component] = _round_trips.get(component, 0) + 1
+        if run is not None:
+            run.round_trips += 1
+            run.last_activity = time.monotonic()
+
+def _finish_run(run: RunStats):
+    histogram = _run_round_trips.get(run.page)
+    if histogram is None:
+        histogram = _run_round_trips[run.page] = Histogram(ROUND_TRIP_BUCKETS)
+    histogram.observe(run.round_trips)
+
+def _finish_idle_runs():
+    cutoff = time.monotonic() - Config.METRICS_RUN_IDLE_SECONDS
+    for session_id, run in list(_open_runs.items()):
+        if run.last_activity < cutoff:
+            _finish_run(_open_runs.pop(session_id))
+
+def track_run(page: str):
+    """Start counting round trips for a Streamlit script run; the session's previous run is finished"""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+    session_id = ctx.session_id if ctx else threading.current_thread().name
+    run = RunStats(page)
+
+    with _lock:
+        previous = _open_runs.pop(session_id, None)
+        if previous is not None:
+            _finish_run(previous)
+        _open_runs[session_id] = run
+
+    _current_run.set(run)
+    start_server()
+
+def register_gauges(prefix: str, collect: Callable[[], Dict[str, Any]]):
+    """Export the numeric values returned by `collect` as `<prefix>_<key>` gauges at every scrape"""
+    _gauges[prefix] = collect
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+def _format_histogram(lines: List[str], name: str, labels: Dict[str, Any], histogram: Histogram):
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        lines.append(f"{name}_bucket{_format_labels({**labels, 'le': bound})} {count}")
+    lines.append(f"{name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {histogram.count}")
+    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines: List[str] = []
+
+    with _lock:
+        _finish_idle_runs()
+
+        lines.append('# HELP omawi_na_operation_duration_seconds Time spent in calls to the database, Stripe and SendGrid.')
+        lines.append('# TYPE omawi_na_operation_duration_seconds histogram')
+        for (component, operation), histogram in sorted(_latency.items()):
+            _format_histogram(lines, 'omawi_na_operation_duration_seconds', {'component': component, 'operation': operation}, histogram)
+
+        lines.append('# HELP omawi_na_operation_errors_total Failed calls, by error type.')
+        lines.append('# TYPE omawi_na_operation_errors_total counter')
+        for (component, operation, kind), count in sorted(_errors.items()):
+            lines.append(f"omawi_na_operation_errors_total{_format_labels({'component': component, 'operation': operation, 'error': kind})} {count}")
+
+        lines.append('# HELP omawi_na_round_trips_total Requests sent to remote services.')
+        lines.append('# TYPE omawi_na_round_trips_total counter')
+        for component, count in sorted(_round_trips.items()):
+            lines.append(f"omawi_na_round_trips_total{_format_labels({'component': component})} {count}")
+
+        lines.append('# HELP omawi_na_run_round_trips Requests to remote services per Streamlit script run.')
+        lines.append('# TYPE omawi_na_run_round_trips histogram')
+        for page, histogram in sorted(_run_round_trips.items()):
+            _format_histogram(lines, 'omawi_na_run_round_trips', {'page': page}, histogram)
+
+    for prefix, collect in sorted(_gauges.items()):
+        try:
+            values = collect()
+        except Exception as e:
+            print(f"Error collecting {prefix} metrics: {e}")
+            continue
+
+        for key, value in values.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f"# TYPE {prefix}_{key} gauge")
+                lines.append(f"{prefix}_{key} {value}")
+
+    return '\n'.join(lines) + '\n'
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'OmawiNaMetrics/1.0'
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != METRICS_PATH:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+
+        body = render().encode('utf-8')
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_server() -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics from a background thread, once per process; METRICS_PORT=0 turns it off"""
+    global _server, _server_failed
+
+    with _server_lock:
+        if _server is None and Config.METRICS_PORT and not _server_failed:
+            try:
+                _server = ThreadingHTTPServer((Config.METRICS_HOST, Config.METRICS_PORT), MetricsRequestHandler)
+            except OSError as e:
+                # Another process holds the port; don't retry on every run
+                print(f"Metrics endpoint not started on port {Config.METRICS_PORT}: {e}")
+                _server_failed = True
+                return None
+
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name='metrics-server', daemon=True).start()
+
+        return _server
@@ -1,8 +1,12 @@
 import streamlit as st
+import pandas as pd
 from auth import require_auth
-from database import get_user_tracks
+from metrics import track_run
+from database import list_user_tracks, get_track_titles, get_user_stats
+import database_async as db
+from analytics import get_play_series, moving_average, period_over_period
 from payment import check_subscription_status, calculate_days_remaining
-from audio_utils import format_duration, get_file_size_mb
+from audio_utils import get_stream_url, format_duration, get_file_size_mb
 
 st.set_page_config(
     page_title="Dashboard - Omawi Na",
@@ -10,6 +14,8 @@ st.set_page_config(
     layout="wide"
 )
 
+track_run('Dashboard')
+
 # Require authentication
 user = require_auth()
 
@@ -30,26 +36,82 @@ elif subscription_status == 'suspended':
 else:
     st.success("✅ Subscription Active")
 
-# Get user tracks
-tracks = get_user_tracks(user['id'])
+# Loaded tracks and the cursor for the next page are kept across reruns, so
+# "Load More" fetches one page and other interactions fetch none. The list
+# starts over when the track count changes, e.g. after an upload.
+listing = st.session_state.get('dashboard_tracks')
+if listing is None or listing['user_id'] != user['id']:
+    # The stats row and the first page of tracks are fetched at the same time
+    stats, (tracks, next_cursor) = db.run_concurrently(
+        db.get_user_stats(user['id']),
+        db.list_user_tracks(user['id'])
+    )
+else:
+    stats = get_user_stats(user['id'])
+    tracks, next_cursor = listing['tracks'], listing['next_cursor']
+    if stats['track_count'] != listing['track_count']:
+        tracks, next_cursor = list_user_tracks(user['id'])
+
+st.session_state.dashboard_tracks = {
+    'user_id': user['id'],
+    'track_count': stats['track_count'],
+    'tracks': tracks,
+    'next_cursor': next_cursor
+}
 
 # Statistics
 col1, col2, col3, col4 = st.columns(4)
 
 with col1:
-    st.metric("Total Tracks", len(tracks))
+    st.metric("Total Tracks", stats['track_count'])
 
 with col2:
-    total_plays = sum(track['play_count'] for track in tracks)
-    st.metric("Total Plays", total_plays)
+    st.metric("Total Plays", stats['total_plays'])
 
 with col3:
-    total_duration = sum(track['duration_seconds'] or 0 for track in tracks)
-    st.metric("Total Duration", format_duration(total_duration))
+    st.metric("Total Duration", format_duration(stats['total_duration_seconds']))
 
 with col4:
-    total_size = sum(track['file_size'] or 0 for track in tracks)
-    st.metric("Storage Used", f"{get_file_size_mb(total_size)} MB")
+    st.metric("Storage Used", f"{get_file_size_mb(stats['total_file_size'])} MB")
+
+st.markdown("---")
+
+@st.fragment
+def show_play_analytics():
+    st.subheader("📈 Play Analytics")
+
+    period = st.radio("Period", [7, 30, 90], format_func=lambda days: f"Last {days} days", horizontal=True, key="analytics_period")
+    series = get_play_series(user['id'])
+
+    # Totals for the selected period against the period before it
+    plays, _, plays_delta, _ = period_over_period(series.catalog_plays, period)
+    listeners, _, listeners_delta, _ = period_over_period(series.catalog_listeners, period)
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.metric("Plays", int(plays), int(plays_delta))
+
+    with col2:
+        st.metric("Listeners", int(listeners), int(listeners_delta))
+
+    recent = series.last(period)
+    chart = pd.DataFrame({
+        "Plays": recent.catalog_plays,
+        "7-day average": moving_average(series.catalog_plays, 7)[-period:]
+    }, index=pd.to_datetime(recent.days))
+    st.line_chart(chart)
+
+    top_tracks = recent.top_tracks()
+    if top_tracks:
+        titles = get_track_titles([track_id for track_id, _ in top_tracks])
+        st.markdown("**Most played**")
+        for track_id, track_plays in top_tracks:
+            st.markdown(f"- {titles.get(track_id, 'Deleted track')}: {track_plays} plays")
+    else:
+        st.info("No plays in this period yet. Daily statistics are updated every hour.")
+
+show_play_analytics()
 
 st.markdown("---")
 
@@ -108,7 +170,7 @@ else:
                 
                 # Audio player placeholder
                 if track['file_path']:
-                    st.audio(track['file_path'])
+                    st.audio(get_stream_url(track['file_path']))
                 
                 st.markdown(f"*Uploaded: {track['created_at'].strftime('%Y-%m-%d')}*")
         
@@ -141,12 +203,20 @@ else:
                     
                     # Audio player placeholder
                     if track['file_path']:
-                        st.audio(track['file_path'])
+                        st.audio(get_stream_url(track['file_path']))
                     
                     st.markdown(f"*Uploaded: {track['created_at'].strftime('%Y-%m-%d')}*")
         
         st.markdown("---")
 
+    if next_cursor:
+        def load_more_tracks():
+            listing = st.session_state.dashboard_tracks
+            page, listing['next_cursor'] = list_user_tracks(user['id'], after=listing['next_cursor'])
+            listing['tracks'] = listing['tracks'] + page
+
+        st.button("⬇️ Load More Tracks", on_click=load_more_tracks, use_container_width=True)
+
 # Portfolio link
 st.subheader("🌐 Your Public Portfolio")
 portfolio_url = f"https://omawina.app/{user['username']}"
@@ -1,9 +1,25 @@
 import streamlit as st
-import os
+import streamlit.components.v1 as components
 from auth import require_auth
-from database import create_track, update_track_file_path
+from metrics import track_run
+from config import config
 from payment import check_subscription_status
-from audio_utils import validate_audio_file, get_audio_metadata, save_uploaded_file
+from audio_utils import (
+    validate_audio_file,
+    stage_uploaded_file,
+    stage_archive,
+    discard_staged_file,
+    format_duration,
+    get_file_size_mb
+)
+from ingest_worker import submit_ingest, get_ingest_jobs
+from resumable_upload import (
+    ResumableUploadError,
+    create_upload_session,
+    get_upload_session,
+    complete_upload,
+    generate_resumable_uploader_html
+)
 
 st.set_page_config(
     page_title="Upload Music - Omawi Na",
@@ -11,6 +27,8 @@ st.set_page_config(
     layout="wide"
 )
 
+track_run('Upload Music')
+
 # Require authentication
 user = require_auth()
 
@@ -26,171 +44,269 @@ st.title("🎵 Upload New Track")
 if subscription_status == 'grace_period':
     st.warning("⚠️ Your payment is overdue. Please update your subscription to avoid account suspension.")
 
-# Upload form
-with st.form("upload_track_form", clear_on_submit=True):
-    st.subheader("📁 Select Audio File")
+if 'ingest_jobs' not in st.session_state:
+    st.session_state.ingest_jobs = []
+
+tab_single, tab_bulk, tab_large = st.tabs(["🎵 Single Track", "💿 Album / Bulk Import", "📦 Large Files"])
+
+with tab_single:
+    with st.form("upload_track_form", clear_on_submit=True):
+        st.subheader("📁 Select Audio File")
     
-    uploaded_file = st.file_uploader(
-        "Choose an audio file",
-        type=['mp3', 'wav', 'flac'],
-        help="Supported formats: MP3, WAV, FLAC (Max 50MB)"
-    )
+        uploaded_file = st.file_uploader(
+            "Choose an audio file",
+            type=['mp3', 'wav', 'flac'],
+            help="Supported formats: MP3, WAV, FLAC (Max 50MB)"
+        )
     
-    # Metadata section
-    st.subheader("📝 Track Information")
+        # Metadata section
+        st.subheader("📝 Track Information")
     
-    col1, col2 = st.columns(2)
+        col1, col2 = st.columns(2)
     
-    with col1:
-        title = st.text_input("Track Title *", placeholder="Enter track title")
-        artist = st.text_input("Artist *", value=user.get('username', ''), placeholder="Artist name")
-        album = st.text_input("Album", placeholder="Album name (optional)")
-        genre = st.selectbox(
-            "Genre",
-            ["", "Rock", "Pop", "Hip Hop", "Jazz", "Blues", "Electronic", "Country", 
-             "Classical", "R&B", "Reggae", "Folk", "Punk", "Metal", "Indie", "Other"]
-        )
+        with col1:
+            title = st.text_input("Track Title *", placeholder="Enter track title")
+            artist = st.text_input("Artist *", value=user.get('username', ''), placeholder="Artist name")
+            album = st.text_input("Album", placeholder="Album name (optional)")
+            genre = st.selectbox(
+                "Genre",
+                ["", "Rock", "Pop", "Hip Hop", "Jazz", "Blues", "Electronic", "Country", 
+                 "Classical", "R&B", "Reggae", "Folk", "Punk", "Metal", "Indie", "Other"]
+            )
     
-    with col2:
-        release_year = st.number_input(
-            "Release Year", 
-            min_value=1900, 
-            max_value=2030, 
-            value=None,
-            placeholder="YYYY"
-        )
-        producer_credits = st.text_input("Producer Credits", placeholder="Producer name (optional)")
-        featured_artists = st.text_input("Featured Artists", placeholder="Featured artists (optional)")
-        cover_art_url = st.text_input("Cover Art URL", placeholder="HTTP URL to cover art (optional)")
+        with col2:
+            release_year = st.number_input(
+                "Release Year", 
+                min_value=1900, 
+                max_value=2030, 
+                value=None,
+                placeholder="YYYY"
+            )
+            producer_credits = st.text_input("Producer Credits", placeholder="Producer name (optional)")
+            featured_artists = st.text_input("Featured Artists", placeholder="Featured artists (optional)")
+            cover_art_url = st.text_input("Cover Art URL", placeholder="HTTP URL to cover art (optional)")
     
-    # Lyrics section
-    st.subheader("📄 Lyrics (Optional)")
-    lyrics = st.text_area("Lyrics", placeholder="Enter song lyrics here...", height=100)
+        # Lyrics section
+        st.subheader("📄 Lyrics (Optional)")
+        lyrics = st.text_area("Lyrics", placeholder="Enter song lyrics here...", height=100)
     
-    # Submit button
-    submit_button = st.form_submit_button("🎵 Upload Track", type="primary")
+        # Submit button
+        submit_button = st.form_submit_button("🎵 Upload Track", type="primary")
     
-    if submit_button:
-        # Validation
-        if not uploaded_file:
-            st.error("Please select an audio file to upload.")
-        elif not title:
-            st.error("Track title is required.")
-        elif not artist:
-            st.error("Artist name is required.")
-        else:
-            # Validate file
-            is_valid, message = validate_audio_file(uploaded_file)
-            
-            if not is_valid:
-                st.error(message)
+        if submit_button:
+            # Validation
+            if not uploaded_file:
+                st.error("Please select an audio file to upload.")
+            elif not title:
+                st.error("Track title is required.")
+            elif not artist:
+                st.error("Artist name is required.")
             else:
-                with st.spinner("Uploading and processing your track..."):
+                # Validate file
+                is_valid, message = validate_audio_file(uploaded_file)
+            
+                if not is_valid:
+                    st.error(message)
+                else:
                     try:
-                        # Create temporary file to extract metadata
-                        temp_path = f"/tmp/{uploaded_file.name}"
-                        with open(temp_path, "wb") as f:
-                            f.write(uploaded_file.getbuffer())
-                        
-                        # Extract metadata from file
-                        file_metadata = get_audio_metadata(temp_path)
-                        
-                        # Use extracted metadata if fields are empty
-                        if not title and file_metadata.get('title'):
-                            title = file_metadata['title']
-                        if not artist and file_metadata.get('artist'):
-                            artist = file_metadata['artist']
-                        if not album and file_metadata.get('album'):
-                            album = file_metadata['album']
-                        if not genre and file_metadata.get('genre'):
-                            genre = file_metadata['genre']
-                        if not release_year and file_metadata.get('year'):
-                            try:
-                                release_year = int(file_metadata['year'][:4])
-                            except:
-                                pass
-                        
-                        # Save file first with temporary name
-                        temp_file_path = save_uploaded_file(uploaded_file, user['id'], "temp")
-
-                        if temp_file_path:
-                            # Create track record in database
-                            track_id = create_track(
-                                user_id=user['id'],
-                                title=title,
-                                artist=artist,
-                                album=album,
-                                genre=genre,
-                                release_year=release_year,
-                                producer_credits=producer_credits,
-                                featured_artists=featured_artists,
-                                lyrics=lyrics,
-                                file_path=temp_file_path,
-                                file_size=uploaded_file.size,
-                                duration_seconds=file_metadata.get('duration'),
-                                cover_art_url=cover_art_url if cover_art_url else None
-                            )
-
-                            if track_id:
-                                # Rename file to use track_id
-                                file_ext = os.path.splitext(uploaded_file.name)[1]
-                                user_dir = os.path.dirname(temp_file_path)
-                                final_file_path = os.path.join(user_dir, f"track_{track_id}{file_ext}")
-
-                                try:
-                                    os.rename(temp_file_path, final_file_path)
-                                    update_track_file_path(track_id, final_file_path)
-                                    file_path = final_file_path
-                                except Exception as e:
-                                    print(f"Error renaming file: {e}")
-                                    file_path = temp_file_path
-                                
-                                st.success("🎉 Track uploaded successfully!")
-                                st.balloons()
-                                
-                                # Show track details
-                                st.subheader("✅ Upload Summary")
-                                col1, col2 = st.columns(2)
-                                
-                                with col1:
-                                    st.info(f"**Title:** {title}")
-                                    st.info(f"**Artist:** {artist}")
-                                    if album:
-                                        st.info(f"**Album:** {album}")
-                                    if genre:
-                                        st.info(f"**Genre:** {genre}")
-                                
-                                with col2:
-                                    if release_year:
-                                        st.info(f"**Year:** {release_year}")
-                                    st.info(f"**File Size:** {uploaded_file.size / (1024*1024):.2f} MB")
-                                    if file_metadata.get('duration'):
-                                        minutes = int(file_metadata['duration'] // 60)
-                                        seconds = int(file_metadata['duration'] % 60)
-                                        st.info(f"**Duration:** {minutes}:{seconds:02d}")
-                                
-                                # Navigation buttons
-                                col1, col2 = st.columns(2)
-                                with col1:
-                                    if st.button("📊 Go to Dashboard", type="primary"):
-                                        st.switch_page("pages/1_Dashboard.py")
-                                with col2:
-                                    if st.button("🎵 Upload Another Track"):
-                                        st.rerun()
-                            else:
-                                st.error("Failed to save the uploaded file. Please try again.")
-                        else:
-                            st.error("Failed to create track record. Please try again.")
-                        
-                        # Clean up temp file
-                        try:
-                            os.remove(temp_path)
-                        except:
-                            pass
-                            
+                        # Stream the upload once into staging; the rest runs in the background
+                        staged = stage_uploaded_file(uploaded_file)
+                    
+                        job_id = submit_ingest(user['id'], [staged], {
+                            'title': title,
+                            'artist': artist,
+                            'album': album,
+                            'genre': genre,
+                            'release_year': release_year,
+                            'producer_credits': producer_credits,
+                            'featured_artists': featured_artists,
+                            'lyrics': lyrics,
+                            'cover_art_url': cover_art_url if cover_art_url else None
+                        })
+                        st.session_state.ingest_jobs.append(job_id)
+                        st.success(f"📥 \"{title}\" received and queued for processing.")
+                    
                     except Exception as e:
                         st.error(f"An error occurred during upload: {str(e)}")
 
+with tab_bulk:
+    with st.form("bulk_upload_form", clear_on_submit=True):
+        st.subheader("💿 Import an Album")
+        
+        bulk_files = st.file_uploader(
+            "Choose audio files or a ZIP archive",
+            type=['mp3', 'wav', 'flac', 'zip'],
+            accept_multiple_files=True,
+            help="Select several tracks at once, or one ZIP of the album. Titles are read from each file's tags."
+        )
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            bulk_artist = st.text_input("Artist *", value=user.get('username', ''), placeholder="Artist name", key="bulk_artist")
+            bulk_album = st.text_input("Album", placeholder="Album name (optional)", key="bulk_album")
+        
+        with col2:
+            bulk_genre = st.selectbox(
+                "Genre",
+                ["", "Rock", "Pop", "Hip Hop", "Jazz", "Blues", "Electronic", "Country", 
+                 "Classical", "R&B", "Reggae", "Folk", "Punk", "Metal", "Indie", "Other"],
+                key="bulk_genre"
+            )
+            bulk_release_year = st.number_input(
+                "Release Year", 
+                min_value=1900, 
+                max_value=2030, 
+                value=None,
+                placeholder="YYYY",
+                key="bulk_release_year"
+            )
+        
+        bulk_submit = st.form_submit_button("💿 Import Tracks", type="primary")
+        
+        if bulk_submit:
+            if not bulk_files:
+                st.error("Please select audio files or a ZIP archive to import.")
+            elif not bulk_artist:
+                st.error("Artist name is required.")
+            else:
+                staged_files = []
+                try:
+                    # Stream every file, or every audio entry of a ZIP, straight into staging
+                    for bulk_file in bulk_files:
+                        if bulk_file.name.lower().endswith('.zip'):
+                            archive_files, skipped = stage_archive(bulk_file)
+                            staged_files.extend(archive_files)
+                            if skipped:
+                                st.warning(f"Skipped {len(skipped)} unsupported or oversized file(s) in {bulk_file.name}.")
+                        else:
+                            is_valid, message = validate_audio_file(bulk_file)
+                            if is_valid:
+                                staged_files.append(stage_uploaded_file(bulk_file))
+                            else:
+                                st.warning(f"{bulk_file.name}: {message}")
+                    
+                    if staged_files:
+                        job_id = submit_ingest(user['id'], staged_files, {
+                            'artist': bulk_artist,
+                            'album': bulk_album,
+                            'genre': bulk_genre,
+                            'release_year': bulk_release_year
+                        })
+                        st.session_state.ingest_jobs.append(job_id)
+                        st.success(f"📥 {len(staged_files)} track(s) received and queued for processing.")
+                    else:
+                        st.error("No supported audio files were found.")
+                
+                except Exception as e:
+                    for staged in staged_files:
+                        discard_staged_file(staged.path)
+                    st.error(f"An error occurred during import: {str(e)}")
+
+with tab_large:
+    st.subheader("📦 Resumable Upload for Large Lossless Files")
+    st.caption(
+        f"WAV or FLAC files up to {config.RESUMABLE_MAX_FILE_SIZE_MB} MB. "
+        "If the connection drops, the upload retries on its own; after a longer outage, "
+        "choose the same file again and it continues where it stopped."
+    )
+    
+    upload_session = None
+    if st.session_state.get('resumable_upload_id'):
+        upload_session = get_upload_session(st.session_state.resumable_upload_id)
+    
+    if upload_session is None:
+        upload_session = create_upload_session(user['id'])
+        st.session_state.resumable_upload_id = upload_session.upload_id
+    
+    upload_url = f"{config.STREAM_BASE_URL.rstrip('/')}/resumable/{upload_session.upload_id}"
+    components.html(generate_resumable_uploader_html(upload_url), height=110)
+    
+    with st.form("resumable_upload_form", clear_on_submit=True):
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            large_title = st.text_input("Track Title", placeholder="Leave empty to use the file's tags", key="large_title")
+            large_artist = st.text_input("Artist *", value=user.get('username', ''), placeholder="Artist name", key="large_artist")
+        
+        with col2:
+            large_album = st.text_input("Album", placeholder="Album name (optional)", key="large_album")
+            large_release_year = st.number_input(
+                "Release Year", 
+                min_value=1900, 
+                max_value=2030, 
+                value=None,
+                placeholder="YYYY",
+                key="large_release_year"
+            )
+        
+        finish_upload = st.form_submit_button("✅ Finish Upload", type="primary")
+        
+        if finish_upload:
+            if not large_artist:
+                st.error("Artist name is required.")
+            else:
+                try:
+                    staged = complete_upload(st.session_state.resumable_upload_id, user['id'])
+                    job_id = submit_ingest(user['id'], [staged], {
+                        'title': large_title,
+                        'artist': large_artist,
+                        'album': large_album,
+                        'release_year': large_release_year
+                    })
+                    st.session_state.ingest_jobs.append(job_id)
+                    del st.session_state.resumable_upload_id
+                    st.success(f"📥 \"{staged.original_name}\" received and queued for processing.")
+                
+                except ResumableUploadError as e:
+                    st.error(f"Could not finish the upload: {e}")
+
+@st.fragment(run_every=config.INGEST_POLL_INTERVAL_SECONDS)
+def show_ingest_progress():
+    jobs = get_ingest_jobs(st.session_state.ingest_jobs)
+    if not jobs:
+        return
+    
+    st.subheader("⏳ Processing Queue")
+    
+    for job in jobs:
+        if len(job.staged_files) == 1:
+            label = job.track_fields.get('title') or job.staged_files[0].original_name or 'Untitled'
+        else:
+            label = job.track_fields.get('album') or f"{len(job.staged_files)} tracks"
+        
+        if job.status == 'done':
+            st.success(f"🎉 **{label}** uploaded successfully!")
+            
+            for track in job.tracks:
+                col1, col2 = st.columns(2)
+                
+                with col1:
+                    st.info(f"**Title:** {track['title']}")
+                    st.info(f"**Artist:** {track.get('artist')}")
+                    if track.get('album'):
+                        st.info(f"**Album:** {track['album']}")
+                    if track.get('genre'):
+                        st.info(f"**Genre:** {track['genre']}")
+                
+                with col2:
+                    if track.get('release_year'):
+                        st.info(f"**Year:** {track['release_year']}")
+                    st.info(f"**File Size:** {get_file_size_mb(track['file_size'])} MB")
+                    if track.get('duration_seconds'):
+                        st.info(f"**Duration:** {format_duration(track['duration_seconds'])}")
+        
+        elif job.status == 'failed':
+            st.error(f"❌ **{label}** could not be processed: {job.message}")
+        
+        else:
+            st.progress(job.progress, text=f"**{label}** — {job.message}")
+
+show_ingest_progress()
+
+if st.button("📊 Go to Dashboard", type="primary"):
+    st.switch_page("pages/1_Dashboard.py")
+
 # Tips section
 st.markdown("---")
 st.subheader("💡 Upload Tips")
@@ -201,7 +317,7 @@ with col1:
     st.markdown("""
     **File Requirements:**
     - Supported formats: MP3, WAV, FLAC
-    - Maximum file size: 50 MB
+    - Maximum file size: 50 MB (use Large Files for bigger masters)
     - High-quality audio recommended
     """)
 
@@ -209,6 +325,7 @@ with col2:
     st.markdown("""
     **Best Practices:**
     - Include complete metadata
+    - Import whole albums as a ZIP or multi-file selection
     - Use descriptive track titles
     - Add album art URL for better presentation
     """)
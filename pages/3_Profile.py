@@ -1,6 +1,7 @@
 import streamlit as st
 import json
 from auth import require_auth
+from metrics import track_run
 from database import update_user_profile, get_user_by_id
 
 st.set_page_config(
@@ -9,6 +10,8 @@ st.set_page_config(
     layout="wide"
 )
 
+track_run('Profile')
+
 # Require authentication
 user = require_auth()
 
@@ -1,6 +1,11 @@
+import time
 import streamlit as st
 from datetime import datetime, timedelta
 from auth import require_auth
+from metrics import track_run
+from config import config
+from database import get_user_by_id, invalidate_cached_user
+from stripe_local import simulate_payment_succeeded
 from payment import (
     check_subscription_status, 
     calculate_days_remaining, 
@@ -14,11 +19,23 @@ st.set_page_config(
     layout="wide"
 )
 
+track_run('Subscription')
+
 # Require authentication
 user = require_auth()
 
+# Payments are applied by the webhook receiver, a separate process whose
+# cache writes never reach this one. While a payment is pending, drop this
+# process's cached row so each render reads the current status.
+if st.session_state.get('payment_pending_until', 0) > time.time():
+    invalidate_cached_user(user['id'])
+    user = get_user_by_id(user['id']) or user
+    st.session_state.user = user
+
 # Check subscription status
 subscription_status = check_subscription_status(user['id'])
+if subscription_status == 'active':
+    st.session_state.pop('payment_pending_until', None)
 days_remaining = calculate_days_remaining(user)
 
 st.title("💳 Subscription Management")
@@ -101,30 +118,37 @@ if subscription_status in ['trial', 'grace_period', 'suspended']:
         if st.button("💳 Pay 100 NAD", type="primary", use_container_width=True):
             with st.spinner("Setting up payment..."):
                 payment_intent = create_payment_intent(user['id'], 100)
-                
-                if payment_intent:
-                    st.success("Payment setup successful!")
-                    st.info("In a real implementation, this would redirect to Stripe checkout.")
-                    
-                    # Simulate successful payment for demo
-                    st.markdown("""
-                    **Demo Mode:** Payment would be processed via Stripe.
-                    
-                    After successful payment:
-                    - Account immediately reactivated
-                    - Next payment due in 3 months
-                    - Confirmation email sent
-                    """)
-                    
-                    if st.button("✅ Simulate Successful Payment"):
-                        # In real implementation, this would be handled by Stripe webhook
-                        from payment import confirm_payment
-                        if confirm_payment(payment_intent['payment_intent_id'], user['id']):
-                            st.success("Payment confirmed! Account reactivated.")
-                            st.balloons()
-                            st.rerun()
+
+            if payment_intent:
+                st.session_state.payment_intent = payment_intent
+            else:
+                st.error("Failed to setup payment. Please try again.")
+
+        payment_intent = st.session_state.get('payment_intent')
+        if payment_intent:
+            st.success("Payment setup successful!")
+            st.info("In a real implementation, this would redirect to Stripe checkout.")
+
+            # Simulate successful payment for demo
+            st.markdown("""
+            **Demo Mode:** Payment would be processed via Stripe.
+
+            After successful payment:
+            - Stripe notifies our webhook and the account is reactivated
+            - Next payment due in 3 months
+            - Confirmation email sent
+            """)
+
+            if config.is_demo_mode() and st.button("✅ Simulate Successful Payment"):
+                # Delivered to the webhook receiver exactly as Stripe would send it
+                if simulate_payment_succeeded(payment_intent['payment_intent_id'], user['id'], 100):
+                    del st.session_state.payment_intent
+                    invalidate_cached_user(user['id'])
+                    st.session_state.payment_pending_until = time.time() + config.STRIPE_PAYMENT_PENDING_SECONDS
+                    st.success("Payment received! Your account will be reactivated in a moment.")
+                    st.balloons()
                 else:
-                    st.error("Failed to setup payment. Please try again.")
+                    st.error("Could not reach the payment webhook. Is stripe_webhooks.py running?")
 
 else:
     st.success("✅ Your subscription is active!")
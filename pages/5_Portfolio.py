@@ -1,8 +1,11 @@
 import streamlit as st
 import json
 from auth import require_auth
-from database import get_user_tracks, increment_play_count
-from audio_utils import format_duration
+from metrics import track_run
+from database import list_user_tracks, get_track_details
+import database_async as db
+from play_buffer import record_play
+from audio_utils import get_stream_url, format_duration
 
 st.set_page_config(
     page_title="Portfolio - Omawi Na",
@@ -10,11 +13,64 @@ st.set_page_config(
     layout="wide"
 )
 
+track_run('Portfolio')
+
 # Require authentication
 user = require_auth()
 
-# Get user tracks
-tracks = get_user_tracks(user['id'])
+# Loaded tracks and the cursor for the next page are kept across reruns, so
+# "Load More" fetches one page and other interactions fetch none. The list
+# starts over when the track count changes.
+listing = st.session_state.get('portfolio_tracks')
+if listing is not None and listing['user_id'] != user['id']:
+    listing = None
+
+# Count one portfolio view per session, alongside the stats and, on first load, the first page of tracks
+calls = [db.get_user_stats(user['id'])]
+if listing is None:
+    calls.append(db.list_user_tracks(user['id']))
+if not st.session_state.get('portfolio_view_recorded'):
+    calls.append(db.record_portfolio_view(user['id']))
+
+results = db.run_concurrently(*calls)
+stats = results[0]
+if listing is None:
+    tracks, next_cursor = results[1]
+else:
+    tracks, next_cursor = listing['tracks'], listing['next_cursor']
+    if stats['track_count'] != listing['track_count']:
+        tracks, next_cursor = list_user_tracks(user['id'])
+if not st.session_state.get('portfolio_view_recorded'):
+    st.session_state.portfolio_view_recorded = results[-1]
+
+st.session_state.portfolio_tracks = {
+    'user_id': user['id'],
+    'track_count': stats['track_count'],
+    'tracks': tracks,
+    'next_cursor': next_cursor
+}
+
+@st.fragment
+def show_track_extras(track):
+    # Expanders track their open state, so lyrics and credits are only fetched once opened
+    details = None
+
+    if track['has_credits']:
+        credits = st.expander("Track Credits", key=f"credits_{track['id']}", on_change="rerun")
+        if credits.open:
+            details = get_track_details(track['id']) or {}
+            with credits:
+                if details.get('producer_credits'):
+                    st.markdown(f"**Producer:** {details['producer_credits']}")
+                if details.get('featured_artists'):
+                    st.markdown(f"**Featured Artists:** {details['featured_artists']}")
+
+    if track['has_lyrics']:
+        lyrics = st.expander("View Lyrics", key=f"lyrics_{track['id']}", on_change="rerun")
+        if lyrics.open:
+            details = details or get_track_details(track['id']) or {}
+            with lyrics:
+                st.text(details.get('lyrics') or '')
 
 # Portfolio header
 st.markdown(f"# 🎵 {user['username']}")
@@ -47,15 +103,13 @@ with col2:
     col_stat1, col_stat2, col_stat3 = st.columns(3)
     
     with col_stat1:
-        st.metric("Total Tracks", len(tracks))
+        st.metric("Total Tracks", stats['track_count'])
     
     with col_stat2:
-        total_plays = sum(track['play_count'] for track in tracks)
-        st.metric("Total Plays", total_plays)
+        st.metric("Total Plays", stats['total_plays'])
     
     with col_stat3:
-        total_duration = sum(track['duration_seconds'] or 0 for track in tracks)
-        st.metric("Total Duration", format_duration(total_duration))
+        st.metric("Total Duration", format_duration(stats['total_duration_seconds']))
 
 # Social links
 social_links = user.get('social_links') or {}
@@ -126,30 +180,27 @@ else:
                 audio_col1, audio_col2 = st.columns([4, 1])
                 
                 with audio_col1:
-                    st.audio(track['file_path'])
+                    st.audio(get_stream_url(track['file_path']))
                 
                 with audio_col2:
                     if st.button("▶️ Play", key=f"play_{track['id']}"):
-                        # Increment play count
-                        increment_play_count(track['id'])
+                        # Buffered and written in the background; counts update on the next flush
+                        record_play(track['id'])
                         st.success("Playing track!")
-                        st.rerun()
-            
-            # Additional track info
-            if track['producer_credits'] or track['featured_artists']:
-                with st.expander("Track Credits"):
-                    if track['producer_credits']:
-                        st.markdown(f"**Producer:** {track['producer_credits']}")
-                    if track['featured_artists']:
-                        st.markdown(f"**Featured Artists:** {track['featured_artists']}")
             
-            # Lyrics
-            if track['lyrics']:
-                with st.expander("View Lyrics"):
-                    st.text(track['lyrics'])
+            # Credits and lyrics
+            show_track_extras(track)
             
             st.markdown("---")
 
+    if next_cursor:
+        def load_more_tracks():
+            listing = st.session_state.portfolio_tracks
+            page, listing['next_cursor'] = list_user_tracks(user['id'], after=listing['next_cursor'])
+            listing['tracks'] = listing['tracks'] + page
+
+        st.button("⬇️ Load More Tracks", on_click=load_more_tracks, use_container_width=True)
+
 # Portfolio sharing
 st.markdown("---")
 st.subheader("📱 Share This Portfolio")
@@ -1,56 +1,124 @@
 import stripe
 import os
-from datetime import datetime, timedelta
-from database import update_subscription_status, get_user_by_id, record_payment, get_payment_history
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from config import Config
+from cache import TTLCache
+from database import get_user_by_id, get_payment_history
+from metrics import instrument, record_error, record_round_trip
+from stripe_local import create_local_payment_intent
 from typing import Optional, Dict, Any
 
 stripe.api_key = os.getenv('STRIPE_SECRET_KEY', 'sk_test_default_key')
 
+@dataclass(frozen=True)
+class SubscriptionState:
+    status: str
+    # When the status next changes on its own; None if it never does
+    next_transition_at: Optional[datetime] = None
+
+def parse_timestamp(value) -> Optional[datetime]:
+    """Return a timezone-aware datetime for an ISO string or datetime; naive values are taken as UTC"""
+    if not value:
+        return None
+
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+
+    return value
+
+def compute_subscription_state(user: Dict[str, Any], now: Optional[datetime] = None) -> SubscriptionState:
+    """Derive the effective subscription status from a user's stored dates.
+
+    Pure: nothing is written. A trial ends TRIAL_PERIOD_DAYS after it
+    started; an unpaid trial or an overdue active subscription enters the
+    grace period, which ends in suspension GRACE_PERIOD_DAYS after the
+    payment was due.
+    """
+    now = now or datetime.now(timezone.utc)
+    status = user.get('subscription_status') or 'trial'
+    trial_start = parse_timestamp(user.get('trial_start_date'))
+    next_payment_due = parse_timestamp(user.get('next_payment_due'))
+    grace_period = timedelta(days=Config.GRACE_PERIOD_DAYS)
+
+    if status == 'trial':
+        trial_end = trial_start + timedelta(days=Config.TRIAL_PERIOD_DAYS) if trial_start else now
+        if now < trial_end:
+            return SubscriptionState('trial', trial_end)
+
+        if user.get('last_payment_date'):
+            status = 'active'
+        else:
+            status = 'grace_period'
+            next_payment_due = next_payment_due or trial_end
+
+    if status == 'active':
+        if not next_payment_due:
+            return SubscriptionState('active')
+        if now <= next_payment_due:
+            return SubscriptionState('active', next_payment_due)
+        status = 'grace_period'
+
+    if status == 'grace_period':
+        if not next_payment_due:
+            return SubscriptionState('grace_period')
+        grace_end = next_payment_due + grace_period
+        if now <= grace_end:
+            return SubscriptionState('grace_period', grace_end)
+        return SubscriptionState('suspended')
+
+    return SubscriptionState(status)
+
+def _state_fingerprint(user: Dict[str, Any]) -> tuple:
+    return tuple(str(user.get(key)) for key in ('subscription_status', 'trial_start_date', 'last_payment_date', 'next_payment_due'))
+
+# user id -> (fingerprint of the dates it was computed from, state); entries
+# go stale by deadline or fingerprint, never by age
+_state_cache = TTLCache(maxsize=Config.USER_CACHE_SIZE, ttl=float('inf'))
+
 def check_subscription_status(user_id: str) -> str:
+    """Return the user's effective status without writing to the database.
+
+    The state is recomputed only when the user's stored dates change or
+    its next transition time has passed; otherwise this is an in-memory
+    comparison. Persisting transitions is left to the subscription sweeper.
+    """
     user = get_user_by_id(user_id)
     if not user:
         return 'unknown'
 
-    now = datetime.now()
-    trial_start = user.get('trial_start_date')
-    if isinstance(trial_start, str):
-        trial_start = datetime.fromisoformat(trial_start.replace('Z', '+00:00'))
+    fingerprint = _state_fingerprint(user)
+    now = datetime.now(timezone.utc)
 
-    next_payment_due = user.get('next_payment_due')
-    if isinstance(next_payment_due, str):
-        next_payment_due = datetime.fromisoformat(next_payment_due.replace('Z', '+00:00'))
+    cached = _state_cache.get(str(user_id))
+    if cached and cached[0] == fingerprint:
+        state = cached[1]
+        if state.next_transition_at is None or now < state.next_transition_at:
+            return state.status
 
-    current_status = user.get('subscription_status', 'trial')
+    state = compute_subscription_state(user, now)
 
-    if current_status == 'trial':
-        trial_end = trial_start + timedelta(days=14) if trial_start else now
-        if now < trial_end:
-            return 'trial'
-        else:
-            last_payment = user.get('last_payment_date')
-            if last_payment:
-                return 'active'
-            else:
-                update_subscription_status(user_id, 'grace_period')
-                return 'grace_period'
-
-    if next_payment_due and now > next_payment_due:
-        if current_status == 'active':
-            update_subscription_status(user_id, 'grace_period')
-            return 'grace_period'
-        elif current_status == 'grace_period':
-            grace_end = next_payment_due + timedelta(days=7)
-            if now > grace_end:
-                update_subscription_status(user_id, 'suspended')
-                return 'suspended'
-            return 'grace_period'
-
-    return current_status
+    _state_cache.set(str(user_id), (fingerprint, state))
+
+    return state.status
 
+@instrument('stripe')
 def create_payment_intent(user_id: str, amount_nad: int = 100) -> Optional[Dict[str, Any]]:
+    """Start a checkout; the subscription is activated by the Stripe webhook once it succeeds"""
     try:
         amount_cents = int(amount_nad * 100)
 
+        if Config.is_demo_mode():
+            intent = create_local_payment_intent(user_id, amount_cents)
+            return {
+                'client_secret': intent['client_secret'],
+                'payment_intent_id': intent['id']
+            }
+
+        record_round_trip('stripe')
         intent = stripe.PaymentIntent.create(
             amount=amount_cents,
             currency='nad',
@@ -67,52 +135,20 @@ def create_payment_intent(user_id: str, amount_nad: int = 100) -> Optional[Dict[
 
     except Exception as e:
         print(f"Stripe payment intent error: {e}")
+        record_error(e)
         return None
 
-def confirm_payment(payment_intent_id: str, user_id: str) -> bool:
-    try:
-        intent = stripe.PaymentIntent.retrieve(payment_intent_id)
-
-        if intent.status == 'succeeded':
-            now = datetime.now()
-            next_due = now + timedelta(days=90)
-
-            success = update_subscription_status(
-                user_id,
-                'active',
-                payment_date=now,
-                next_due_date=next_due
-            )
-
-            if success:
-                record_payment(user_id, intent.id, intent.amount / 100, 'succeeded', now, next_due)
-                return True
-
-        return False
-
-    except Exception as e:
-        print(f"Payment confirmation error: {e}")
-        return False
-
-def calculate_days_remaining(user: Dict[str, Any]) -> int:
-    subscription_status = user.get('subscription_status', 'trial')
-
-    if subscription_status == 'trial':
-        trial_start = user.get('trial_start_date')
-        if isinstance(trial_start, str):
-            trial_start = datetime.fromisoformat(trial_start.replace('Z', '+00:00'))
-
-        if trial_start:
-            trial_end = trial_start + timedelta(days=14)
-            remaining = (trial_end - datetime.now()).days
-            return max(0, remaining)
+def calculate_days_remaining(user: Dict[str, Any], now: Optional[datetime] = None) -> int:
+    """Whole days left in the trial, or until the next payment is due"""
+    now = now or datetime.now(timezone.utc)
+    state = compute_subscription_state(user, now)
 
-    next_due = user.get('next_payment_due')
-    if next_due:
-        if isinstance(next_due, str):
-            next_due = datetime.fromisoformat(next_due.replace('Z', '+00:00'))
+    if state.status == 'trial':
+        deadline = state.next_transition_at
+    else:
+        deadline = parse_timestamp(user.get('next_payment_due'))
 
-        remaining = (next_due - datetime.now()).days
-        return max(0, remaining)
+    if not deadline:
+        return 0
 
-    return 0
+    return max(0, (deadline - now).days)
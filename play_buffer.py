@@ -0,0 +1,136 @@
+import os
+import json
+import time
+import uuid
+import atexit
+import threading
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any
+from config import Config
+from database import record_track_plays
+
+# Plays are appended to an active spool file the moment they happen, so a
+# restart never loses them. A flush renames the active file into a batch
+# file and sends each batch with one bulk RPC; a batch file is deleted only
+# after the database accepted it. Events carry client-generated ids, so a
+# batch that is re-sent after a failure is not counted twice.
+
+ACTIVE_SPOOL_NAME = 'active.jsonl'
+BATCH_SUFFIX = '.batch'
+
+_spool_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_flusher_lock = threading.Lock()
+_wake = threading.Event()
+_spool_file = None
+_pending_count = 0
+_flusher: Optional[threading.Thread] = None
+
+def get_spool_dir() -> str:
+    os.makedirs(Config.PLAY_SPOOL_DIR, exist_ok=True)
+    return Config.PLAY_SPOOL_DIR
+
+def _active_spool_path() -> str:
+    return os.path.join(get_spool_dir(), ACTIVE_SPOOL_NAME)
+
+def record_play(track_id: str, ip_address: Optional[str] = None, user_agent: Optional[str] = None):
+    """Queue a play event and return at once; it reaches the database on the next flush"""
+    global _spool_file, _pending_count
+
+    event = {
+        'id': str(uuid.uuid4()),
+        'track_id': track_id,
+        'ip_address': ip_address,
+        'user_agent': user_agent,
+        'played_at': datetime.now(timezone.utc).isoformat()
+    }
+    line = json.dumps(event, separators=(',', ':')) + '\n'
+
+    start_flusher()
+
+    with _spool_lock:
+        if _spool_file is None:
+            _spool_file = open(_active_spool_path(), 'a')
+        _spool_file.write(line)
+        _spool_file.flush()
+
+        _pending_count += 1
+        if _pending_count >= Config.PLAY_FLUSH_BATCH_SIZE:
+            _wake.set()
+
+def _rotate_active_spool():
+    global _spool_file, _pending_count
+
+    with _spool_lock:
+        if _spool_file is not None:
+            _spool_file.close()
+            _spool_file = None
+        _pending_count = 0
+
+        active_path = _active_spool_path()
+        if os.path.exists(active_path) and os.path.getsize(active_path):
+            os.replace(active_path, os.path.join(get_spool_dir(), f"{time.time_ns():020d}{BATCH_SUFFIX}"))
+
+def _pending_batches() -> List[str]:
+    spool_dir = get_spool_dir()
+    return [os.path.join(spool_dir, name) for name in sorted(os.listdir(spool_dir)) if name.endswith(BATCH_SUFFIX)]
+
+def _read_batch(batch_path: str) -> List[Dict[str, Any]]:
+    events = []
+    with open(batch_path, 'r') as f:
+        for line in f:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                # A line torn by a crash mid-write; the rest of the batch is intact
+                continue
+    return events
+
+def flush() -> int:
+    """Send every spooled play to the database; returns how many new plays were recorded.
+
+    Stops at the first batch the database rejects, leaving it and any
+    later batches on disk for the next flush.
+    """
+    with _flush_lock:
+        _rotate_active_spool()
+        recorded = 0
+
+        for batch_path in _pending_batches():
+            events = _read_batch(batch_path)
+
+            for start in range(0, len(events), Config.PLAY_FLUSH_BATCH_SIZE):
+                result = record_track_plays(events[start:start + Config.PLAY_FLUSH_BATCH_SIZE])
+                if result is None:
+                    return recorded
+                recorded += result
+
+            os.remove(batch_path)
+
+        return recorded
+
+def _run_flusher():
+    while True:
+        # Wake on the interval, or early once a full batch is waiting
+        _wake.wait(Config.PLAY_FLUSH_INTERVAL_SECONDS)
+        _wake.clear()
+
+        try:
+            flush()
+        except Exception as e:
+            print(f"Error flushing play events: {e}")
+
+def start_flusher():
+    """Start the background flush thread once per process"""
+    global _flusher
+
+    # Checked without a lock first: record_play calls this on every play
+    if _flusher is not None:
+        return
+
+    # Not _flush_lock, which a flush holds for its whole database round trip
+    with _flusher_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_run_flusher, name='play-flusher', daemon=True)
+            _flusher.start()
+            atexit.register(flush)
@@ -0,0 +1,76 @@
+"""Maintain the partitioned play log and its daily rollups.
+
+Run it on a schedule with the Supabase service-role key:
+
+    python play_rollup.py            # one pass, e.g. from cron
+    python play_rollup.py --every    # keep running every PLAY_ROLLUP_INTERVAL_SECONDS
+
+Each pass creates the monthly `track_plays` partitions for the next
+PLAY_PARTITION_MONTHS_AHEAD months. It then recomputes `track_play_daily`
+for the last PLAY_ROLLUP_LOOKBACK_DAYS days, which also picks up plays
+flushed late from the play buffer. Finally it drops raw months older than
+PLAY_RETENTION_DAYS, rolling each one up first.
+"""
+import time
+import argparse
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+from config import Config
+from database import ensure_track_play_partitions, rollup_track_plays, expire_track_plays
+
+@dataclass
+class RollupResult:
+    daily_rows: int = 0
+    partitions_dropped: int = 0
+    errors: int = 0
+
+    def summary(self) -> str:
+        return f"{self.daily_rows} daily row(s) written, {self.partitions_dropped} partition(s) dropped; errors {self.errors}"
+
+def run(today: Optional[date] = None, backfill_days: Optional[int] = None) -> RollupResult:
+    """One maintenance pass; `backfill_days` widens the rollup window, e.g. after an outage"""
+    today = today or datetime.now(timezone.utc).date()
+    result = RollupResult()
+
+    if not ensure_track_play_partitions(Config.PLAY_PARTITION_MONTHS_AHEAD):
+        result.errors += 1
+
+    lookback = backfill_days or Config.PLAY_ROLLUP_LOOKBACK_DAYS
+    written = rollup_track_plays(today - timedelta(days=lookback), today + timedelta(days=1))
+    if written is None:
+        result.errors += 1
+        # Raw plays are only dropped once the recent rollup has succeeded
+        return result
+    result.daily_rows = written
+
+    dropped = expire_track_plays(Config.PLAY_RETENTION_DAYS)
+    if dropped is None:
+        result.errors += 1
+    else:
+        result.partitions_dropped = dropped
+
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Roll up track plays and expire old raw plays")
+    parser.add_argument(
+        '--every', type=int, nargs='?', const=Config.PLAY_ROLLUP_INTERVAL_SECONDS, metavar='SECONDS',
+        help="repeat at this interval (default PLAY_ROLLUP_INTERVAL_SECONDS)"
+    )
+    parser.add_argument('--backfill-days', type=int, metavar='DAYS', help="recompute this many past days instead of PLAY_ROLLUP_LOOKBACK_DAYS")
+    args = parser.parse_args()
+
+    while True:
+        started = time.monotonic()
+        result = run(backfill_days=args.backfill_days)
+        print(f"Play rollup in {time.monotonic() - started:.1f}s: {result.summary()}")
+
+        if not args.every:
+            break
+        # Only the first pass backfills
+        args.backfill_days = None
+        time.sleep(args.every)
+
+if __name__ == '__main__':
+    main()
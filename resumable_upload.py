@@ -0,0 +1,301 @@
+import os
+import json
+import time
+import fcntl
+import hashlib
+import secrets
+from string import Template
+from dataclasses import dataclass, asdict
+from http import HTTPStatus
+from typing import Optional
+from config import Config
+from audio_utils import StagedUpload, copy_stream
+from blob_store import get_staging_dir
+
+# Resumable uploads follow the tus core protocol: the client asks for the
+# current offset with HEAD and appends bytes at that offset with PATCH.
+# Each session is one `.part` file that chunks are appended to in place,
+# plus a small JSON info file. Completing a session renames the `.part`
+# into blob staging, so chunks are never copied or concatenated again.
+
+UPLOAD_ID_BYTES = 24
+
+class ResumableUploadError(Exception):
+    def __init__(self, message: str, status: HTTPStatus = HTTPStatus.BAD_REQUEST):
+        super().__init__(message)
+        self.status = status
+
+@dataclass
+class UploadSession:
+    upload_id: str
+    user_id: str
+    file_name: str
+    length: Optional[int]
+    created_at: float
+    offset: int = 0
+
+    @property
+    def is_complete(self) -> bool:
+        return self.length is not None and self.offset == self.length
+
+def get_resumable_dir() -> str:
+    os.makedirs(Config.RESUMABLE_UPLOAD_DIR, exist_ok=True)
+    return Config.RESUMABLE_UPLOAD_DIR
+
+def _part_path(upload_id: str) -> str:
+    return os.path.join(get_resumable_dir(), f"{upload_id}.part")
+
+def _info_path(upload_id: str) -> str:
+    return os.path.join(get_resumable_dir(), f"{upload_id}.json")
+
+def _is_valid_upload_id(upload_id: str) -> bool:
+    return bool(upload_id) and upload_id.replace('-', '').replace('_', '').isalnum()
+
+def _write_info(session: UploadSession):
+    info = asdict(session)
+    info.pop('offset')
+
+    temp_path = f"{_info_path(session.upload_id)}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(info, f)
+    os.replace(temp_path, _info_path(session.upload_id))
+
+def max_upload_size() -> int:
+    return Config.RESUMABLE_MAX_FILE_SIZE_MB * 1024 * 1024
+
+def create_upload_session(user_id: str, file_name: str = '', length: Optional[int] = None) -> UploadSession:
+    """Start a resumable upload; the file name and length may be deferred to the first chunk"""
+    if length is not None and length > max_upload_size():
+        raise ResumableUploadError("File size too large", HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+
+    session = UploadSession(
+        upload_id=secrets.token_urlsafe(UPLOAD_ID_BYTES),
+        user_id=str(user_id),
+        file_name=os.path.basename(file_name),
+        length=length,
+        created_at=time.time()
+    )
+
+    open(_part_path(session.upload_id), 'xb').close()
+    _write_info(session)
+    return session
+
+def get_upload_session(upload_id: str) -> Optional[UploadSession]:
+    if not _is_valid_upload_id(upload_id):
+        return None
+
+    try:
+        with open(_info_path(upload_id), 'r') as f:
+            info = json.load(f)
+        offset = os.path.getsize(_part_path(upload_id))
+    except (FileNotFoundError, ValueError):
+        return None
+
+    return UploadSession(offset=offset, **info)
+
+def write_chunk(
+    upload_id: str,
+    offset: int,
+    source,
+    content_length: int,
+    upload_length: Optional[int] = None,
+    file_name: Optional[str] = None
+) -> int:
+    """Append one chunk at the given offset and return the new offset.
+
+    The offset must equal the bytes already received, so a retried chunk
+    that partly landed is rejected with 409 and the client re-syncs via HEAD.
+    """
+    session = get_upload_session(upload_id)
+    if session is None:
+        raise ResumableUploadError("Upload not found", HTTPStatus.NOT_FOUND)
+
+    if upload_length is not None:
+        if session.length is None:
+            if upload_length > max_upload_size():
+                raise ResumableUploadError("File size too large", HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+            session.length = upload_length
+            _write_info(session)
+        elif session.length != upload_length:
+            raise ResumableUploadError("Upload-Length cannot change", HTTPStatus.BAD_REQUEST)
+
+    if file_name and not session.file_name:
+        session.file_name = os.path.basename(file_name)
+        _write_info(session)
+
+    if content_length > Config.RESUMABLE_MAX_CHUNK_MB * 1024 * 1024:
+        raise ResumableUploadError("Chunk too large", HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+
+    with open(_part_path(upload_id), 'r+b') as f:
+        # Serialize writers of the same session, even across processes
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        current_offset = os.fstat(f.fileno()).st_size
+
+        if offset != current_offset:
+            raise ResumableUploadError("Offset mismatch", HTTPStatus.CONFLICT)
+
+        limit = session.length if session.length is not None else max_upload_size()
+        if offset + content_length > limit:
+            raise ResumableUploadError("Chunk exceeds upload length", HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+
+        # A dropped connection keeps the bytes that arrived; the client resumes from there
+        f.seek(offset)
+        written = copy_stream(_BoundedReader(source, content_length), f)
+
+    return offset + written
+
+class _BoundedReader:
+    """readinto() view of a socket stream that stops after content_length bytes"""
+
+    def __init__(self, source, content_length: int):
+        self.source = source
+        self.remaining = content_length
+
+    def readinto(self, buffer) -> int:
+        if self.remaining <= 0:
+            return 0
+        view = buffer[:min(len(buffer), self.remaining)]
+        read = self.source.readinto(view) or 0
+        self.remaining -= read
+        return read
+
+def complete_upload(upload_id: str, user_id: str) -> StagedUpload:
+    """Turn a fully received upload into a staged file for the ingest pipeline"""
+    session = get_upload_session(upload_id)
+    if session is None or session.user_id != str(user_id):
+        raise ResumableUploadError("Upload not found", HTTPStatus.NOT_FOUND)
+
+    if not session.is_complete:
+        raise ResumableUploadError("Upload is not complete yet", HTTPStatus.CONFLICT)
+
+    file_extension = os.path.splitext(session.file_name)[1].lower()
+    if file_extension.lstrip('.') not in Config.ALLOWED_AUDIO_FORMATS:
+        raise ResumableUploadError(f"File type {file_extension or 'unknown'} not supported", HTTPStatus.UNSUPPORTED_MEDIA_TYPE)
+
+    part_path = _part_path(upload_id)
+    digest = hashlib.sha256()
+    with open(part_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(Config.UPLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+
+    staging_path = os.path.join(get_staging_dir(), f"{upload_id}{file_extension}")
+    os.replace(part_path, staging_path)
+    _remove_quietly(_info_path(upload_id))
+
+    return StagedUpload(
+        path=staging_path,
+        content_hash=digest.hexdigest(),
+        size=session.length,
+        original_name=session.file_name
+    )
+
+def cancel_upload(upload_id: str):
+    if _is_valid_upload_id(upload_id):
+        _remove_quietly(_part_path(upload_id))
+        _remove_quietly(_info_path(upload_id))
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def gc_stale_uploads(max_age_seconds: Optional[float] = None) -> int:
+    """Delete sessions that have not received data within the TTL; returns how many"""
+    max_age_seconds = max_age_seconds or Config.RESUMABLE_UPLOAD_TTL_HOURS * 3600
+    cutoff = time.time() - max_age_seconds
+    last_activity = {}
+
+    with os.scandir(get_resumable_dir()) as entries:
+        for entry in entries:
+            upload_id = entry.name.split('.', 1)[0]
+            try:
+                modified = entry.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            last_activity[upload_id] = max(modified, last_activity.get(upload_id, 0))
+
+    stale = [upload_id for upload_id, modified in last_activity.items() if modified < cutoff]
+    for upload_id in stale:
+        for entry_path in (_part_path(upload_id), _info_path(upload_id), f"{_info_path(upload_id)}.tmp"):
+            _remove_quietly(entry_path)
+
+    return len(stale)
+
+UPLOADER_TEMPLATE = Template("""
+<div style="font-family: sans-serif;">
+    <input type="file" id="file" accept=".mp3,.wav,.flac">
+    <progress id="progress" value="0" max="1" style="width: 100%; margin-top: 8px;"></progress>
+    <div id="status" style="font-size: 0.9em; color: #555;"></div>
+</div>
+<script>
+const uploadUrl = "$upload_url";
+const chunkSize = $chunk_size;
+const maxSize = $max_size;
+const progress = document.getElementById("progress");
+const statusLine = document.getElementById("status");
+
+function report(text) { statusLine.textContent = text; }
+function sleep(ms) { return new Promise(resolve => setTimeout(resolve, ms)); }
+
+async function currentOffset() {
+    const response = await fetch(uploadUrl, {method: "HEAD", cache: "no-store"});
+    if (!response.ok) { throw new Error("upload session expired, reload the page"); }
+    return parseInt(response.headers.get("Upload-Offset"), 10);
+}
+
+async function upload(file) {
+    if (file.size > maxSize) { report("File is larger than the maximum upload size."); return; }
+    let offset = await currentOffset();
+    let failures = 0;
+
+    while (offset < file.size) {
+        try {
+            const response = await fetch(uploadUrl, {
+                method: "PATCH",
+                headers: {
+                    "Tus-Resumable": "1.0.0",
+                    "Content-Type": "application/offset+octet-stream",
+                    "Upload-Offset": String(offset),
+                    "Upload-Length": String(file.size),
+                    "Upload-Metadata": "filename " + btoa(unescape(encodeURIComponent(file.name)))
+                },
+                body: file.slice(offset, offset + chunkSize)
+            });
+            if (response.status === 409) { offset = await currentOffset(); continue; }
+            if (!response.ok) { throw new Error("server answered " + response.status); }
+
+            offset = parseInt(response.headers.get("Upload-Offset"), 10);
+            failures = 0;
+            progress.value = offset / file.size;
+            report("Uploaded " + (offset / 1048576).toFixed(1) + " of " + (file.size / 1048576).toFixed(1) + " MB");
+        } catch (error) {
+            failures += 1;
+            if (failures > 8) {
+                report("Upload paused (" + error.message + "). Choose the same file again to resume.");
+                return;
+            }
+            report("Connection problem, retrying...");
+            await sleep(Math.min(30000, 1000 * 2 ** failures));
+            try { offset = await currentOffset(); } catch (ignored) {}
+        }
+    }
+
+    progress.value = 1;
+    report("Upload complete. Fill in the track details below and press Finish Upload.");
+}
+
+document.getElementById("file").addEventListener("change", event => {
+    const file = event.target.files[0];
+    if (file) { upload(file).catch(error => report("Upload failed: " + error.message)); }
+});
+</script>
+""")
+
+def generate_resumable_uploader_html(upload_url: str) -> str:
+    """Browser-side chunked uploader that resumes from the server's offset after failures"""
+    return UPLOADER_TEMPLATE.substitute(
+        upload_url=upload_url,
+        chunk_size=Config.RESUMABLE_CHUNK_SIZE_MB * 1024 * 1024,
+        max_size=max_upload_size()
+    )
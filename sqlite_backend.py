@@ -0,0 +1,765 @@
+"""Local SQLite stand-in for the Supabase database.
+
+With DATABASE_BACKEND=sqlite, `supabase_client.get_supabase_client()`
+returns a `SQLiteClient` instead of a Supabase client. It answers the same
+query-builder calls `database.py` makes (`table(...).select(...).eq(...)`,
+`insert`, `update`, `rpc(...)`, ...), so every database function, and
+everything above it, runs offline unchanged.
+
+The schema comes from `supabase/migrations`. Each migration is applied
+once, in order, after translating its table and index statements to
+SQLite. Policies, grants, triggers and SQL functions have no SQLite
+equivalent and are skipped. The functions the app calls through `rpc()`
+are reimplemented in Python below. The user_stats triggers are recreated
+as SQLite triggers.
+
+Seed realistic volumes for load tests and benchmarks:
+
+    DATABASE_BACKEND=sqlite python sqlite_backend.py --users 1000 --tracks 50 --days 90 --plays 20
+"""
+import os
+import re
+import json
+import uuid
+import random
+import sqlite3
+import argparse
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional, Dict, Any, List, Tuple, Callable
+from config import Config
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'supabase', 'migrations')
+
+KEPT_STATEMENTS = re.compile(
+    r'^(CREATE TABLE|CREATE (UNIQUE )?INDEX|DROP INDEX|DROP TABLE|ALTER TABLE \w+\s+(ADD COLUMN|RENAME TO)|ALTER INDEX)',
+    re.IGNORECASE
+)
+NOW_DEFAULT = re.compile(r"\s+DEFAULT\s+(?:\(\s*now\(\)(?:\s*\+\s*interval\s+'(\d+)\s+days?')?\s*\)|now\(\))", re.IGNORECASE)
+UUID_DEFAULT = re.compile(r'\s+DEFAULT\s+gen_random_uuid\(\)', re.IGNORECASE)
+CAST = re.compile(r'::\w+')
+PARTITION_BY = re.compile(r'\s+PARTITION BY RANGE\s*\([^)]*\)', re.IGNORECASE)
+COLUMN_NAME = re.compile(r'^\s*(?:ALTER TABLE \w+\s+ADD COLUMN\s+(?:IF NOT EXISTS\s+)?)?(\w+)\s', re.IGNORECASE)
+
+TIMESTAMP_TYPES = {'timestamptz', 'timestamp'}
+BOOLEAN_TYPES = {'boolean', 'bool'}
+JSON_TYPES = {'jsonb', 'json'}
+
+def split_statements(sql: str) -> List[str]:
+    """Split a migration into statements, keeping $$ bodies, strings and comments intact"""
+    statements, current, i = [], [], 0
+    while i < len(sql):
+        if sql.startswith('--', i):
+            end = sql.find('\n', i)
+            i = len(sql) if end == -1 else end
+        elif sql.startswith('/*', i):
+            end = sql.find('*/', i + 2)
+            i = len(sql) if end == -1 else end + 2
+        elif sql.startswith('$$', i):
+            end = sql.find('$$', i + 2)
+            end = len(sql) if end == -1 else end + 2
+            current.append(sql[i:end])
+            i = end
+        elif sql[i] == "'":
+            end = i + 1
+            while end < len(sql):
+                if sql[end] == "'" and sql[end + 1:end + 2] != "'":
+                    break
+                end += 2 if sql[end] == "'" else 1
+            current.append(sql[i:end + 1])
+            i = end + 1
+        elif sql[i] == ';':
+            statement = ''.join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+            i += 1
+        else:
+            current.append(sql[i])
+            i += 1
+
+    statement = ''.join(current).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+@dataclass
+class SQLiteResponse:
+    data: Any
+    count: Optional[int] = None
+
+class SQLiteClient:
+    """Thread-safe client over one SQLite file; each thread gets its own connection"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._column_types: Dict[str, Dict[str, str]] = {}
+        # Column defaults Postgres computes (ids, timestamps) are filled in here: (table, column) -> kind
+        self._defaults: Dict[Tuple[str, str], Tuple[str, Optional[int]]] = {}
+
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._anchor = self.connection()
+        self.migrate()
+
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            if self.path == ':memory:':
+                # Shared in-memory database, kept alive by the first connection
+                connection = sqlite3.connect(f"file:omawi_na_{id(self)}?mode=memory&cache=shared", uri=True, timeout=30, isolation_level=None, check_same_thread=False)
+            else:
+                connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+                connection.execute('PRAGMA journal_mode=WAL')
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA foreign_keys=ON')
+            self._local.connection = connection
+        return connection
+
+    # Schema
+
+    def migrate(self):
+        """Apply migrations not yet recorded in schema_migrations"""
+        with self._schema_lock:
+            connection = self.connection()
+            connection.execute('CREATE TABLE IF NOT EXISTS schema_migrations (version TEXT PRIMARY KEY, applied_at TEXT NOT NULL)')
+            applied = {row[0] for row in connection.execute('SELECT version FROM schema_migrations')}
+
+            for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+                if not filename.endswith('.sql'):
+                    continue
+
+                version = filename.split('_', 1)[0]
+                with open(os.path.join(MIGRATIONS_DIR, filename)) as migration:
+                    statements = [self._translate(statement) for statement in split_statements(migration.read())]
+
+                if version in applied:
+                    continue
+
+                connection.execute('BEGIN IMMEDIATE')
+                try:
+                    for statement in statements:
+                        if statement:
+                            self._apply(connection, statement)
+                    connection.execute('INSERT INTO schema_migrations (version, applied_at) VALUES (?, ?)', (version, _now()))
+                    connection.execute('COMMIT')
+                except Exception:
+                    connection.execute('ROLLBACK')
+                    raise
+
+            _create_triggers(connection)
+            self._column_types.clear()
+
+    def _translate(self, statement: str) -> Optional[str]:
+        """Rewrite one Postgres DDL statement for SQLite, or None to skip it.
+
+        Also records the defaults Python fills in, so it runs over every
+        migration, applied or not.
+        """
+        if not KEPT_STATEMENTS.match(statement) or ' PARTITION OF ' in statement.upper():
+            return None
+
+        table_match = re.match(r'^(?:CREATE TABLE(?: IF NOT EXISTS)?|ALTER TABLE)\s+(\w+)', statement, re.IGNORECASE)
+        table = table_match.group(1) if table_match else None
+
+        rename = re.match(r'^ALTER TABLE (\w+) RENAME TO (\w+)', statement, re.IGNORECASE)
+        if rename:
+            old, new = rename.groups()
+            self._defaults = {((new if t == old else t), c): kind for (t, c), kind in self._defaults.items()}
+        drop = re.match(r'^DROP TABLE(?: IF EXISTS)? (\w+)', statement, re.IGNORECASE)
+        if drop:
+            self._defaults = {(t, c): kind for (t, c), kind in self._defaults.items() if t != drop.group(1)}
+
+        if table and not rename:
+            if statement.upper().startswith('CREATE TABLE'):
+                self._defaults = {(t, c): kind for (t, c), kind in self._defaults.items() if t != table}
+            for line in statement.split('\n') if statement.upper().startswith('CREATE TABLE') else [statement]:
+                column = COLUMN_NAME.match(line)
+                if not column:
+                    continue
+                if UUID_DEFAULT.search(line):
+                    self._defaults[(table, column.group(1))] = ('uuid', None)
+                now = NOW_DEFAULT.search(line)
+                if now:
+                    self._defaults[(table, column.group(1))] = ('now', int(now.group(1) or 0))
+
+        statement = UUID_DEFAULT.sub('', statement)
+        statement = NOW_DEFAULT.sub('', statement)
+        statement = CAST.sub('', statement)
+        statement = PARTITION_BY.sub('', statement)
+        # SQLite can only add virtual generated columns to an existing table
+        if re.match(r'^ALTER TABLE', statement, re.IGNORECASE):
+            statement = re.sub(r'\)\s*STORED\s*$', ') VIRTUAL', statement, flags=re.IGNORECASE)
+        return statement
+
+    def _apply(self, connection: sqlite3.Connection, statement: str):
+        add_column = re.match(r'^ALTER TABLE (\w+)\s+ADD COLUMN IF NOT EXISTS\s+(\w+)(.*)$', statement, re.IGNORECASE | re.DOTALL)
+        if add_column:
+            table, column, rest = add_column.groups()
+            existing = {row[1] for row in connection.execute(f'PRAGMA table_xinfo({table})')}
+            if column not in existing:
+                connection.execute(f'ALTER TABLE {table} ADD COLUMN {column}{rest}')
+            return
+
+        rename_index = re.match(r'^ALTER INDEX (?:IF EXISTS )?(\w+) RENAME TO (\w+)$', statement, re.IGNORECASE)
+        if rename_index:
+            old, new = rename_index.groups()
+            row = connection.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = ?", (old,)).fetchone()
+            if row and row[0]:
+                connection.execute(f'DROP INDEX {old}')
+                connection.execute(re.sub(rf'\b{old}\b', new, row[0], count=1))
+            return
+
+        connection.execute(statement)
+
+    def column_types(self, table: str) -> Dict[str, str]:
+        types = self._column_types.get(table)
+        if types is None:
+            rows = self.connection().execute(f'PRAGMA table_xinfo({table})').fetchall()
+            if not rows:
+                raise ValueError(f"Unknown table: {table}")
+            types = {row[1]: (row[2] or '').split('(')[0].strip().lower() for row in rows}
+            self._column_types[table] = types
+        return types
+
+    def defaults_for(self, table: str) -> Dict[str, Tuple[str, Optional[int]]]:
+        return {column: kind for (t, column), kind in self._defaults.items() if t == table}
+
+    # Supabase client surface
+
+    def table(self, name: str) -> 'SQLiteQuery':
+        return SQLiteQuery(self, name)
+
+    from_ = table
+
+    def rpc(self, name: str, params: Optional[Dict[str, Any]] = None) -> 'SQLiteRPC':
+        if name not in RPCS:
+            raise ValueError(f"Unknown function: {name}")
+        return SQLiteRPC(self, name, params or {})
+
+    def transaction(self, work: Callable[[sqlite3.Connection], Any]) -> Any:
+        connection = self.connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            result = work(connection)
+            connection.execute('COMMIT')
+            return result
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec='microseconds')
+
+def _to_timestamp(value: Any) -> Any:
+    """Store timestamps the way PostgREST returns them: UTC ISO 8601 with microseconds"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return value
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc).isoformat(timespec='microseconds')
+    return value
+
+def _to_sqlite(value: Any, column_type: str) -> Any:
+    if value is None:
+        return None
+    if column_type in TIMESTAMP_TYPES:
+        return _to_timestamp(value)
+    if column_type in JSON_TYPES and not isinstance(value, str):
+        return json.dumps(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+def _from_sqlite(value: Any, column_type: str) -> Any:
+    if value is None:
+        return None
+    if column_type in BOOLEAN_TYPES:
+        return bool(value)
+    if column_type in JSON_TYPES and isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    if column_type == 'numeric':
+        return float(value)
+    return value
+
+OPERATORS = {'eq': '=', 'neq': '<>', 'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+
+def _split_top_level(text: str) -> List[str]:
+    parts, depth, quoted, current = [], 0, False, []
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        elif not quoted and depth == 0 and char == ',':
+            parts.append(''.join(current))
+            current = []
+            continue
+        current.append(char)
+    parts.append(''.join(current))
+    return [part.strip() for part in parts if part.strip()]
+
+class SQLiteQuery:
+    """The subset of postgrest's request builder that database.py uses"""
+
+    def __init__(self, client: SQLiteClient, table: str):
+        self._client = client
+        self._table = table
+        self._types = client.column_types(table)
+        self._action = 'select'
+        self._columns = '*'
+        self._count = None
+        self._values: Any = None
+        self._where: List[str] = []
+        self._params: List[Any] = []
+        self._order: List[str] = []
+        self._limit: Optional[int] = None
+        self._offset: Optional[int] = None
+        self._single = False
+
+    def _column(self, name: str) -> str:
+        if name not in self._types:
+            raise ValueError(f"Unknown column {self._table}.{name}")
+        return f'"{name}"'
+
+    def _value(self, column: str, value: Any) -> Any:
+        return _to_sqlite(value, self._types[column])
+
+    # Actions
+
+    def select(self, columns: str = '*', count: Optional[str] = None) -> 'SQLiteQuery':
+        self._columns = columns
+        self._count = count
+        return self
+
+    def insert(self, rows: Any, **_) -> 'SQLiteQuery':
+        self._action = 'insert'
+        self._values = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def update(self, values: Dict[str, Any], **_) -> 'SQLiteQuery':
+        self._action = 'update'
+        self._values = values
+        return self
+
+    def delete(self, **_) -> 'SQLiteQuery':
+        self._action = 'delete'
+        return self
+
+    # Filters
+
+    def _compare(self, column: str, operator: str, value: Any) -> 'SQLiteQuery':
+        self._where.append(f'{self._column(column)} {OPERATORS[operator]} ?')
+        self._params.append(self._value(column, value))
+        return self
+
+    def eq(self, column: str, value: Any) -> 'SQLiteQuery':
+        return self._compare(column, 'eq', value)
+
+    def neq(self, column: str, value: Any) -> 'SQLiteQuery':
+        return self._compare(column, 'neq', value)
+
+    def gt(self, column: str, value: Any) -> 'SQLiteQuery':
+        return self._compare(column, 'gt', value)
+
+    def gte(self, column: str, value: Any) -> 'SQLiteQuery':
+        return self._compare(column, 'gte', value)
+
+    def lt(self, column: str, value: Any) -> 'SQLiteQuery':
+        return self._compare(column, 'lt', value)
+
+    def lte(self, column: str, value: Any) -> 'SQLiteQuery':
+        return self._compare(column, 'lte', value)
+
+    def in_(self, column: str, values: List[Any]) -> 'SQLiteQuery':
+        values = list(values)
+        if not values:
+            self._where.append('0')
+            return self
+        self._where.append(f"{self._column(column)} IN ({', '.join('?' * len(values))})")
+        self._params.extend(self._value(column, value) for value in values)
+        return self
+
+    def is_(self, column: str, value: Any) -> 'SQLiteQuery':
+        self._where.append(f"{self._column(column)} IS {'NULL' if value in (None, 'null') else 'NOT NULL'}")
+        return self
+
+    def or_(self, filters: str) -> 'SQLiteQuery':
+        """PostgREST logic tree, e.g. 'a.lt.1,and(a.eq.1,b.lt.2)'"""
+        clause, params = self._logic_tree(filters, 'OR')
+        self._where.append(clause)
+        self._params.extend(params)
+        return self
+
+    def _logic_tree(self, filters: str, joiner: str) -> Tuple[str, List[Any]]:
+        clauses, params = [], []
+        for part in _split_top_level(filters):
+            nested = re.match(r'^(and|or)\((.*)\)$', part, re.DOTALL)
+            if nested:
+                clause, nested_params = self._logic_tree(nested.group(2), nested.group(1).upper())
+            else:
+                column, operator, value = part.split('.', 2)
+                value = value[1:-1] if value.startswith('"') and value.endswith('"') else value
+                clause, nested_params = f'{self._column(column)} {OPERATORS[operator]} ?', [self._value(column, value)]
+            clauses.append(clause)
+            params.extend(nested_params)
+        return f"({f' {joiner} '.join(clauses)})", params
+
+    # Modifiers
+
+    def order(self, column: str, desc: bool = False, **_) -> 'SQLiteQuery':
+        self._order.append(f"{self._column(column)} {'DESC' if desc else 'ASC'}")
+        return self
+
+    def limit(self, size: int, **_) -> 'SQLiteQuery':
+        self._limit = size
+        return self
+
+    def range(self, start: int, end: int, **_) -> 'SQLiteQuery':
+        self._offset = start
+        self._limit = end - start + 1
+        return self
+
+    def maybe_single(self) -> 'SQLiteQuery':
+        self._single = True
+        return self
+
+    # Execution
+
+    def _where_sql(self) -> str:
+        return f" WHERE {' AND '.join(self._where)}" if self._where else ''
+
+    def _decode(self, row: sqlite3.Row) -> Dict[str, Any]:
+        return {key: _from_sqlite(row[key], self._types.get(key, '')) for key in row.keys()}
+
+    def _select_list(self) -> str:
+        if self._columns.strip() == '*':
+            return '*'
+        return ', '.join(self._column(column.strip()) for column in self._columns.split(','))
+
+    def execute(self) -> Optional[SQLiteResponse]:
+        if self._action == 'insert':
+            return SQLiteResponse(self._client.transaction(self._insert))
+        if self._action == 'update':
+            return SQLiteResponse(self._client.transaction(self._update))
+        if self._action == 'delete':
+            return SQLiteResponse(self._client.transaction(self._delete))
+        return self._select()
+
+    def _select(self) -> Optional[SQLiteResponse]:
+        connection = self._client.connection()
+        sql = f'SELECT {self._select_list()} FROM "{self._table}"{self._where_sql()}'
+        if self._order:
+            sql += f" ORDER BY {', '.join(self._order)}"
+        if self._limit is not None or self._offset is not None:
+            sql += f" LIMIT {int(self._limit if self._limit is not None else -1)} OFFSET {int(self._offset or 0)}"
+
+        rows = [self._decode(row) for row in connection.execute(sql, self._params)]
+
+        count = None
+        if self._count:
+            count = connection.execute(f'SELECT count(*) FROM "{self._table}"{self._where_sql()}', self._params).fetchone()[0]
+
+        if self._single:
+            if not rows:
+                return None
+            if len(rows) > 1:
+                raise ValueError("Cannot coerce the result to a single JSON object")
+            return SQLiteResponse(rows[0], count)
+
+        return SQLiteResponse(rows, count)
+
+    def _insert(self, connection: sqlite3.Connection) -> List[Dict[str, Any]]:
+        defaults = self._client.defaults_for(self._table)
+        inserted = []
+        for values in self._values:
+            row = dict(values)
+            for column, (kind, days) in defaults.items():
+                if kind == 'uuid' and row.get(column) is None:
+                    row[column] = str(uuid.uuid4())
+                elif kind == 'now' and column not in row:
+                    row[column] = _to_timestamp(datetime.now(timezone.utc) + timedelta(days=days))
+
+            columns = list(row)
+            sql = f"INSERT INTO \"{self._table}\" ({', '.join(self._column(c) for c in columns)}) VALUES ({', '.join('?' * len(columns))}) RETURNING *"
+            inserted.extend(self._decode(r) for r in connection.execute(sql, [self._value(c, row[c]) for c in columns]))
+        return inserted
+
+    def _update(self, connection: sqlite3.Connection) -> List[Dict[str, Any]]:
+        columns = list(self._values)
+        assignments = ', '.join(f'{self._column(c)} = ?' for c in columns)
+        params = [self._value(c, self._values[c]) for c in columns] + self._params
+        sql = f'UPDATE "{self._table}" SET {assignments}{self._where_sql()} RETURNING *'
+        return [self._decode(row) for row in connection.execute(sql, params)]
+
+    def _delete(self, connection: sqlite3.Connection) -> List[Dict[str, Any]]:
+        sql = f'DELETE FROM "{self._table}"{self._where_sql()} RETURNING *'
+        return [self._decode(row) for row in connection.execute(sql, self._params)]
+
+class SQLiteRPC:
+    def __init__(self, client: SQLiteClient, name: str, params: Dict[str, Any]):
+        self._client = client
+        self._name = name
+        self._params = params
+
+    def execute(self) -> SQLiteResponse:
+        function = RPCS[self._name]
+        return SQLiteResponse(self._client.transaction(lambda connection: function(connection, **self._params)))
+
+# Triggers and functions from the migrations, rewritten for SQLite
+
+USER_STATS_DELTA = '''
+    INSERT INTO user_stats (user_id, track_count, total_plays, total_duration_seconds, total_file_size, portfolio_views, updated_at)
+    SELECT {user}, {tracks}, {plays}, {duration}, {size}, 0, strftime('%Y-%m-%dT%H:%M:%f000+00:00', 'now')
+    WHERE EXISTS (SELECT 1 FROM users WHERE id = {user})
+    ON CONFLICT (user_id) DO UPDATE SET
+        track_count = track_count + excluded.track_count,
+        total_plays = total_plays + excluded.total_plays,
+        total_duration_seconds = total_duration_seconds + excluded.total_duration_seconds,
+        total_file_size = total_file_size + excluded.total_file_size,
+        updated_at = excluded.updated_at;
+'''
+
+def _row_delta(prefix: str, sign: str) -> Dict[str, str]:
+    return {
+        'user': f'{prefix}.user_id',
+        'tracks': f'{sign}1',
+        'plays': f'{sign}coalesce({prefix}.play_count, 0)',
+        'duration': f'{sign}coalesce({prefix}.duration_seconds, 0)',
+        'size': f'{sign}coalesce({prefix}.file_size, 0)',
+    }
+
+def _create_triggers(connection: sqlite3.Connection):
+    if connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_stats'").fetchone() is None:
+        return
+
+    connection.executescript(f'''
+        CREATE TRIGGER IF NOT EXISTS tracks_user_stats_insert AFTER INSERT ON tracks
+        BEGIN {USER_STATS_DELTA.format(**_row_delta('NEW', '+'))} END;
+
+        CREATE TRIGGER IF NOT EXISTS tracks_user_stats_delete AFTER DELETE ON tracks
+        BEGIN {USER_STATS_DELTA.format(**_row_delta('OLD', '-'))} END;
+
+        CREATE TRIGGER IF NOT EXISTS tracks_user_stats_update
+        AFTER UPDATE OF user_id, play_count, duration_seconds, file_size ON tracks
+        BEGIN
+            {USER_STATS_DELTA.format(**_row_delta('OLD', '-'))}
+            {USER_STATS_DELTA.format(**_row_delta('NEW', '+'))}
+        END;
+    ''')
+
+def record_track_play(connection: sqlite3.Connection, p_track_id: str, p_ip_address: Optional[str] = None, p_user_agent: Optional[str] = None, p_user_id: Optional[str] = None) -> Optional[int]:
+    if connection.execute('SELECT 1 FROM tracks WHERE id = ?', (p_track_id,)).fetchone() is None:
+        return None
+    connection.execute(
+        'INSERT INTO track_plays (id, track_id, user_id, ip_address, user_agent, played_at) VALUES (?, ?, ?, ?, ?, ?)',
+        (str(uuid.uuid4()), p_track_id, p_user_id, p_ip_address, p_user_agent, _now())
+    )
+    row = connection.execute('UPDATE tracks SET play_count = coalesce(play_count, 0) + 1 WHERE id = ? RETURNING play_count', (p_track_id,)).fetchone()
+    return row[0]
+
+def record_track_plays(connection: sqlite3.Connection, p_plays: List[Dict[str, Any]]) -> int:
+    counts: Dict[str, int] = {}
+    for play in p_plays:
+        cursor = connection.execute(
+            '''INSERT OR IGNORE INTO track_plays (id, track_id, ip_address, user_agent, played_at)
+               SELECT ?, id, ?, ?, ? FROM tracks WHERE id = ?''',
+            (play['id'], play.get('ip_address'), play.get('user_agent'), _to_timestamp(play.get('played_at') or _now()), play['track_id'])
+        )
+        if cursor.rowcount == 1:
+            counts[play['track_id']] = counts.get(play['track_id'], 0) + 1
+
+    connection.executemany('UPDATE tracks SET play_count = coalesce(play_count, 0) + ? WHERE id = ?', [(plays, track_id) for track_id, plays in counts.items()])
+    return sum(counts.values())
+
+def record_portfolio_view(connection: sqlite3.Connection, p_user_id: str) -> None:
+    connection.execute(
+        '''INSERT INTO user_stats (user_id, portfolio_views, updated_at)
+           SELECT id, 1, ? FROM users WHERE id = ?
+           ON CONFLICT (user_id) DO UPDATE SET portfolio_views = portfolio_views + 1, updated_at = excluded.updated_at''',
+        (_now(), p_user_id)
+    )
+
+def update_user_profiles(connection: sqlite3.Connection, p_profiles: List[Dict[str, Any]]) -> int:
+    updated = 0
+    for profile in p_profiles:
+        social_links = profile.get('social_links')
+        cursor = connection.execute(
+            '''UPDATE users
+               SET bio = coalesce(?, bio), genre = coalesce(?, genre),
+                   social_links = coalesce(?, social_links), profile_image_url = coalesce(?, profile_image_url)
+               WHERE id = ?''',
+            (profile.get('bio'), profile.get('genre'), None if social_links is None else json.dumps(social_links),
+             profile.get('profile_image_url'), profile['id'])
+        )
+        updated += cursor.rowcount
+    return updated
+
+def apply_stripe_payments(connection: sqlite3.Connection, p_payments: List[Dict[str, Any]]) -> int:
+    inserted = []
+    for payment in p_payments:
+        cursor = connection.execute(
+            '''INSERT OR IGNORE INTO payments (id, user_id, stripe_payment_id, amount, currency, status, payment_date, subscription_period_start, subscription_period_end)
+               SELECT ?, id, ?, ?, ?, ?, ?, ?, ? FROM users WHERE id = ?''',
+            (str(uuid.uuid4()), payment['stripe_payment_id'], payment['amount'], (payment.get('currency') or 'nad').upper(), payment['status'],
+             _to_timestamp(payment['payment_date']), _to_timestamp(payment['payment_date']), _to_timestamp(payment['period_end']), payment['user_id'])
+        )
+        if cursor.rowcount == 1:
+            inserted.append(payment)
+
+    latest: Dict[str, Dict[str, Any]] = {}
+    for payment in inserted:
+        if payment['status'] == 'succeeded':
+            current = latest.get(payment['user_id'])
+            if current is None or _to_timestamp(payment['period_end']) > _to_timestamp(current['period_end']):
+                latest[payment['user_id']] = payment
+
+    for user_id, payment in latest.items():
+        connection.execute(
+            "UPDATE users SET subscription_status = 'active', last_payment_date = ?, next_payment_due = ? WHERE id = ?",
+            (_to_timestamp(payment['payment_date']), _to_timestamp(payment['period_end']), user_id)
+        )
+
+    return len(inserted)
+
+def ensure_track_play_partitions(connection: sqlite3.Connection, p_months_ahead: int = 2) -> None:
+    # track_plays is a single table here
+    return None
+
+def rollup_track_plays(connection: sqlite3.Connection, p_from: str, p_to: str) -> int:
+    cursor = connection.execute(
+        '''INSERT INTO track_play_daily (track_id, day, user_id, plays, unique_listeners)
+           SELECT track_plays.track_id, substr(track_plays.played_at, 1, 10), tracks.user_id, count(*),
+                  count(DISTINCT coalesce(track_plays.user_id, coalesce(track_plays.ip_address, '') || '|' || coalesce(track_plays.user_agent, '')))
+           FROM track_plays
+           JOIN tracks ON tracks.id = track_plays.track_id
+           WHERE track_plays.played_at >= ? AND track_plays.played_at < ?
+           GROUP BY track_plays.track_id, substr(track_plays.played_at, 1, 10)
+           ON CONFLICT (track_id, day) DO UPDATE SET plays = excluded.plays, unique_listeners = excluded.unique_listeners''',
+        (_to_timestamp(f"{p_from}T00:00:00+00:00"), _to_timestamp(f"{p_to}T00:00:00+00:00"))
+    )
+    return cursor.rowcount
+
+def expire_track_plays(connection: sqlite3.Connection, p_retain_days: int) -> int:
+    """Roll up and delete raw plays before the cutoff; returns the number of whole months removed"""
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=p_retain_days)).date()
+    oldest = connection.execute('SELECT min(played_at) FROM track_plays WHERE played_at < ?', (_to_timestamp(f"{cutoff}T00:00:00+00:00"),)).fetchone()[0]
+    if oldest is None:
+        return 0
+
+    rollup_track_plays(connection, oldest[:10], cutoff.isoformat())
+    months = connection.execute(
+        'SELECT count(DISTINCT substr(played_at, 1, 7)) FROM track_plays WHERE played_at < ?',
+        (_to_timestamp(f"{cutoff.replace(day=1)}T00:00:00+00:00"),)
+    ).fetchone()[0]
+    connection.execute('DELETE FROM track_plays WHERE played_at < ?', (_to_timestamp(f"{cutoff}T00:00:00+00:00"),))
+    return months
+
+RPCS: Dict[str, Callable[..., Any]] = {
+    'record_track_play': record_track_play,
+    'record_track_plays': record_track_plays,
+    'record_portfolio_view': record_portfolio_view,
+    'update_user_profiles': update_user_profiles,
+    'apply_stripe_payments': apply_stripe_payments,
+    'ensure_track_play_partitions': ensure_track_play_partitions,
+    'rollup_track_plays': rollup_track_plays,
+    'expire_track_plays': expire_track_plays,
+}
+
+_client: Optional[SQLiteClient] = None
+_client_lock = threading.Lock()
+
+def get_sqlite_client() -> SQLiteClient:
+    global _client
+
+    with _client_lock:
+        if _client is None:
+            _client = SQLiteClient(Config.SQLITE_DATABASE_PATH)
+        return _client
+
+# Seeding
+
+GENRES = ['Afro House', 'Amapiano', 'Hip Hop', 'Gospel', 'Kwaito', 'Jazz', 'Shambo', 'R&B']
+
+def seed(client: SQLiteClient, users: int, tracks_per_user: int, days: int, plays_per_track_day: int, rng: Optional[random.Random] = None) -> Dict[str, int]:
+    """Insert synthetic users, tracks and plays in bulk, then build the daily rollups"""
+    rng = rng or random.Random(0)
+    now = datetime.now(timezone.utc)
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    statuses = ['trial', 'active', 'active', 'active', 'grace_period', 'suspended']
+    created = {'users': 0, 'tracks': 0, 'plays': 0}
+
+    def insert_user(connection: sqlite3.Connection):
+        user_id = str(uuid.uuid4())
+        name = f"artist_{user_id[:8]}"
+        trial_start = now - timedelta(days=rng.randint(0, 365))
+        connection.execute(
+            '''INSERT INTO users (id, email, username, full_name, genre, subscription_status, trial_start_date, next_payment_due, created_at, social_links)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, '{}')''',
+            (user_id, f"{name}@example.com", name, name.replace('_', ' ').title(), rng.choice(GENRES), rng.choice(statuses),
+             _to_timestamp(trial_start), _to_timestamp(trial_start + timedelta(days=rng.randint(-30, 90))), _to_timestamp(trial_start))
+        )
+
+        for number in range(tracks_per_user):
+            track_id = str(uuid.uuid4())
+            plays = [
+                (str(uuid.uuid4()), track_id, f"10.0.{rng.randint(0, 255)}.{rng.randint(1, 254)}", 'seed',
+                 _to_timestamp(today - timedelta(days=day) + timedelta(seconds=rng.randint(0, 86399))))
+                for day in range(days)
+                for _ in range(rng.randint(0, 2 * plays_per_track_day))
+            ]
+            # play_count is inserted with the track, so the user_stats trigger counts it
+            connection.execute(
+                '''INSERT INTO tracks (id, user_id, title, artist, genre, file_path, file_size, duration_seconds, play_count, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                (track_id, user_id, f"Track {number + 1}", name, rng.choice(GENRES), f"blobs/{track_id}.mp3",
+                 rng.randint(2_000_000, 12_000_000), rng.randint(120, 420), len(plays), _to_timestamp(now - timedelta(days=rng.randint(0, days))))
+            )
+            connection.executemany('INSERT INTO track_plays (id, track_id, ip_address, user_agent, played_at) VALUES (?, ?, ?, ?, ?)', plays)
+
+            created['tracks'] += 1
+            created['plays'] += len(plays)
+        created['users'] += 1
+
+    # One transaction per user keeps memory flat for large seeds
+    for _ in range(users):
+        client.transaction(insert_user)
+
+    client.transaction(lambda connection: rollup_track_plays(connection, (today - timedelta(days=days)).date().isoformat(), (today + timedelta(days=1)).date().isoformat()))
+    return created
+
+def main():
+    parser = argparse.ArgumentParser(description="Create or seed the local SQLite database")
+    parser.add_argument('--path', default=Config.SQLITE_DATABASE_PATH, help="database file (default SQLITE_DATABASE_PATH)")
+    parser.add_argument('--users', type=int, default=0, help="synthetic users to add")
+    parser.add_argument('--tracks', type=int, default=20, help="tracks per user")
+    parser.add_argument('--days', type=int, default=90, help="days of play history")
+    parser.add_argument('--plays', type=int, default=5, help="average plays per track per day")
+    parser.add_argument('--seed', type=int, default=0, help="random seed")
+    args = parser.parse_args()
+
+    client = SQLiteClient(args.path)
+    print(f"Schema is up to date in {args.path}")
+
+    if args.users:
+        created = seed(client, args.users, args.tracks, args.days, args.plays, random.Random(args.seed))
+        print(f"Seeded {created['users']} users, {created['tracks']} tracks and {created['plays']} plays")
+
+if __name__ == '__main__':
+    main()
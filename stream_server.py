@@ -0,0 +1,324 @@
+"""Standalone HTTP server that streams audio from the uploads directory.
+
+Run alongside the Streamlit app:
+
+    python stream_server.py
+
+Pages embed `audio_utils.get_stream_url(file_path)` instead of handing the
+file to `st.audio`, so audio bytes never pass through the Streamlit process.
+The server supports single byte ranges (seeking), ETag revalidation and
+sends file bodies with sendfile(2). `/peaks/<path>` returns precomputed
+waveform peaks for a time window as JSON, and `/resumable/<upload id>`
+accepts tus-style HEAD/PATCH requests for resumable uploads started from
+the upload page.
+"""
+import os
+import re
+import json
+import time
+import base64
+import binascii
+import mimetypes
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from urllib.parse import unquote, urlsplit, parse_qs
+from config import Config
+from waveform import read_peaks_window
+from resumable_upload import ResumableUploadError, get_upload_session, write_chunk, gc_stale_uploads
+
+MEDIA_PREFIX = '/media/'
+PEAKS_PREFIX = '/peaks/'
+RESUMABLE_PREFIX = '/resumable/'
+TUS_VERSION = '1.0.0'
+RESUMABLE_GC_INTERVAL_SECONDS = 3600
+MAX_PEAKS_PER_REQUEST = 4000
+
+AUDIO_CONTENT_TYPES = {
+    '.mp3': 'audio/mpeg',
+    '.wav': 'audio/wav',
+    '.flac': 'audio/flac',
+}
+
+CONTENT_HASH_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+def resolve_media_path(url_path: str, prefix: str = MEDIA_PREFIX) -> Optional[str]:
+    """Map a request path to a file inside the upload directory, or None"""
+    if not url_path.startswith(prefix):
+        return None
+
+    relative_path = unquote(url_path[len(prefix):])
+    if any(part.startswith('.') for part in relative_path.split('/')):
+        return None
+
+    upload_root = os.path.realpath(Config.UPLOAD_DIR)
+    file_path = os.path.realpath(os.path.join(upload_root, relative_path))
+
+    if os.path.commonpath([upload_root, file_path]) != upload_root:
+        return None
+
+    if not os.path.isfile(file_path):
+        return None
+
+    return file_path
+
+class RangeNotSatisfiable(Exception):
+    """A well-formed byte range that lies outside the file"""
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single `bytes=` range into an inclusive (start, end) pair.
+
+    Returns None for a header to ignore, one that is malformed or asks for
+    several ranges, so the whole file is sent. Raises RangeNotSatisfiable
+    for a valid range that no byte of the file falls in.
+    """
+    match = RANGE_PATTERN.match(header.strip())
+    if not match:
+        return None
+
+    start, end = match.groups()
+
+    if not start:
+        if not end:
+            return None
+        suffix_length = int(end)
+        if suffix_length == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - suffix_length), size - 1
+
+    first = int(start)
+    last = int(end) if end else size - 1
+
+    if end and last < first:
+        return None
+
+    if first >= size:
+        raise RangeNotSatisfiable()
+
+    return first, min(last, size - 1)
+
+def make_etag(file_path: str, stat: os.stat_result) -> str:
+    # Blob names are already SHA-256 digests of their content
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    if CONTENT_HASH_PATTERN.match(stem):
+        return f'"{stem}"'
+
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+def _parse_upload_metadata(header: str) -> dict:
+    """Decode a tus Upload-Metadata header: comma-separated `key base64value` pairs"""
+    metadata = {}
+    for pair in filter(None, (item.strip() for item in header.split(','))):
+        key, _, value = pair.partition(' ')
+        metadata[key] = base64.b64decode(value).decode('utf-8') if value else ''
+    return metadata
+
+class StreamRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'OmawiNaStream/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    def do_HEAD(self):
+        url_path = urlsplit(self.path).path
+        if url_path.startswith(RESUMABLE_PREFIX):
+            self._resumable_head(url_path[len(RESUMABLE_PREFIX):])
+        else:
+            self._serve(send_body=False)
+
+    def do_PATCH(self):
+        url_path = urlsplit(self.path).path
+        if not url_path.startswith(RESUMABLE_PREFIX):
+            self._send_empty(HTTPStatus.METHOD_NOT_ALLOWED)
+            return
+
+        upload_id = url_path[len(RESUMABLE_PREFIX):]
+        try:
+            offset = int(self.headers['Upload-Offset'])
+            content_length = int(self.headers['Content-Length'])
+            upload_length = self.headers.get('Upload-Length')
+            upload_length = int(upload_length) if upload_length is not None else None
+            file_name = _parse_upload_metadata(self.headers.get('Upload-Metadata', '')).get('filename')
+        except (TypeError, ValueError, binascii.Error):
+            self.close_connection = True
+            self._send_resumable(HTTPStatus.BAD_REQUEST)
+            return
+
+        if self.headers.get('Content-Type') != 'application/offset+octet-stream':
+            self.close_connection = True
+            self._send_resumable(HTTPStatus.UNSUPPORTED_MEDIA_TYPE)
+            return
+
+        try:
+            new_offset = write_chunk(upload_id, offset, self.rfile, content_length, upload_length, file_name)
+        except ResumableUploadError as e:
+            self.close_connection = True
+            self._send_resumable(e.status)
+            return
+
+        if new_offset - offset < content_length:
+            # The client went away mid-chunk; nothing left to answer
+            self.close_connection = True
+            return
+
+        self._send_resumable(HTTPStatus.NO_CONTENT, {'Upload-Offset': str(new_offset)})
+
+    def do_OPTIONS(self):
+        self._send_resumable(HTTPStatus.NO_CONTENT, {
+            'Access-Control-Allow-Methods': 'HEAD, PATCH, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type, Upload-Offset, Upload-Length, Upload-Metadata, Tus-Resumable',
+            'Access-Control-Max-Age': '86400',
+            'Tus-Version': TUS_VERSION,
+            'Tus-Max-Size': str(Config.RESUMABLE_MAX_FILE_SIZE_MB * 1024 * 1024),
+        })
+
+    def _resumable_head(self, upload_id: str):
+        session = get_upload_session(upload_id)
+        if session is None:
+            self._send_resumable(HTTPStatus.NOT_FOUND)
+            return
+
+        headers = {'Upload-Offset': str(session.offset), 'Cache-Control': 'no-store'}
+        if session.length is not None:
+            headers['Upload-Length'] = str(session.length)
+        else:
+            headers['Upload-Defer-Length'] = '1'
+
+        self._send_resumable(HTTPStatus.OK, headers)
+
+    def _send_resumable(self, status: HTTPStatus, headers: Optional[dict] = None):
+        self.send_response(status)
+        self.send_header('Tus-Resumable', TUS_VERSION)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Expose-Headers', 'Upload-Offset, Upload-Length, Upload-Defer-Length, Location, Tus-Resumable')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path.startswith(PEAKS_PREFIX):
+            self._serve_peaks(url.path, parse_qs(url.query))
+        else:
+            self._serve(send_body=True)
+
+    def _serve_peaks(self, url_path: str, query: dict):
+        file_path = resolve_media_path(url_path, PEAKS_PREFIX)
+
+        try:
+            start = float(query.get('start', ['0'])[0])
+            end = float(query['end'][0]) if 'end' in query else None
+            width = min(int(query.get('width', ['1000'])[0]), MAX_PEAKS_PER_REQUEST)
+        except ValueError:
+            self._send_empty(HTTPStatus.BAD_REQUEST)
+            return
+
+        window = read_peaks_window(file_path, start, end, width) if file_path else None
+        if window is None:
+            self._send_empty(HTTPStatus.NOT_FOUND)
+            return
+
+        body = json.dumps(window, separators=(',', ':')).encode('utf-8')
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', f'public, max-age={Config.STREAM_CACHE_MAX_AGE}')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _serve(self, send_body: bool):
+        file_path = resolve_media_path(urlsplit(self.path).path)
+        if not file_path:
+            self._send_empty(HTTPStatus.NOT_FOUND)
+            return
+
+        with open(file_path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            size = stat.st_size
+            etag = make_etag(file_path, stat)
+
+            if etag in self.headers.get('If-None-Match', ''):
+                self._send_empty(HTTPStatus.NOT_MODIFIED, etag)
+                return
+
+            byte_range = None
+            range_header = self.headers.get('Range')
+            if_range = self.headers.get('If-Range')
+
+            if range_header and (not if_range or if_range == etag):
+                try:
+                    byte_range = parse_range(range_header, size)
+                except RangeNotSatisfiable:
+                    self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                    self.send_header('Content-Range', f'bytes */{size}')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+            if byte_range:
+                start, end = byte_range
+                self.send_response(HTTPStatus.PARTIAL_CONTENT)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+            else:
+                start, end = 0, size - 1
+                self.send_response(HTTPStatus.OK)
+
+            length = end - start + 1 if size else 0
+            self._send_media_headers(file_path, etag, length)
+
+            if send_body and length:
+                self.wfile.flush()
+                self.connection.sendfile(f, offset=start, count=length)
+
+    def _send_media_headers(self, file_path: str, etag: str, length: int):
+        extension = os.path.splitext(file_path)[1].lower()
+        content_type = AUDIO_CONTENT_TYPES.get(extension) or mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(length))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', f'public, max-age={Config.STREAM_CACHE_MAX_AGE}')
+        self.end_headers()
+
+    def _send_empty(self, status: HTTPStatus, etag: Optional[str] = None):
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        if not Config.is_production():
+            super().log_message(format, *args)
+
+def create_server(host: str = '0.0.0.0', port: Optional[int] = None) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port or Config.STREAM_PORT), StreamRequestHandler)
+    server.daemon_threads = True
+    return server
+
+def _collect_stale_uploads():
+    while True:
+        try:
+            removed = gc_stale_uploads()
+            if removed:
+                print(f"Removed {removed} stale resumable upload(s)")
+        except Exception as e:
+            print(f"Resumable upload cleanup error: {e}")
+        time.sleep(RESUMABLE_GC_INTERVAL_SECONDS)
+
+def main():
+    threading.Thread(target=_collect_stale_uploads, name='resumable-gc', daemon=True).start()
+    server = create_server()
+    print(f"Streaming {Config.UPLOAD_DIR}/ on port {server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
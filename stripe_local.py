@@ -0,0 +1,76 @@
+import hmac
+import json
+import time
+import hashlib
+import secrets
+import urllib.request
+from typing import Optional, Dict, Any
+from config import Config
+
+# A local stand-in for the Stripe side of checkout: it creates payment
+# intents without calling the API and delivers signed webhook events to
+# stripe_webhooks.py. Demo mode uses it, and so can tests against the
+# receiver.
+
+def create_local_payment_intent(user_id: str, amount_cents: int, currency: str = 'nad') -> Dict[str, Any]:
+    intent_id = f"pi_local_{secrets.token_hex(12)}"
+    return {
+        'id': intent_id,
+        'object': 'payment_intent',
+        'amount': amount_cents,
+        'amount_received': 0,
+        'currency': currency,
+        'status': 'requires_payment_method',
+        'client_secret': f"{intent_id}_secret_{secrets.token_hex(12)}",
+        'metadata': {'user_id': str(user_id), 'subscription_type': 'quarterly'}
+    }
+
+def build_event(event_type: str, data_object: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'id': f"evt_local_{secrets.token_hex(12)}",
+        'object': 'event',
+        'type': event_type,
+        'created': int(time.time()),
+        'data': {'object': data_object}
+    }
+
+def sign_payload(payload: bytes, secret: str, timestamp: Optional[int] = None) -> str:
+    """Build a Stripe-Signature header the way Stripe signs webhook deliveries"""
+    timestamp = timestamp or int(time.time())
+    signed = f"{timestamp}.".encode('utf-8') + payload
+    signature = hmac.new(secret.encode('utf-8'), signed, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+def deliver_event(event: Dict[str, Any], url: Optional[str] = None, secret: Optional[str] = None) -> bool:
+    """POST a signed event to the webhook receiver; returns True if it was accepted"""
+    payload = json.dumps(event).encode('utf-8')
+    request = urllib.request.Request(
+        url or Config.STRIPE_WEBHOOK_URL,
+        data=payload,
+        method='POST',
+        headers={
+            'Content-Type': 'application/json',
+            'Stripe-Signature': sign_payload(payload, secret or Config.get_webhook_secret())
+        }
+    )
+
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status == 200
+    except OSError as e:
+        print(f"Error delivering local Stripe event: {e}")
+        return False
+
+def simulate_payment_succeeded(payment_intent_id: str, user_id: str, amount_nad: float, currency: str = 'nad') -> bool:
+    """Deliver the payment_intent.succeeded event Stripe would send once the customer pays"""
+    amount_cents = int(amount_nad * 100)
+    intent = {
+        'id': payment_intent_id,
+        'object': 'payment_intent',
+        'amount': amount_cents,
+        'amount_received': amount_cents,
+        'currency': currency,
+        'status': 'succeeded',
+        'metadata': {'user_id': str(user_id), 'subscription_type': 'quarterly'}
+    }
+    return deliver_event(build_event('payment_intent.succeeded', intent))
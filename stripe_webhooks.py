@@ -0,0 +1,227 @@
+"""Stripe webhook receiver with a local, idempotent event queue.
+
+Run alongside the Streamlit app:
+
+    python stripe_webhooks.py
+
+Point a Stripe webhook endpoint for `payment_intent.succeeded` and
+`payment_intent.payment_failed` at STRIPE_WEBHOOK_URL. Each delivery is
+verified against STRIPE_WEBHOOK_SECRET and stored once per event id in a
+SQLite table (WEBHOOK_EVENT_DB), then acknowledged immediately. A
+background thread applies queued events to Supabase in batches through the
+`apply_stripe_payments` function. That function is restricted to the
+service role, so run this process with the service-role key in
+SUPABASE_ANON_KEY.
+
+`stripe_local.py` delivers signed events to this receiver for local
+testing and demo mode.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Dict, Any, List
+import stripe
+from config import Config
+from database import apply_stripe_payments
+
+WEBHOOK_PATH = '/stripe/webhook'
+PAYMENT_EVENTS = {
+    'payment_intent.succeeded': 'succeeded',
+    'payment_intent.payment_failed': 'failed',
+}
+
+_wake = threading.Event()
+
+def _connect() -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(Config.WEBHOOK_EVENT_DB) or '.', exist_ok=True)
+    connection = sqlite3.connect(Config.WEBHOOK_EVENT_DB, timeout=30)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('''
+        CREATE TABLE IF NOT EXISTS stripe_events (
+            id TEXT PRIMARY KEY,
+            type TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            received_at REAL NOT NULL,
+            processed_at REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT
+        )
+    ''')
+    connection.execute('CREATE INDEX IF NOT EXISTS idx_stripe_events_pending ON stripe_events(processed_at, received_at)')
+    return connection
+
+def verify_event(payload: bytes, signature_header: Optional[str]) -> Dict[str, Any]:
+    """Check the Stripe-Signature header and return the decoded event.
+
+    Raises stripe.SignatureVerificationError for forged, altered or
+    replayed (older than STRIPE_WEBHOOK_TOLERANCE_SECONDS) deliveries,
+    and ValueError when no signing secret is configured.
+    """
+    secret = Config.get_webhook_secret()
+    if not secret:
+        raise ValueError("STRIPE_WEBHOOK_SECRET is not set")
+
+    stripe.WebhookSignature.verify_header(
+        payload,
+        signature_header,
+        secret,
+        Config.STRIPE_WEBHOOK_TOLERANCE_SECONDS
+    )
+    return json.loads(payload)
+
+def enqueue_event(event: Dict[str, Any]) -> bool:
+    """Store an event for processing; returns False if this event id was already received"""
+    with closing(_connect()) as connection, connection:
+        cursor = connection.execute(
+            'INSERT OR IGNORE INTO stripe_events (id, type, payload, received_at) VALUES (?, ?, ?, ?)',
+            (event['id'], event['type'], json.dumps(event), time.time())
+        )
+        is_new = cursor.rowcount == 1
+
+    if is_new:
+        _wake.set()
+
+    return is_new
+
+def _payment_row(event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    status = PAYMENT_EVENTS.get(event['type'])
+    if status is None:
+        return None
+
+    intent = event['data']['object']
+    user_id = (intent.get('metadata') or {}).get('user_id')
+    if not user_id:
+        return None
+
+    payment_date = datetime.fromtimestamp(event.get('created') or time.time(), timezone.utc)
+    amount = intent.get('amount_received') or intent.get('amount') or 0
+
+    return {
+        'user_id': user_id,
+        'stripe_payment_id': intent['id'],
+        'amount': amount / 100,
+        'currency': intent.get('currency'),
+        'status': status,
+        'payment_date': payment_date.isoformat(),
+        'period_end': (payment_date + timedelta(days=Config.SUBSCRIPTION_PERIOD_DAYS)).isoformat()
+    }
+
+def apply_pending_events() -> int:
+    """Apply queued events in batches of WEBHOOK_BATCH_SIZE; returns how many events were processed.
+
+    A batch that fails stays queued and is retried on the next run, up to
+    WEBHOOK_MAX_ATTEMPTS times.
+    """
+    processed = 0
+
+    with closing(_connect()) as connection:
+        while True:
+            rows = connection.execute(
+                'SELECT id, payload FROM stripe_events WHERE processed_at IS NULL AND attempts < ? ORDER BY received_at LIMIT ?',
+                (Config.WEBHOOK_MAX_ATTEMPTS, Config.WEBHOOK_BATCH_SIZE)
+            ).fetchall()
+            if not rows:
+                return processed
+
+            event_ids = [event_id for event_id, _ in rows]
+            placeholders = ','.join('?' * len(event_ids))
+            payments: List[Dict[str, Any]] = []
+            for _, payload in rows:
+                payment = _payment_row(json.loads(payload))
+                if payment:
+                    payments.append(payment)
+
+            if apply_stripe_payments(payments) is None:
+                connection.execute(
+                    f'UPDATE stripe_events SET attempts = attempts + 1, last_error = ? WHERE id IN ({placeholders})',
+                    ['apply_stripe_payments failed', *event_ids]
+                )
+                connection.commit()
+                return processed
+
+            connection.execute(
+                f'UPDATE stripe_events SET processed_at = ?, attempts = attempts + 1, last_error = NULL WHERE id IN ({placeholders})',
+                [time.time(), *event_ids]
+            )
+            connection.commit()
+
+            processed += len(rows)
+
+def _run_applier():
+    while True:
+        _wake.wait(Config.WEBHOOK_APPLY_INTERVAL_SECONDS)
+        _wake.clear()
+
+        try:
+            applied = apply_pending_events()
+            if applied:
+                print(f"Applied {applied} Stripe event(s)")
+        except Exception as e:
+            print(f"Error applying Stripe events: {e}")
+
+class WebhookRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'OmawiNaWebhooks/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        if self.path != WEBHOOK_PATH:
+            self._send_json(HTTPStatus.NOT_FOUND, {'error': 'not found'})
+            return
+
+        try:
+            payload = self.rfile.read(int(self.headers['Content-Length']))
+        except (TypeError, ValueError):
+            self.close_connection = True
+            self._send_json(HTTPStatus.BAD_REQUEST, {'error': 'missing body'})
+            return
+
+        try:
+            event = verify_event(payload, self.headers.get('Stripe-Signature'))
+        except (stripe.SignatureVerificationError, ValueError):
+            self._send_json(HTTPStatus.BAD_REQUEST, {'error': 'invalid signature'})
+            return
+
+        # Acknowledge right away; Stripe retries deliveries that are slow to answer
+        duplicate = not enqueue_event(event)
+        self._send_json(HTTPStatus.OK, {'received': True, 'duplicate': duplicate})
+
+    def _send_json(self, status: HTTPStatus, body: Dict[str, Any]):
+        encoded = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, format, *args):
+        if not Config.is_production():
+            super().log_message(format, *args)
+
+def create_server(host: str = '0.0.0.0', port: Optional[int] = None) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port or Config.STRIPE_WEBHOOK_PORT), WebhookRequestHandler)
+    server.daemon_threads = True
+    return server
+
+def main():
+    if not Config.get_webhook_secret():
+        print("STRIPE_WEBHOOK_SECRET must be set to receive Stripe webhooks")
+        return
+
+    threading.Thread(target=_run_applier, name='stripe-applier', daemon=True).start()
+    server = create_server()
+    print(f"Receiving Stripe webhooks at {WEBHOOK_PATH} on port {server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Persist subscription status transitions in bulk.
+
+Pages only read the effective status computed by
+`payment.compute_subscription_state`; this job writes it back. Run it on a
+schedule:
+
+    python subscription_sweeper.py               # one pass, e.g. from cron
+    python subscription_sweeper.py --every       # keep sweeping every SWEEPER_INTERVAL_SECONDS
+
+Each pass walks the users whose deadline has passed, status by status, in
+indexed batches. It applies each batch with one UPDATE per target status,
+then sends the grace period and suspension notices for the users it moved
+as batched, templated requests.
+"""
+import time
+import argparse
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, List, Tuple, Any
+from config import Config
+from database import get_users_due_for_transition, bulk_update_subscription_status
+from payment import compute_subscription_state
+from email_service import BatchReport, send_grace_period_warnings, send_suspension_notifications
+from email_outbox import drain_outbox
+
+# Stored status, the column its deadline is measured from, and how long after that date it lapses
+SWEEPS = (
+    ('trial', 'trial_start_date', timedelta(days=Config.TRIAL_PERIOD_DAYS)),
+    ('active', 'next_payment_due', timedelta(0)),
+    ('grace_period', 'next_payment_due', timedelta(days=Config.GRACE_PERIOD_DAYS)),
+)
+
+NOTICES = {
+    'grace_period': send_grace_period_warnings,
+    'suspended': send_suspension_notifications,
+}
+
+@dataclass
+class SweepResult:
+    transitions: Dict[Tuple[str, str], int] = field(default_factory=dict)
+    notice_batches: Dict[str, List[BatchReport]] = field(default_factory=dict)
+    errors: int = 0
+
+    def summary(self) -> str:
+        moved = ', '.join(f"{old} -> {new}: {count}" for (old, new), count in sorted(self.transitions.items())) or 'no transitions'
+        lines = [f"{moved}; errors {self.errors}"]
+        for status, reports in self.notice_batches.items():
+            lines.extend(f"  {status} notices: {report}" for report in reports)
+        return '\n'.join(lines)
+
+def _sweep_status(status: str, date_column: str, due_before: datetime, now: datetime, dry_run: bool, result: SweepResult, notices: Dict[str, List[Dict[str, Any]]]):
+    after_id = None
+
+    while True:
+        users = get_users_due_for_transition(status, date_column, due_before, after_id, Config.SWEEPER_BATCH_SIZE)
+        if users is None:
+            result.errors += 1
+            return
+        if not users:
+            return
+
+        after_id = users[-1]['id']
+
+        moves = defaultdict(list)
+        for user in users:
+            new_status = compute_subscription_state(user, now).status
+            if new_status != status:
+                moves[new_status].append(user)
+
+        for new_status, moving in moves.items():
+            user_ids = [user['id'] for user in moving]
+            updated_ids = user_ids if dry_run else bulk_update_subscription_status(user_ids, status, new_status)
+            if updated_ids is None:
+                result.errors += 1
+                continue
+
+            key = (status, new_status)
+            result.transitions[key] = result.transitions.get(key, 0) + len(updated_ids)
+
+            if new_status in NOTICES:
+                updated = set(updated_ids)
+                notices[new_status].extend(
+                    {'email': user['email'], 'username': user['username']}
+                    for user in moving if user['id'] in updated
+                )
+
+        if len(users) < Config.SWEEPER_BATCH_SIZE:
+            return
+
+def sweep(now: Optional[datetime] = None, dry_run: bool = False) -> SweepResult:
+    """Run one pass over every status with a deadline; with dry_run nothing is written or sent"""
+    now = now or datetime.now(timezone.utc)
+    result = SweepResult()
+    notices: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+
+    for status, date_column, lapse_after in SWEEPS:
+        _sweep_status(status, date_column, now - lapse_after, now, dry_run, result, notices)
+
+    # Notices go out only after the status changes they announce are stored,
+    # one templated request per EMAIL_PERSONALIZATIONS_PER_REQUEST recipients
+    if not dry_run:
+        for new_status, recipients in notices.items():
+            if recipients:
+                result.notice_batches[new_status] = NOTICES[new_status](recipients)
+
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply due subscription status transitions")
+    parser.add_argument(
+        '--every', type=int, nargs='?', const=Config.SWEEPER_INTERVAL_SECONDS, metavar='SECONDS',
+        help="repeat the sweep at this interval (default SWEEPER_INTERVAL_SECONDS)"
+    )
+    parser.add_argument('--dry-run', action='store_true', help="report transitions without writing or emailing")
+    args = parser.parse_args()
+
+    while True:
+        started = time.monotonic()
+        result = sweep(dry_run=args.dry_run)
+        print(f"Subscription sweep{' (dry run)' if args.dry_run else ''} in {time.monotonic() - started:.1f}s: {result.summary()}")
+
+        if not args.every and not drain_outbox():
+            print("Some notices are still waiting in the email outbox and will be retried by the next run")
+
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,21 @@
+/*
+  # Content-addressed audio storage
+
+  ## Overview
+  Uploaded audio is stored once per distinct file content under
+  `uploads/blobs/<aa>/<sha256>.<ext>`. Tracks record the SHA-256 of their
+  audio so identical uploads share one blob, and the number of tracks
+  pointing at a hash acts as the blob's reference count.
+
+  ## Changes
+
+  ### tracks
+  - `content_hash` (text) - SHA-256 hex digest of the audio file
+
+  ## Indexes
+  - Tracks: content_hash (reference counting and duplicate lookup)
+*/
+
+ALTER TABLE tracks ADD COLUMN IF NOT EXISTS content_hash text;
+
+CREATE INDEX IF NOT EXISTS idx_tracks_content_hash ON tracks(content_hash);
@@ -0,0 +1,53 @@
+/*
+  # Paginated track listings
+
+  ## Overview
+  Dashboard and portfolio pages list a user's tracks newest first, one page
+  at a time, using keyset pagination on (created_at, id) instead of loading
+  every row. Listings select only light columns; lyrics and credits are
+  fetched per track when the listener opens them.
+
+  ## Changes
+
+  ### tracks
+  - `has_lyrics` (boolean, generated) - Whether the track has lyrics
+  - `has_credits` (boolean, generated) - Whether the track has producer or featured artist credits
+
+  ## Functions
+  - `get_user_track_totals(p_user_id)` - Track count, plays, duration and storage for a user in one row
+
+  ## Indexes
+  - Tracks: (user_id, created_at DESC, id DESC) for keyset pagination.
+    It also serves every lookup by user_id, so idx_tracks_user_id is dropped.
+*/
+
+ALTER TABLE tracks
+  ADD COLUMN IF NOT EXISTS has_lyrics boolean
+    GENERATED ALWAYS AS (coalesce(lyrics, '') <> '') STORED;
+
+ALTER TABLE tracks
+  ADD COLUMN IF NOT EXISTS has_credits boolean
+    GENERATED ALWAYS AS (coalesce(producer_credits, '') <> '' OR coalesce(featured_artists, '') <> '') STORED;
+
+CREATE INDEX IF NOT EXISTS idx_tracks_user_created_id ON tracks(user_id, created_at DESC, id DESC);
+
+DROP INDEX IF EXISTS idx_tracks_user_id;
+
+CREATE OR REPLACE FUNCTION get_user_track_totals(p_user_id uuid)
+RETURNS TABLE (
+  track_count bigint,
+  total_plays bigint,
+  total_duration_seconds bigint,
+  total_file_size bigint
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT
+    count(*),
+    coalesce(sum(play_count), 0),
+    coalesce(sum(duration_seconds), 0),
+    coalesce(sum(file_size), 0)
+  FROM tracks
+  WHERE user_id = p_user_id;
+$$;
@@ -0,0 +1,48 @@
+/*
+  # Atomic play recording
+
+  ## Overview
+  Recording a play used to take three round trips from the app: read
+  `play_count`, write back the incremented value, then insert the play
+  event. Concurrent plays could overwrite each other's increments.
+  `record_track_play` does both writes in one statement. The increment is
+  applied by Postgres under the row lock, so no plays are lost.
+
+  ## Functions
+  - `record_track_play(p_track_id, p_ip_address, p_user_agent, p_user_id)` -
+    Inserts a track_plays row and increments tracks.play_count, returning
+    the new count (NULL when the track does not exist)
+
+  ## Security
+  - SECURITY DEFINER so anonymous listeners can bump the counter without an
+    UPDATE policy on tracks; the function only touches play_count
+  - Executable by anon and authenticated
+*/
+
+CREATE OR REPLACE FUNCTION record_track_play(
+  p_track_id uuid,
+  p_ip_address inet DEFAULT NULL,
+  p_user_agent text DEFAULT NULL,
+  p_user_id uuid DEFAULT NULL
+)
+RETURNS integer
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  WITH play AS (
+    INSERT INTO track_plays (track_id, user_id, ip_address, user_agent)
+    SELECT id, p_user_id, p_ip_address, p_user_agent
+    FROM tracks
+    WHERE id = p_track_id
+    RETURNING track_id
+  )
+  UPDATE tracks
+  SET play_count = coalesce(tracks.play_count, 0) + 1
+  FROM play
+  WHERE tracks.id = play.track_id
+  RETURNING tracks.play_count;
+$$;
+
+REVOKE ALL ON FUNCTION record_track_play(uuid, inet, text, uuid) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION record_track_play(uuid, inet, text, uuid) TO anon, authenticated;
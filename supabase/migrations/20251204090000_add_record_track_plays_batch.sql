@@ -0,0 +1,63 @@
+/*
+  # Batched play recording
+
+  ## Overview
+  The app buffers play events and flushes them in batches. A batch is
+  written with `record_track_plays`: the events are inserted with one
+  multi-row INSERT, and each track's counter is bumped once by the number
+  of its plays in the batch. This avoids one INSERT and one UPDATE per play.
+
+  Event ids are generated by the client. If a batch is retried after a
+  failure, rows that were already stored are skipped, and only newly
+  inserted rows count toward play_count, so replaying a spool is idempotent.
+
+  ## Functions
+  - `record_track_plays(p_plays jsonb)` - Inserts an array of
+    `{id, track_id, ip_address, user_agent, played_at}` objects and returns
+    the number of new plays recorded
+
+  ## Security
+  - SECURITY DEFINER like `record_track_play`; executable by anon and authenticated
+*/
+
+CREATE OR REPLACE FUNCTION record_track_plays(p_plays jsonb)
+RETURNS integer
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  WITH incoming AS (
+    SELECT *
+    FROM jsonb_to_recordset(p_plays) AS p(
+      id uuid,
+      track_id uuid,
+      ip_address inet,
+      user_agent text,
+      played_at timestamptz
+    )
+  ),
+  inserted AS (
+    INSERT INTO track_plays (id, track_id, ip_address, user_agent, played_at)
+    SELECT incoming.id, incoming.track_id, incoming.ip_address, incoming.user_agent, coalesce(incoming.played_at, now())
+    FROM incoming
+    JOIN tracks ON tracks.id = incoming.track_id
+    ON CONFLICT DO NOTHING
+    RETURNING track_id
+  ),
+  counts AS (
+    SELECT track_id, count(*) AS plays
+    FROM inserted
+    GROUP BY track_id
+  ),
+  updated AS (
+    UPDATE tracks
+    SET play_count = coalesce(tracks.play_count, 0) + counts.plays
+    FROM counts
+    WHERE tracks.id = counts.track_id
+    RETURNING counts.plays
+  )
+  SELECT coalesce(sum(plays), 0)::integer FROM updated;
+$$;
+
+REVOKE ALL ON FUNCTION record_track_plays(jsonb) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION record_track_plays(jsonb) TO anon, authenticated;
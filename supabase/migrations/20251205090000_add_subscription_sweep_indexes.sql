@@ -0,0 +1,20 @@
+/*
+  # Subscription sweeper indexes
+
+  ## Overview
+  `subscription_sweeper.py` persists trial, grace period and suspension
+  transitions in bulk. For each status it selects the users whose deadline
+  has passed. These indexes make each selection a range scan over only the
+  due users of that status, instead of a scan of the whole users table.
+
+  ## Indexes
+  - Users: (subscription_status, next_payment_due, id) - overdue active
+    subscriptions and expired grace periods
+  - Users: (subscription_status, trial_start_date, id) - expired trials
+*/
+
+CREATE INDEX IF NOT EXISTS idx_users_status_next_payment_due
+  ON users(subscription_status, next_payment_due, id);
+
+CREATE INDEX IF NOT EXISTS idx_users_status_trial_start
+  ON users(subscription_status, trial_start_date, id);
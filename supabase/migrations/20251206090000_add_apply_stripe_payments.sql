@@ -0,0 +1,77 @@
+/*
+  # Batched Stripe payment application
+
+  ## Overview
+  Stripe webhook events are queued locally by `stripe_webhooks.py` and
+  applied in batches. `apply_stripe_payments` records a batch of payments
+  with one multi-row INSERT. It then activates the paying users with one
+  UPDATE, replacing the update_subscription_status + record_payment pair
+  per checkout.
+
+  Stripe delivers events at least once. A payment that is already recorded
+  (same stripe_payment_id) is skipped, together with its subscription
+  update, so re-delivered or re-applied events change nothing.
+
+  ## Functions
+  - `apply_stripe_payments(p_payments jsonb)` - Takes an array of
+    `{user_id, stripe_payment_id, amount, currency, status, payment_date, period_end}`
+    objects and returns the number of payments newly recorded
+
+  ## Indexes
+  - Payments: unique stripe_payment_id
+
+  ## Security
+  - Only the service role may execute it; the webhook receiver runs with
+    the service-role key, never the browser-facing anon key
+*/
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_payments_stripe_payment_id
+  ON payments(stripe_payment_id)
+  WHERE stripe_payment_id IS NOT NULL;
+
+CREATE OR REPLACE FUNCTION apply_stripe_payments(p_payments jsonb)
+RETURNS integer
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  WITH incoming AS (
+    SELECT *
+    FROM jsonb_to_recordset(p_payments) AS p(
+      user_id uuid,
+      stripe_payment_id text,
+      amount numeric,
+      currency text,
+      status text,
+      payment_date timestamptz,
+      period_end timestamptz
+    )
+  ),
+  inserted AS (
+    INSERT INTO payments (user_id, stripe_payment_id, amount, currency, status, payment_date, subscription_period_start, subscription_period_end)
+    SELECT user_id, stripe_payment_id, amount, coalesce(upper(currency), 'NAD'), status, payment_date, payment_date, period_end
+    FROM incoming
+    WHERE EXISTS (SELECT 1 FROM users WHERE users.id = incoming.user_id)
+    ON CONFLICT (stripe_payment_id) WHERE stripe_payment_id IS NOT NULL DO NOTHING
+    RETURNING user_id, status, payment_date, subscription_period_end
+  ),
+  latest AS (
+    SELECT DISTINCT ON (user_id) user_id, payment_date, subscription_period_end
+    FROM inserted
+    WHERE status = 'succeeded'
+    ORDER BY user_id, subscription_period_end DESC
+  ),
+  activated AS (
+    UPDATE users
+    SET subscription_status = 'active',
+        last_payment_date = latest.payment_date,
+        next_payment_due = latest.subscription_period_end
+    FROM latest
+    WHERE users.id = latest.user_id
+    RETURNING users.id
+  )
+  SELECT count(*)::integer FROM inserted;
+$$;
+
+REVOKE ALL ON FUNCTION apply_stripe_payments(jsonb) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION apply_stripe_payments(jsonb) TO service_role;
@@ -0,0 +1,178 @@
+/*
+  # Materialized per-user catalog statistics
+
+  ## Overview
+  Dashboards show a user's track count, plays, duration, storage and
+  portfolio views. Instead of aggregating the tracks table on every render,
+  these totals live in one `user_stats` row per user. Statement-level
+  triggers on tracks keep the row up to date. Each INSERT, UPDATE or
+  DELETE statement adjusts the totals by the summed difference of the rows
+  it touched. A 1000-row batch insert or a batched play flush therefore
+  costs one upsert per affected user, not one per row.
+
+  ## New Tables
+
+  ### user_stats
+  - `user_id` (uuid, primary key) - Reference to users table
+  - `track_count` (integer) - Number of tracks
+  - `total_plays` (bigint) - Sum of tracks.play_count
+  - `total_duration_seconds` (bigint) - Sum of tracks.duration_seconds
+  - `total_file_size` (bigint) - Sum of tracks.file_size in bytes
+  - `portfolio_views` (bigint) - Portfolio page views
+  - `updated_at` (timestamptz) - Last change
+
+  ## Functions
+  - `apply_user_stats_delta(...)` - Adds a delta to a user's row, creating it if needed
+  - `record_portfolio_view(p_user_id)` - Counts one portfolio view
+  - Trigger functions for INSERT, UPDATE and DELETE on tracks
+
+  ## Removed
+  - `get_user_track_totals` - Replaced by reading user_stats
+
+  ## Security
+  - RLS enabled; users read their own row, anyone may read it for portfolios
+    (same visibility as tracks)
+  - Rows are only written by the SECURITY DEFINER functions
+*/
+
+CREATE TABLE IF NOT EXISTS user_stats (
+  user_id uuid PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+  track_count integer NOT NULL DEFAULT 0,
+  total_plays bigint NOT NULL DEFAULT 0,
+  total_duration_seconds bigint NOT NULL DEFAULT 0,
+  total_file_size bigint NOT NULL DEFAULT 0,
+  portfolio_views bigint NOT NULL DEFAULT 0,
+  updated_at timestamptz NOT NULL DEFAULT now()
+);
+
+ALTER TABLE user_stats ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view own stats"
+  ON user_stats FOR SELECT
+  TO authenticated
+  USING (user_id = auth.uid()::uuid);
+
+CREATE POLICY "Public can view stats for portfolio"
+  ON user_stats FOR SELECT
+  TO anon
+  USING (true);
+
+CREATE OR REPLACE FUNCTION apply_user_stats_delta(
+  p_user_id uuid,
+  p_tracks bigint,
+  p_plays bigint,
+  p_duration bigint,
+  p_file_size bigint,
+  p_views bigint DEFAULT 0
+)
+RETURNS void
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  INSERT INTO user_stats (user_id, track_count, total_plays, total_duration_seconds, total_file_size, portfolio_views)
+  VALUES (p_user_id, p_tracks, p_plays, p_duration, p_file_size, p_views)
+  ON CONFLICT (user_id) DO UPDATE SET
+    track_count = user_stats.track_count + EXCLUDED.track_count,
+    total_plays = user_stats.total_plays + EXCLUDED.total_plays,
+    total_duration_seconds = user_stats.total_duration_seconds + EXCLUDED.total_duration_seconds,
+    total_file_size = user_stats.total_file_size + EXCLUDED.total_file_size,
+    portfolio_views = user_stats.portfolio_views + EXCLUDED.portfolio_views,
+    updated_at = now();
+$$;
+
+CREATE OR REPLACE FUNCTION user_stats_tracks_inserted()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  PERFORM apply_user_stats_delta(user_id, count(*), sum(coalesce(play_count, 0)), sum(coalesce(duration_seconds, 0)), sum(coalesce(file_size, 0))::bigint)
+  FROM new_rows
+  GROUP BY user_id;
+  RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION user_stats_tracks_deleted()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  PERFORM apply_user_stats_delta(user_id, -count(*), -sum(coalesce(play_count, 0)), -sum(coalesce(duration_seconds, 0)), -sum(coalesce(file_size, 0))::bigint)
+  FROM old_rows
+  WHERE EXISTS (SELECT 1 FROM users WHERE users.id = old_rows.user_id)
+  GROUP BY user_id;
+  RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION user_stats_tracks_updated()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  PERFORM apply_user_stats_delta(user_id, sum(tracks), sum(plays), sum(duration), sum(file_size)::bigint)
+  FROM (
+    SELECT user_id, 1 AS tracks, coalesce(play_count, 0) AS plays, coalesce(duration_seconds, 0) AS duration, coalesce(file_size, 0) AS file_size
+    FROM new_rows
+    UNION ALL
+    SELECT user_id, -1, -coalesce(play_count, 0), -coalesce(duration_seconds, 0), -coalesce(file_size, 0)
+    FROM old_rows
+  ) AS changes
+  GROUP BY user_id
+  HAVING sum(tracks) <> 0 OR sum(plays) <> 0 OR sum(duration) <> 0 OR sum(file_size) <> 0;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS tracks_user_stats_insert ON tracks;
+CREATE TRIGGER tracks_user_stats_insert
+  AFTER INSERT ON tracks
+  REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION user_stats_tracks_inserted();
+
+DROP TRIGGER IF EXISTS tracks_user_stats_update ON tracks;
+CREATE TRIGGER tracks_user_stats_update
+  AFTER UPDATE ON tracks
+  REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION user_stats_tracks_updated();
+
+DROP TRIGGER IF EXISTS tracks_user_stats_delete ON tracks;
+CREATE TRIGGER tracks_user_stats_delete
+  AFTER DELETE ON tracks
+  REFERENCING OLD TABLE AS old_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION user_stats_tracks_deleted();
+
+CREATE OR REPLACE FUNCTION record_portfolio_view(p_user_id uuid)
+RETURNS void
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  SELECT apply_user_stats_delta(p_user_id, 0, 0, 0, 0, 1)
+  WHERE EXISTS (SELECT 1 FROM users WHERE id = p_user_id);
+$$;
+
+REVOKE ALL ON FUNCTION apply_user_stats_delta(uuid, bigint, bigint, bigint, bigint, bigint) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION record_portfolio_view(uuid) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION record_portfolio_view(uuid) TO anon, authenticated;
+
+-- Backfill from existing tracks
+INSERT INTO user_stats (user_id, track_count, total_plays, total_duration_seconds, total_file_size)
+SELECT user_id, count(*), sum(coalesce(play_count, 0)), sum(coalesce(duration_seconds, 0)), sum(coalesce(file_size, 0))
+FROM tracks
+GROUP BY user_id
+ON CONFLICT (user_id) DO UPDATE SET
+  track_count = EXCLUDED.track_count,
+  total_plays = EXCLUDED.total_plays,
+  total_duration_seconds = EXCLUDED.total_duration_seconds,
+  total_file_size = EXCLUDED.total_file_size,
+  updated_at = now();
+
+DROP FUNCTION IF EXISTS get_user_track_totals(uuid);
@@ -0,0 +1,264 @@
+/*
+  # Monthly partitions, daily rollups and retention for track_plays
+
+  ## Overview
+  `track_plays` gains one row per play and was never trimmed. This migration:
+  - rebuilds it as a table partitioned by month on `played_at`
+  - adds `track_play_daily`, one row per track and day, for analytics
+  - adds functions that the `play_rollup.py` job calls to create upcoming
+    partitions, roll raw plays into daily rows, and drop raw months past
+    the retention window
+
+  Dropping a month is a cheap partition drop, not a large DELETE. Analytics
+  read the rollups, so they never scan raw events.
+
+  Existing rows are copied into the new table and then rolled up.
+
+  ## Changed Tables
+
+  ### track_plays
+  - Partitioned by RANGE (played_at), one partition per calendar month
+    (`track_plays_yYYYYmMM`) and a default partition for anything outside
+    them
+  - Primary key is now (id, played_at): a partitioned table's unique keys
+    must include the partition column. Play ids come from the client and
+    `played_at` is set when the play is buffered, so `record_track_plays`
+    retries are still skipped by ON CONFLICT DO NOTHING
+  - `played_at` is NOT NULL
+
+  ## New Tables
+
+  ### track_play_daily
+  - `track_id` (uuid) - Reference to tracks table
+  - `day` (date) - UTC day of the plays
+  - `user_id` (uuid) - Track owner, denormalized for per-catalog queries
+  - `plays` (integer) - Plays that day
+  - `unique_listeners` (integer) - Distinct listeners that day (signed-in
+    user, otherwise IP address and user agent)
+
+  ## Functions
+  - `ensure_track_play_partitions(p_months_ahead)` - Creates partitions from
+    the current month through p_months_ahead months ahead
+  - `rollup_track_plays(p_from, p_to)` - Recomputes daily rows for UTC days
+    in [p_from, p_to) from raw plays; returns the number of rows written.
+    Days whose raw plays have expired have no raw rows, so their daily
+    rows are left as they are
+  - `expire_track_plays(p_retain_days)` - Rolls up and drops raw plays older
+    than the retention window; returns the number of partitions dropped
+
+  ## Indexes
+  - track_plays: (track_id, played_at), (played_at)
+  - track_play_daily: (user_id, day)
+
+  ## Security
+  - RLS on both tables; owners can read plays and rollups of their own tracks
+  - Maintenance functions are restricted to the service role
+*/
+
+ALTER TABLE track_plays RENAME TO track_plays_unpartitioned;
+ALTER INDEX IF EXISTS idx_track_plays_track_id RENAME TO idx_track_plays_unpartitioned_track_id;
+ALTER INDEX IF EXISTS idx_track_plays_played_at RENAME TO idx_track_plays_unpartitioned_played_at;
+
+CREATE TABLE track_plays (
+  id uuid NOT NULL DEFAULT gen_random_uuid(),
+  track_id uuid REFERENCES tracks(id) ON DELETE CASCADE NOT NULL,
+  user_id uuid REFERENCES users(id) ON DELETE SET NULL,
+  ip_address inet,
+  user_agent text,
+  played_at timestamptz NOT NULL DEFAULT now(),
+  PRIMARY KEY (id, played_at)
+) PARTITION BY RANGE (played_at);
+
+CREATE TABLE track_plays_default PARTITION OF track_plays DEFAULT;
+
+CREATE INDEX IF NOT EXISTS idx_track_plays_track_played_at ON track_plays(track_id, played_at);
+CREATE INDEX IF NOT EXISTS idx_track_plays_played_at ON track_plays(played_at);
+
+CREATE TABLE IF NOT EXISTS track_play_daily (
+  track_id uuid REFERENCES tracks(id) ON DELETE CASCADE NOT NULL,
+  day date NOT NULL,
+  user_id uuid REFERENCES users(id) ON DELETE CASCADE NOT NULL,
+  plays integer NOT NULL DEFAULT 0,
+  unique_listeners integer NOT NULL DEFAULT 0,
+  PRIMARY KEY (track_id, day)
+);
+
+CREATE INDEX IF NOT EXISTS idx_track_play_daily_user_day ON track_play_daily(user_id, day);
+
+CREATE OR REPLACE FUNCTION create_track_play_partition(p_month date)
+RETURNS void
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_start date := date_trunc('month', p_month)::date;
+  v_from timestamptz := v_start::timestamp AT TIME ZONE 'UTC';
+  v_to timestamptz := (v_start + interval '1 month')::timestamp AT TIME ZONE 'UTC';
+  v_name text := format('track_plays_y%sm%s', to_char(v_start, 'YYYY'), to_char(v_start, 'MM'));
+BEGIN
+  IF to_regclass(v_name) IS NOT NULL THEN
+    RETURN;
+  END IF;
+
+  -- Rows for this month that landed in the default partition must move into the new one
+  CREATE TEMP TABLE IF NOT EXISTS track_plays_moving (LIKE track_plays) ON COMMIT DROP;
+  WITH moved AS (
+    DELETE FROM track_plays_default
+    WHERE played_at >= v_from AND played_at < v_to
+    RETURNING *
+  )
+  INSERT INTO track_plays_moving SELECT * FROM moved;
+
+  EXECUTE format(
+    'CREATE TABLE %I PARTITION OF track_plays FOR VALUES FROM (%L) TO (%L)',
+    v_name, v_from, v_to
+  );
+
+  INSERT INTO track_plays SELECT * FROM track_plays_moving;
+  TRUNCATE track_plays_moving;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION ensure_track_play_partitions(p_months_ahead integer DEFAULT 2)
+RETURNS void
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  SELECT create_track_play_partition(month::date)
+  FROM generate_series(
+    date_trunc('month', now(), 'UTC'),
+    date_trunc('month', now(), 'UTC') + make_interval(months => p_months_ahead),
+    interval '1 month'
+  ) AS month;
+$$;
+
+CREATE OR REPLACE FUNCTION rollup_track_plays(p_from date, p_to date)
+RETURNS integer
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  WITH daily AS (
+    SELECT
+      track_plays.track_id,
+      (track_plays.played_at AT TIME ZONE 'UTC')::date AS day,
+      count(*)::integer AS plays,
+      count(DISTINCT coalesce(
+        track_plays.user_id::text,
+        host(track_plays.ip_address) || '|' || coalesce(track_plays.user_agent, '')
+      ))::integer AS unique_listeners
+    FROM track_plays
+    WHERE track_plays.played_at >= (p_from::timestamp AT TIME ZONE 'UTC')
+      AND track_plays.played_at < (p_to::timestamp AT TIME ZONE 'UTC')
+    GROUP BY 1, 2
+  ),
+  written AS (
+    INSERT INTO track_play_daily (track_id, day, user_id, plays, unique_listeners)
+    SELECT daily.track_id, daily.day, tracks.user_id, daily.plays, daily.unique_listeners
+    FROM daily
+    JOIN tracks ON tracks.id = daily.track_id
+    ON CONFLICT (track_id, day) DO UPDATE SET
+      plays = EXCLUDED.plays,
+      unique_listeners = EXCLUDED.unique_listeners
+    RETURNING 1
+  )
+  SELECT count(*)::integer FROM written;
+$$;
+
+CREATE OR REPLACE FUNCTION expire_track_plays(p_retain_days integer)
+RETURNS integer
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_cutoff date := (now() AT TIME ZONE 'UTC')::date - p_retain_days;
+  v_partition record;
+  v_dropped integer := 0;
+BEGIN
+  FOR v_partition IN
+    SELECT child.relname AS name,
+           substring(pg_get_expr(child.relpartbound, child.oid) FROM 'TO \(''([^'']+)''\)')::timestamptz AS upper_bound,
+           substring(pg_get_expr(child.relpartbound, child.oid) FROM 'FROM \(''([^'']+)''\)')::timestamptz AS lower_bound
+    FROM pg_inherits
+    JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+    WHERE parent.relname = 'track_plays'
+      AND child.relname <> 'track_plays_default'
+  LOOP
+    IF v_partition.upper_bound <= (v_cutoff::timestamp AT TIME ZONE 'UTC') THEN
+      -- Make sure the month is summarized before its raw rows go
+      PERFORM rollup_track_plays(
+        (v_partition.lower_bound AT TIME ZONE 'UTC')::date,
+        (v_partition.upper_bound AT TIME ZONE 'UTC')::date
+      );
+      EXECUTE format('DROP TABLE %I', v_partition.name);
+      v_dropped := v_dropped + 1;
+    END IF;
+  END LOOP;
+
+  PERFORM rollup_track_plays(min((played_at AT TIME ZONE 'UTC')::date), v_cutoff)
+  FROM track_plays_default
+  WHERE played_at < (v_cutoff::timestamp AT TIME ZONE 'UTC')
+  HAVING count(*) > 0;
+
+  DELETE FROM track_plays_default
+  WHERE played_at < (v_cutoff::timestamp AT TIME ZONE 'UTC');
+
+  RETURN v_dropped;
+END;
+$$;
+
+-- Move existing plays into monthly partitions, then summarize them
+SELECT create_track_play_partition(month::date)
+FROM generate_series(
+  date_trunc('month', coalesce((SELECT min(played_at) FROM track_plays_unpartitioned), now()), 'UTC'),
+  date_trunc('month', now(), 'UTC') + interval '2 months',
+  interval '1 month'
+) AS month;
+
+INSERT INTO track_plays (id, track_id, user_id, ip_address, user_agent, played_at)
+SELECT id, track_id, user_id, ip_address, user_agent, coalesce(played_at, now())
+FROM track_plays_unpartitioned;
+
+DROP TABLE track_plays_unpartitioned;
+
+SELECT rollup_track_plays(
+  coalesce((SELECT min(played_at AT TIME ZONE 'UTC')::date FROM track_plays), current_date),
+  current_date + 1
+);
+
+-- Security
+ALTER TABLE track_plays ENABLE ROW LEVEL SECURITY;
+ALTER TABLE track_play_daily ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Anyone can insert play records"
+  ON track_plays FOR INSERT
+  TO anon, authenticated
+  WITH CHECK (true);
+
+CREATE POLICY "Users can view plays for own tracks"
+  ON track_plays FOR SELECT
+  TO authenticated
+  USING (
+    EXISTS (
+      SELECT 1 FROM tracks
+      WHERE tracks.id = track_plays.track_id
+      AND tracks.user_id = auth.uid()::uuid
+    )
+  );
+
+CREATE POLICY "Users can view daily plays for own tracks"
+  ON track_play_daily FOR SELECT
+  TO authenticated
+  USING (user_id = auth.uid()::uuid);
+
+REVOKE ALL ON FUNCTION create_track_play_partition(date) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION ensure_track_play_partitions(integer) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION rollup_track_plays(date, date) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION expire_track_plays(integer) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION ensure_track_play_partitions(integer) TO service_role;
+GRANT EXECUTE ON FUNCTION rollup_track_plays(date, date) TO service_role;
+GRANT EXECUTE ON FUNCTION expire_track_plays(integer) TO service_role;
@@ -0,0 +1,50 @@
+/*
+  # Batched profile updates
+
+  ## Overview
+  PostgREST can only apply the same values to every row an UPDATE matches,
+  so updating several profiles with their own values took one request per
+  user. `update_user_profiles` takes the whole batch as a jsonb array and
+  applies it with a single UPDATE ... FROM.
+
+  Fields that are absent or null in an entry keep their current value, the
+  same rule `update_user_profile` follows for its optional arguments.
+
+  ## Functions
+  - `update_user_profiles(p_profiles jsonb)` - Takes an array of
+    `{id, bio, genre, social_links, profile_image_url}` objects and returns
+    the number of users updated
+
+  ## Security
+  - Runs with the caller's rights, so the "Users can update own profile"
+    policy still decides which rows an authenticated user may change; the
+    service role can update any profile
+*/
+
+CREATE OR REPLACE FUNCTION update_user_profiles(p_profiles jsonb)
+RETURNS integer
+LANGUAGE sql
+SECURITY INVOKER
+SET search_path = public
+AS $$
+  WITH updated AS (
+    UPDATE users
+    SET bio = coalesce(p.bio, users.bio),
+        genre = coalesce(p.genre, users.genre),
+        social_links = coalesce(p.social_links, users.social_links),
+        profile_image_url = coalesce(p.profile_image_url, users.profile_image_url)
+    FROM jsonb_to_recordset(p_profiles) AS p(
+      id uuid,
+      bio text,
+      genre text,
+      social_links jsonb,
+      profile_image_url text
+    )
+    WHERE users.id = p.id
+    RETURNING users.id
+  )
+  SELECT count(*)::integer FROM updated;
+$$;
+
+REVOKE ALL ON FUNCTION update_user_profiles(jsonb) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION update_user_profiles(jsonb) TO authenticated, service_role;
@@ -1,35 +1,145 @@
 import os
-from typing import Optional, Any
+import time
+import threading
+from typing import Optional, Any, Dict
+
+import httpx
+from config import Config
+from metrics import record_round_trip, register_gauges
 
 try:
-    from supabase import create_client, Client
+    from supabase import create_client, Client, ClientOptions
     SUPABASE_AVAILABLE = True
 except ImportError:
     try:
-        from supabase.client import create_client, Client
+        from supabase.client import create_client, Client, ClientOptions
         SUPABASE_AVAILABLE = True
     except ImportError:
         SUPABASE_AVAILABLE = False
         Client = Any
 
+# One client is shared by every Streamlit session thread, the background
+# workers and database_async's thread pool. Its requests go through a
+# single bounded httpx connection pool: connections are kept alive and
+# reused across sessions, at most SUPABASE_POOL_SIZE are open at once, and
+# a request that finds them all busy waits up to SUPABASE_POOL_TIMEOUT_SECONDS
+# for one to come free.
+
+class PooledTransport(httpx.HTTPTransport):
+    """HTTP transport that counts requests, failures and time to response.
+
+    `in_flight` includes requests still waiting for a pooled connection.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._stats_lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.pool_timeouts = 0
+        self.total_seconds = 0.0
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        record_round_trip('supabase')
+        with self._stats_lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        started = time.perf_counter()
+        try:
+            return super().handle_request(request)
+        except httpx.PoolTimeout:
+            with self._stats_lock:
+                self.pool_timeouts += 1
+                self.errors += 1
+            raise
+        except httpx.TransportError:
+            with self._stats_lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._stats_lock:
+                self.in_flight -= 1
+                self.requests += 1
+                self.total_seconds += time.perf_counter() - started
+
+    def stats(self) -> Dict[str, Any]:
+        connections = self._pool.connections
+        with self._stats_lock:
+            return {
+                'pool_size': Config.SUPABASE_POOL_SIZE,
+                'open_connections': len(connections),
+                'idle_connections': sum(1 for connection in connections if connection.is_idle()),
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+                'requests': self.requests,
+                'errors': self.errors,
+                'pool_timeouts': self.pool_timeouts,
+                'avg_response_seconds': self.total_seconds / self.requests if self.requests else 0.0
+            }
+
 _supabase_client: Optional[Any] = None
+_transport: Optional[PooledTransport] = None
+_client_lock = threading.Lock()
+
+def _create_http_client() -> httpx.Client:
+    global _transport
+
+    _transport = PooledTransport(
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=Config.SUPABASE_POOL_SIZE,
+            max_keepalive_connections=Config.SUPABASE_POOL_SIZE,
+            keepalive_expiry=Config.SUPABASE_KEEPALIVE_SECONDS
+        ),
+        retries=1
+    )
+
+    return httpx.Client(
+        transport=_transport,
+        timeout=httpx.Timeout(
+            Config.SUPABASE_TIMEOUT_SECONDS,
+            connect=Config.SUPABASE_CONNECT_TIMEOUT_SECONDS,
+            pool=Config.SUPABASE_POOL_TIMEOUT_SECONDS
+        ),
+        follow_redirects=True
+    )
 
 def get_supabase_client() -> Any:
     global _supabase_client
 
+    if Config.DATABASE_BACKEND == 'sqlite':
+        from sqlite_backend import get_sqlite_client
+        return get_sqlite_client()
+
     if not SUPABASE_AVAILABLE:
         raise ImportError("Supabase client not available. Please install: pip install supabase")
 
-    if _supabase_client is None:
-        url = os.getenv('SUPABASE_URL')
-        key = os.getenv('SUPABASE_ANON_KEY')
+    if _supabase_client is not None:
+        return _supabase_client
 
-        if not url or not key:
-            raise ValueError("SUPABASE_URL and SUPABASE_ANON_KEY must be set in environment")
+    with _client_lock:
+        if _supabase_client is None:
+            url = os.getenv('SUPABASE_URL')
+            key = os.getenv('SUPABASE_ANON_KEY')
 
-        _supabase_client = create_client(url, key)
+            if not url or not key:
+                raise ValueError("SUPABASE_URL and SUPABASE_ANON_KEY must be set in environment")
+
+            _supabase_client = create_client(url, key, options=ClientOptions(httpx_client=_create_http_client()))
 
     return _supabase_client
 
+def get_pool_stats() -> Dict[str, Any]:
+    """Connection pool and request counters for the shared client"""
+    if _transport is None:
+        return {'pool_size': Config.SUPABASE_POOL_SIZE, 'open_connections': 0, 'idle_connections': 0, 'in_flight': 0,
+                'max_in_flight': 0, 'requests': 0, 'errors': 0, 'pool_timeouts': 0, 'avg_response_seconds': 0.0}
+    return _transport.stats()
+
+register_gauges('omawi_na_supabase', get_pool_stats)
+
 def init_supabase():
     get_supabase_client()
@@ -0,0 +1,251 @@
+import os
+import wave
+import struct
+import tempfile
+from dataclasses import dataclass
+from typing import Optional, Iterator, List
+import numpy as np
+from config import Config
+
+try:
+    import soundfile
+    SOUNDFILE_AVAILABLE = True
+except ImportError:
+    SOUNDFILE_AVAILABLE = False
+
+# Sidecar layout (little endian):
+#   header  magic, version, bytes per value, level count, sample rate, total frames
+#   levels  one (samples_per_peak, peak_count, data_offset) entry per level
+#   data    per level, peak_count interleaved (min, max) pairs
+PEAKS_MAGIC = b'SVPK'
+PEAKS_VERSION = 1
+PEAKS_EXTENSION = '.peaks'
+HEADER_FORMAT = '<4sBBBxIQ'
+LEVEL_FORMAT = '<IIQ'
+
+DECODE_BLOCKS_PER_CHUNK = 4096
+
+@dataclass
+class PeakLevel:
+    samples_per_peak: int
+    peak_count: int
+    data_offset: int
+
+@dataclass
+class PeaksHeader:
+    sample_rate: int
+    total_frames: int
+    bytes_per_value: int
+    levels: List[PeakLevel]
+
+    @property
+    def dtype(self):
+        return np.int8 if self.bytes_per_value == 1 else np.int16
+
+    @property
+    def duration(self) -> float:
+        return self.total_frames / self.sample_rate if self.sample_rate else 0.0
+
+def get_peaks_path(audio_path: str) -> str:
+    return f"{audio_path}{PEAKS_EXTENSION}"
+
+def _open_wav(file_path: str, frames_per_chunk: int):
+    wav = wave.open(file_path, 'rb')
+    channels = wav.getnchannels()
+    sample_width = wav.getsampwidth()
+
+    def chunks() -> Iterator[np.ndarray]:
+        with wav:
+            while True:
+                raw = wav.readframes(frames_per_chunk)
+                if not raw:
+                    break
+
+                if sample_width == 1:
+                    samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+                elif sample_width == 2:
+                    samples = np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768.0
+                elif sample_width == 3:
+                    packed = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+                    samples = packed[:, 0] | (packed[:, 1] << 8) | (packed[:, 2] << 16)
+                    samples = np.where(samples >= 1 << 23, samples - (1 << 24), samples).astype(np.float32) / float(1 << 23)
+                else:
+                    samples = np.frombuffer(raw, dtype='<i4').astype(np.float32) / float(1 << 31)
+
+                yield samples.reshape(-1, channels).mean(axis=1)
+
+    return wav.getframerate(), chunks()
+
+def _open_soundfile(file_path: str, frames_per_chunk: int):
+    audio = soundfile.SoundFile(file_path)
+
+    def chunks() -> Iterator[np.ndarray]:
+        with audio:
+            for block in audio.blocks(blocksize=frames_per_chunk, dtype='float32', always_2d=True):
+                yield block.mean(axis=1)
+
+    return audio.samplerate, chunks()
+
+def _open_decoder(file_path: str, frames_per_chunk: int):
+    """Return (sample_rate, iterator of mono float32 chunks), or None if undecodable.
+
+    PCM WAV is decoded with the standard library; other formats need the
+    optional soundfile package.
+    """
+    if file_path.lower().endswith('.wav'):
+        try:
+            return _open_wav(file_path, frames_per_chunk)
+        except (wave.Error, EOFError):
+            pass
+
+    if SOUNDFILE_AVAILABLE:
+        return _open_soundfile(file_path, frames_per_chunk)
+
+    return None
+
+def _block_peaks(samples: np.ndarray, block_size: int) -> np.ndarray:
+    blocks = samples.reshape(-1, block_size)
+    return np.stack([blocks.min(axis=1), blocks.max(axis=1)], axis=1)
+
+def _downsample_peaks(peaks: np.ndarray, factor: int) -> np.ndarray:
+    remainder = len(peaks) % factor
+    if remainder:
+        peaks = np.concatenate([peaks, np.repeat(peaks[-1:], factor - remainder, axis=0)])
+
+    grouped = peaks.reshape(-1, factor, 2)
+    return np.stack([grouped[:, :, 0].min(axis=1), grouped[:, :, 1].max(axis=1)], axis=1)
+
+def compute_peaks(file_path: str):
+    """Decode a file once and return (sample_rate, total_frames, finest peaks)"""
+    block_size = Config.WAVEFORM_SAMPLES_PER_PEAK
+    decoder = _open_decoder(file_path, block_size * DECODE_BLOCKS_PER_CHUNK)
+    if decoder is None:
+        return None
+
+    sample_rate, chunks = decoder
+    total_frames = 0
+    carry = np.empty(0, dtype=np.float32)
+    parts = []
+
+    for chunk in chunks:
+        total_frames += len(chunk)
+        if len(carry):
+            chunk = np.concatenate([carry, chunk])
+
+        usable = len(chunk) - len(chunk) % block_size
+        if usable:
+            parts.append(_block_peaks(chunk[:usable], block_size))
+        carry = chunk[usable:]
+
+    if len(carry):
+        padded = np.concatenate([carry, np.repeat(carry[-1:], block_size - len(carry))])
+        parts.append(_block_peaks(padded, block_size))
+
+    peaks = np.concatenate(parts) if parts else np.zeros((0, 2), dtype=np.float32)
+    return sample_rate, total_frames, peaks
+
+def generate_peaks(audio_path: str, bytes_per_value: Optional[int] = None) -> Optional[str]:
+    """Write the multi-resolution peaks sidecar for an audio file.
+
+    Returns the sidecar path, or None when the format cannot be decoded.
+    Content-addressed blobs never change, so an existing sidecar is reused.
+    """
+    peaks_path = get_peaks_path(audio_path)
+    if os.path.exists(peaks_path):
+        return peaks_path
+
+    computed = compute_peaks(audio_path)
+    if computed is None:
+        return None
+
+    sample_rate, total_frames, peaks = computed
+    bytes_per_value = bytes_per_value or Config.WAVEFORM_BYTES_PER_VALUE
+    dtype = np.int8 if bytes_per_value == 1 else np.int16
+    scale = float(np.iinfo(dtype).max)
+
+    levels = [peaks]
+    for _ in range(Config.WAVEFORM_LEVELS - 1):
+        if len(levels[-1]) <= 1:
+            break
+        levels.append(_downsample_peaks(levels[-1], Config.WAVEFORM_LEVEL_FACTOR))
+
+    encoded = [np.clip(np.round(level * scale), -scale, scale).astype(dtype) for level in levels]
+
+    offset = struct.calcsize(HEADER_FORMAT) + struct.calcsize(LEVEL_FORMAT) * len(encoded)
+    level_table = []
+    for index, level in enumerate(encoded):
+        samples_per_peak = Config.WAVEFORM_SAMPLES_PER_PEAK * Config.WAVEFORM_LEVEL_FACTOR ** index
+        level_table.append(struct.pack(LEVEL_FORMAT, samples_per_peak, len(level), offset))
+        offset += level.nbytes
+
+    fd, temp_path = tempfile.mkstemp(suffix=PEAKS_EXTENSION, dir=os.path.dirname(peaks_path))
+    with os.fdopen(fd, 'wb') as f:
+        f.write(struct.pack(HEADER_FORMAT, PEAKS_MAGIC, PEAKS_VERSION, bytes_per_value, len(encoded), sample_rate, total_frames))
+        f.writelines(level_table)
+        for level in encoded:
+            f.write(level.tobytes())
+
+    os.replace(temp_path, peaks_path)
+    return peaks_path
+
+def read_peaks_header(peaks_path: str) -> PeaksHeader:
+    with open(peaks_path, 'rb') as f:
+        header_size = struct.calcsize(HEADER_FORMAT)
+        magic, version, bytes_per_value, level_count, sample_rate, total_frames = struct.unpack(HEADER_FORMAT, f.read(header_size))
+
+        if magic != PEAKS_MAGIC or version != PEAKS_VERSION:
+            raise ValueError(f"Not a peaks file: {peaks_path}")
+
+        level_size = struct.calcsize(LEVEL_FORMAT)
+        levels = [PeakLevel(*struct.unpack(LEVEL_FORMAT, f.read(level_size))) for _ in range(level_count)]
+
+    return PeaksHeader(sample_rate, total_frames, bytes_per_value, levels)
+
+def read_peaks(peaks_path: str, level: int, start: int = 0, count: Optional[int] = None, header: Optional[PeaksHeader] = None) -> np.ndarray:
+    """Read a slice of one zoom level as an (n, 2) array of (min, max) pairs.
+
+    Only the requested slice is paged in from disk.
+    """
+    header = header or read_peaks_header(peaks_path)
+    peak_level = header.levels[level]
+
+    start = max(0, min(start, peak_level.peak_count))
+    end = peak_level.peak_count if count is None else min(peak_level.peak_count, start + count)
+    if end <= start:
+        return np.zeros((0, 2), dtype=header.dtype)
+
+    mapped = np.memmap(peaks_path, dtype=header.dtype, mode='r', offset=peak_level.data_offset, shape=(peak_level.peak_count, 2))
+    return np.array(mapped[start:end])
+
+def read_peaks_window(audio_path: str, start_seconds: float = 0.0, end_seconds: Optional[float] = None, max_peaks: int = 1000) -> Optional[dict]:
+    """Return normalized peaks for a time window at the finest level that fits max_peaks"""
+    peaks_path = get_peaks_path(audio_path)
+    if not os.path.exists(peaks_path):
+        return None
+
+    header = read_peaks_header(peaks_path)
+    if end_seconds is None or end_seconds > header.duration:
+        end_seconds = header.duration
+
+    window_frames = max(0.0, end_seconds - start_seconds) * header.sample_rate
+
+    level = len(header.levels) - 1
+    for index, peak_level in enumerate(header.levels):
+        if window_frames / peak_level.samples_per_peak <= max_peaks:
+            level = index
+            break
+
+    samples_per_peak = header.levels[level].samples_per_peak
+    start = int(start_seconds * header.sample_rate // samples_per_peak)
+    count = int(np.ceil(window_frames / samples_per_peak))
+
+    peaks = read_peaks(peaks_path, level, start, count, header)
+    scale = float(np.iinfo(header.dtype).max)
+
+    return {
+        'level': level,
+        'samples_per_peak': samples_per_peak,
+        'sample_rate': header.sample_rate,
+        'start_seconds': start * samples_per_peak / header.sample_rate,
+        'peaks': (peaks.astype(np.float32) / scale).tolist()
+    }